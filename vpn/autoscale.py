@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Автомасштабирование парка VPN серверов по нагрузке
+
+Каждый такт снимаются метрики узлов парка (node_metrics.py: активные пиры
+по свежести handshake, байты rx/tx -> байт/с) и по политике POLICY
+принимаются решения:
+
+  add     средняя нагрузка выше peers_high - новый узел через
+          deploy_node/create_droplet в регионе самого загруженного узла
+  drain   нагрузка после удаления узла была бы ниже peers_low - простаивающий
+          узел переводится в статус draining (manage_peers.py не добавляет
+          на него клиентов) и ждет ухода активных пиров
+  delete  на draining узле не осталось активных пиров (или истек
+          drain_timeout) - droplet удаляется через delete_droplet
+  resize  трафик узла выше resize_bps - следующий размер из SIZE_LADDER
+          (выключение, resize, включение: клиенты переподключаются)
+
+Гистерезис: пороги добавления и удаления разнесены (peers_high >
+peers_low), условие должно держаться sustain тактов подряд, после
+действий действуют cooldown. При росте нагрузки draining узел сначала
+возвращается в работу, а не создается новый.
+
+С --listen метрики приходят от агентов узлов (metrics_collector.py) без
+SSH опроса. --simulate проигрывает записанные метрики (autoscale.py --record или
+node_metrics.py --record) без обращений к API и выводит решения.
+
+Пример:
+    python3 autoscale.py --tag fleet-vpn-server --record
+    python3 autoscale.py --tag fleet-vpn-server --listen 0.0.0.0:8790
+    python3 autoscale.py --tag fleet-vpn-server --dry-run --once
+    python3 autoscale.py --simulate autoscale_metrics.jsonl --set peers_high=100
+"""
+
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from do_api import get_client, wait_for_action
+
+import deploy_vpn
+import deploy_openvpn
+import deploy_fleet
+import delete_vpn
+import delete_openvpn
+import node_metrics
+import metrics_collector
+import inventory
+import timing
+
+POLICY = {
+    'min_nodes': 1,
+    'max_nodes': 20,
+    'peers_high': 150,         # активных пиров на узел: выше - добавить узел
+    'peers_low': 60,           # нагрузка без одного узла ниже - можно сократить
+    'sustain': 3,              # тактов подряд до действия
+    'idle_peers': 0,           # простой узла: активных пиров не больше
+    'idle_bps': 10000,         # и трафик ниже, байт/с
+    'resize_bps': 40000000,    # перегрузка узла: трафик выше, байт/с
+    'cooldown_up': 300,        # секунды после добавления до следующего добавления
+    'cooldown_down': 900,      # секунды после любого изменения до сокращения
+    'cooldown_resize': 1800,   # секунды между resize одного узла
+    'drain_timeout': 3600,     # draining узел удаляется не позже, секунды
+}
+
+# Размеры по возрастанию vCPU: шифрование упирается в процессор
+SIZE_LADDER = ['s-1vcpu-1gb', 's-2vcpu-2gb', 's-4vcpu-8gb', 's-8vcpu-16gb']
+
+PROTOCOLS = {
+    'wireguard': (deploy_vpn, delete_vpn),
+    'openvpn': (deploy_openvpn, delete_openvpn),
+}
+
+INTERVAL = 60   # секунды между тактами
+FLEET_STATUSES = ('creating', 'active', 'draining')
+
+
+class NodeState:
+    """Последний снимок узла, трафик и счетчики тактов над порогами"""
+
+    def __init__(self, record):
+        self.record = record
+        self.sample = None
+        self.bps = 0.0
+        self.busy_ticks = 0
+        self.idle_ticks = 0
+
+    @property
+    def active_peers(self):
+        return self.sample['active_peers'] if self.sample else 0
+
+    def update(self, sample, policy):
+        previous = self.sample
+        if previous is not None and sample['time'] > previous['time']:
+            delta = (sample['rx_bytes'] + sample['tx_bytes']
+                     - previous['rx_bytes'] - previous['tx_bytes'])
+            # Счетчики обнуляются при перезапуске интерфейса
+            self.bps = delta / (sample['time'] - previous['time']) if delta >= 0 else 0.0
+        self.sample = sample
+        if previous is None:
+            return
+        self.busy_ticks = self.busy_ticks + 1 if self.bps > policy['resize_bps'] else 0
+        idle = sample['active_peers'] <= policy['idle_peers'] and self.bps < policy['idle_bps']
+        self.idle_ticks = self.idle_ticks + 1 if idle else 0
+
+
+class Autoscaler:
+    """Решения по снимкам метрик; действия выполняет actions"""
+
+    def __init__(self, actions, policy=None):
+        self.actions = actions
+        self.policy = dict(POLICY, **(policy or {}))
+        self.nodes = {}
+        self.high_ticks = 0
+        self.low_ticks = 0
+        self.last_up = float('-inf')
+        self.last_change = float('-inf')
+        self.last_resize = {}
+
+    def observe(self, records, samples):
+        """Обновить состав парка по записям инвентаря и состояние по снимкам"""
+        fleet = {record['droplet_id']: record for record in records}
+        for droplet_id in set(self.nodes) - set(fleet):
+            del self.nodes[droplet_id]
+        for droplet_id, record in fleet.items():
+            self.nodes.setdefault(droplet_id, NodeState(record)).record = record
+        for sample in samples:
+            node = self.nodes.get(sample['droplet_id'])
+            if node is not None:
+                node.update(sample, self.policy)
+
+    def decide(self, now):
+        """Решения такта: [(действие, NodeState или None, параметр)]"""
+        policy = self.policy
+        serving = [n for n in self.nodes.values() if n.record['status'] != 'draining']
+        draining = [n for n in self.nodes.values() if n.record['status'] == 'draining']
+        decisions = []
+
+        for node in draining:
+            since = node.record.get('draining_since') or now
+            if (node.sample is not None and node.active_peers == 0) or now - since >= policy['drain_timeout']:
+                decisions.append(('delete', node, None))
+
+        total = sum(node.active_peers for node in serving)
+        load = total / len(serving) if serving else float('inf')
+        projected = total / (len(serving) - 1) if len(serving) > 1 else float('inf')
+        self.high_ticks = self.high_ticks + 1 if load > policy['peers_high'] else 0
+        self.low_ticks = self.low_ticks + 1 if projected < policy['peers_low'] else 0
+
+        short = len(self.nodes) < policy['min_nodes']
+        if ((self.high_ticks >= policy['sustain'] or short)
+                and now - self.last_up >= policy['cooldown_up']):
+            deleting = {node.record['droplet_id'] for _, node, _ in decisions}
+            back = [node for node in draining if node.record['droplet_id'] not in deleting]
+            if back:
+                decisions.append(('undrain', max(back, key=lambda n: n.active_peers), None))
+            elif len(self.nodes) < policy['max_nodes']:
+                busiest = max(serving, key=lambda n: n.active_peers, default=None)
+                decisions.append(('add', busiest, None))
+        elif (self.low_ticks >= policy['sustain'] and len(serving) > policy['min_nodes']
+              and now - self.last_change >= policy['cooldown_down']):
+            idle = [node for node in serving if node.idle_ticks >= policy['sustain']]
+            if idle:
+                decisions.append(('drain', min(idle, key=lambda n: (n.active_peers, n.bps)), None))
+
+        # Resize прерывает подключения: не больше одного узла за такт
+        for node in sorted(serving, key=lambda n: -n.bps):
+            droplet_id = node.record['droplet_id']
+            size = next_size(node.record.get('size'))
+            if (node.busy_ticks >= policy['sustain'] and size is not None
+                    and now - self.last_resize.get(droplet_id, float('-inf')) >= policy['cooldown_resize']):
+                decisions.append(('resize', node, size))
+                break
+        return decisions
+
+    def step(self, records, samples, now):
+        """Такт: обновить состояние, принять решения и выполнить их"""
+        self.observe(records, samples)
+        decisions = self.decide(now)
+        for action, node, param in decisions:
+            record = node.record if node is not None else None
+            if action == 'add':
+                self.actions.add(record)
+                self.last_up = self.last_change = now
+                self.high_ticks = 0
+            elif action == 'drain':
+                self.actions.drain(record, now)
+                self.last_change = now
+                self.low_ticks = 0
+            elif action == 'undrain':
+                self.actions.undrain(record)
+                self.last_up = self.last_change = now
+                self.high_ticks = 0
+            elif action == 'delete':
+                self.actions.delete(record)
+            elif action == 'resize':
+                self.actions.resize(record, param)
+                self.last_resize[record['droplet_id']] = now
+                node.busy_ticks = 0
+        return decisions
+
+
+def next_size(size):
+    """Следующий размер из SIZE_LADDER или None (неизвестный или последний)"""
+    if size not in SIZE_LADDER:
+        return None
+    index = SIZE_LADDER.index(size)
+    return SIZE_LADDER[index + 1] if index + 1 < len(SIZE_LADDER) else None
+
+
+def describe(action, node, param):
+    name = node.record['name'] if node is not None else ''
+    if action == 'add':
+        return f"📈 add: новый узел рядом с {name or 'парком'}"
+    if action == 'drain':
+        return f"📉 drain: {name} (активных пиров {node.active_peers}, {node.bps / 1e6:.2f} МБ/с)"
+    if action == 'undrain':
+        return f"↩️  undrain: {name} снова принимает клиентов"
+    if action == 'delete':
+        return f"🗑️  delete: {name} (активных пиров {node.active_peers})"
+    return f"⏫ resize: {name} {node.record.get('size')} -> {param} ({node.bps / 1e6:.1f} МБ/с)"
+
+
+class LiveActions:
+    """Действия над настоящим парком: DigitalOcean API и инвентарь
+
+    Создание и resize занимают минуты, поэтому выполняются в фоне; такты
+    опроса метрик продолжаются.
+    """
+
+    def __init__(self, token, protocol, tag, prefix, workers=4):
+        self.token = token
+        self.protocol = protocol
+        self.module, self.delete_module = PROTOCOLS[protocol]
+        self.tag = tag
+        self.prefix = prefix
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._ssh_key_id = None
+
+    def records(self):
+        return [record for record in inventory.find(protocol=self.protocol, tag=self.tag)
+                if record['status'] in FLEET_STATUSES]
+
+    def _name(self, region):
+        taken = {record['name'] for record in inventory.find(tag=self.tag)}
+        index = 1
+        while f"{self.prefix}-{region}-{index}" in taken:
+            index += 1
+        return f"{self.prefix}-{region}-{index}"
+
+    def add(self, near):
+        region = near['region'] if near else self.module.REGION
+        size = near['size'] if near and near.get('size') else self.module.SIZE
+        tuning_id = near.get('tuning') if near else None
+        name = self._name(region)
+        suffix = deploy_fleet.PROTOCOLS[self.protocol][1]
+        node = {
+            'name': name,
+            'region': region,
+            'size': size,
+            'config_file': str(deploy_fleet.FLEET_DIR / f"{name}{suffix}"),
+            'tags': [self.tag],
+            # Профиль сети соседа: tuning в инвентаре - идентификатор имя-vN
+            'tuning': tuning_id.rsplit('-v', 1)[0] if tuning_id else None
+        }
+        if self._ssh_key_id is None:
+            self._ssh_key_id = self.module.create_ssh_key(self.token)
+        trace = timing.Trace(self.protocol, name)
+        self.pool.submit(deploy_fleet.deploy_one, self.module, self.token, self._ssh_key_id,
+                         node, trace)
+
+    def drain(self, record, now):
+        inventory.add({'droplet_id': record['droplet_id'], 'status': 'draining',
+                       'draining_since': now})
+
+    def undrain(self, record):
+        inventory.add({'droplet_id': record['droplet_id'], 'status': 'active',
+                       'draining_since': None})
+
+    def delete(self, record):
+        if self.delete_module.delete_droplet(self.token, record['droplet_id']):
+            self.delete_module.cleanup_local(record)
+
+    def resize(self, record, size):
+        self.pool.submit(resize_droplet, self.token, record, size)
+
+
+def resize_droplet(token, record, size):
+    """Выключить droplet, изменить размер (без диска - обратимо) и включить"""
+    api = get_client(token)
+    droplet_id = record['droplet_id']
+    for action in ({'type': 'power_off'}, {'type': 'resize', 'size': size, 'disk': False},
+                   {'type': 'power_on'}):
+        response = api.post(f'/droplets/{droplet_id}/actions', json=action)
+        if response.status_code != 201:
+            print(f"❌ {record['name']}: {action['type']}: {response.text}")
+            return False
+        status = wait_for_action(api, response.json()['action']['id'])
+        if status != 'completed':
+            print(f"❌ {record['name']}: {action['type']}: {status}")
+            return False
+    inventory.add({'droplet_id': droplet_id, 'size': size})
+    print(f"✅ {record['name']}: размер {size}")
+    return True
+
+
+class SimulatedActions:
+    """Действия без API: меняют только модель парка в памяти
+
+    Записи заменяются, а не изменяются на месте: до следующего такта
+    Autoscaler видит состояние, по которому принимал решение.
+    """
+
+    def __init__(self):
+        self.fleet = {}
+        self.deleted = set()
+        self._next_id = -1
+
+    def records(self):
+        return list(self.fleet.values())
+
+    def see(self, samples):
+        """Узлы из записи, которых модель еще не знает (и не удаляла)"""
+        for sample in samples:
+            droplet_id = sample['droplet_id']
+            if droplet_id not in self.fleet and droplet_id not in self.deleted:
+                self.fleet[droplet_id] = {'droplet_id': droplet_id, 'name': sample['name'],
+                                          'status': 'active', 'size': sample.get('size', SIZE_LADDER[0]),
+                                          'region': sample.get('region')}
+
+    def add(self, near):
+        droplet_id = self._next_id
+        self._next_id -= 1
+        self.fleet[droplet_id] = {'droplet_id': droplet_id, 'name': f"sim-{-droplet_id}",
+                                  'status': 'active', 'size': near['size'] if near else SIZE_LADDER[0],
+                                  'region': near['region'] if near else None}
+
+    def drain(self, record, now):
+        self.fleet[record['droplet_id']] = dict(record, status='draining', draining_since=now)
+
+    def undrain(self, record):
+        self.fleet[record['droplet_id']] = dict(record, status='active', draining_since=None)
+
+    def delete(self, record):
+        self.fleet.pop(record['droplet_id'], None)
+        self.deleted.add(record['droplet_id'])
+
+    def resize(self, record, size):
+        self.fleet[record['droplet_id']] = dict(record, size=size)
+
+
+def simulate(path, policy):
+    """Проиграть записанные метрики; вернуть [(время такта, решение)]"""
+    actions = SimulatedActions()
+    scaler = Autoscaler(actions, policy)
+    timeline = []
+    for tick, samples in node_metrics.load(path):
+        actions.see(samples)
+        for decision in scaler.step(actions.records(), samples, tick):
+            timeline.append((tick, decision))
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(tick))}] {describe(*decision)}")
+    return timeline
+
+
+def parse_policy(values):
+    """--set key=value -> словарь переопределений POLICY"""
+    policy = {}
+    for value in values:
+        key, _, number = value.partition('=')
+        if key not in POLICY or not number:
+            raise argparse.ArgumentTypeError(f"ожидается key=value, key из: {', '.join(POLICY)}")
+        policy[key] = float(number) if '.' in number else int(number)
+    return policy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Автомасштабирование парка VPN серверов")
+    parser.add_argument('--tag', help="тег парка (fleet-<префикс>)")
+    parser.add_argument('--protocol', choices=sorted(PROTOCOLS), default='wireguard')
+    parser.add_argument('--prefix', help="префикс имен новых узлов (по умолчанию из тега)")
+    parser.add_argument('--interval', type=float, default=INTERVAL)
+    parser.add_argument('--once', action='store_true', help="один такт")
+    parser.add_argument('--dry-run', action='store_true', help="только показать решения")
+    parser.add_argument('--record', action='store_true',
+                        help=f"записывать метрики в {node_metrics.METRICS_FILE}")
+    parser.add_argument('--listen', metavar='HOST:PORT', nargs='?', const='',
+                        help="принимать метрики от агентов (metrics_collector.py) вместо SSH")
+    parser.add_argument('--simulate', metavar='FILE', help="проиграть записанные метрики")
+    parser.add_argument('--set', action='append', default=[], metavar='key=value',
+                        help="переопределить параметр POLICY")
+    args = parser.parse_args()
+
+    try:
+        policy = parse_policy(args.set)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    if args.simulate:
+        timeline = simulate(args.simulate, policy)
+        counts = {}
+        for _, (action, _, _) in timeline:
+            counts[action] = counts.get(action, 0) + 1
+        summary = ', '.join(f"{action}: {count}" for action, count in sorted(counts.items()))
+        print(f"\n✅ Симуляция: {summary or 'действий нет'}")
+        return
+
+    if not args.tag:
+        parser.error("укажите --tag парка или --simulate")
+    module = PROTOCOLS[args.protocol][0]
+    prefix = args.prefix or (args.tag[len('fleet-'):] if args.tag.startswith('fleet-')
+                             else module.DROPLET_NAME)
+    token = None if args.dry_run else module.get_do_token()
+    live = LiveActions(token, args.protocol, args.tag, prefix)
+    actions = SimulatedActions() if args.dry_run else live
+    scaler = Autoscaler(actions, policy)
+    collector = metrics_collector.Collector(args.listen or None) if args.listen is not None else None
+
+    print(f"⚖️  Автомасштабирование {args.tag} ({args.protocol}), такт {args.interval:.0f}s"
+          + (" - только решения" if args.dry_run else ""))
+    while True:
+        started = time.monotonic()
+        now = time.time()
+        records = live.records()
+        samples = collector.samples(records) if collector else node_metrics.collect_all(records)
+        if args.record:
+            node_metrics.write(samples, now)
+        if args.dry_run:
+            # Модель парка без действий: каждый такт заново по инвентарю
+            actions.fleet = {record['droplet_id']: dict(record) for record in records}
+        decisions = scaler.step(records, samples, now)
+
+        serving = [n for n in scaler.nodes.values() if n.record['status'] != 'draining']
+        load = sum(n.active_peers for n in serving) / len(serving) if serving else 0
+        print(f"[{time.strftime('%H:%M:%S')}] узлов {len(scaler.nodes)} (метрики {len(samples)}), "
+              f"активных пиров на узел {load:.0f}")
+        for decision in decisions:
+            print(f"   {describe(*decision)}")
+
+        if args.once:
+            break
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+
+    if not args.dry_run:
+        live.pool.shutdown(wait=True)
+
+if __name__ == '__main__':
+    main()
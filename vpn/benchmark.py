@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк развертывания без DigitalOcean и droplet
+
+Запускает имитацию API (fake_do.py) и подставляет fake_ssh.py вместо ssh,
+затем прогоняет настоящие функции развертывания и удаления. Все файлы
+создаются во временном каталоге, ключи и конфигурации оператора не трогаются.
+
+Сценарии:
+    deploy   один узел WireGuard и OpenVPN: время до готовности, накладные
+             расходы сверх имитированных задержек, запросы к API
+    fleet    масштабирование по числу параллельно развертываемых узлов
+    errors   развертывание при доле ответов 500 от API
+    delete   удаление узлов: по одному, параллельно по ID и по тегу
+    peers    добавление/отзыв пиров по ssh: время операции
+    resume   сбой после создания droplet и повторный запуск с контрольной
+             точки: время продолжения и число новых droplet
+
+Пример:
+    python3 benchmark.py
+    python3 benchmark.py --scenarios deploy fleet --fleet-sizes 1 10 50 --json bench.json
+    python3 benchmark.py --baseline bench.json   # код 1 при регрессии
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+import fake_do
+
+SCENARIOS = ('deploy', 'fleet', 'errors', 'delete', 'peers', 'resume')
+
+# Метрики, для которых рост - регрессия (сравнение с --baseline)
+LOWER_IS_BETTER = ('seconds', 'overhead', 'api_calls', 'calls_per_node', 'retries', 'ms_per_op')
+
+VERBOSE = False
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Спрятать вывод скриптов развертывания (кроме --verbose)"""
+    if VERBOSE:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def prepare_environment(api_url, workdir):
+    """Настроить окружение до импорта модулей развертывания
+
+    do_api, readiness и ssh_session читают переменные окружения при импорте.
+    """
+    port = free_port()
+    os.environ.update({
+        'DO_API_URL': api_url,
+        'DIGITALOCEAN_ACCESS_TOKEN': 'bench',
+        'VPN_CALLBACK_URL': f'http://127.0.0.1:{port}',
+        'VPN_CALLBACK_BIND': f'127.0.0.1:{port}',
+        'VPN_SSH_BIN': str(Path(__file__).resolve().parent / 'fake_ssh.py'),
+        'FAKE_SSH_STATE_DIR': str(workdir / 'fake-ssh'),
+        'VPN_USE_IMAGES': '0',
+    })
+    os.chdir(workdir)
+
+    import deploy_vpn
+    import deploy_openvpn
+    import ssh_keys
+    # SSH ключ оператора и его кэш не используются: все во временном каталоге
+    deploy_vpn.SSH_KEY_PATH = workdir / 'vpn_do_key'
+    deploy_openvpn.SSH_KEY_PATH = workdir / 'openvpn_do_key'
+    ssh_keys.CACHE_FILE = workdir / 'ssh_keys.json'
+
+
+def client_stats(token):
+    """Число запросов и повторов по данным do_api"""
+    from do_api import get_client
+    records = get_client(token).latencies
+    return len(records), sum(r[5] - 1 for r in records)
+
+
+def bench_deploy(fake, protocol):
+    import timing
+    import deploy_vpn
+    import deploy_openvpn
+    module, suffix = {'wireguard': (deploy_vpn, '.conf'), 'openvpn': (deploy_openvpn, '.ovpn')}[protocol]
+    token = f'bench-deploy-{protocol}'
+    name = f'bench-{protocol}'
+
+    fake.calls.clear()
+    with quiet():
+        ssh_key_id = module.create_ssh_key(token)
+    key_calls = fake.total_calls()
+    # Повторный запуск: ID ключа берется из кэша
+    with quiet():
+        module.create_ssh_key(token)
+    cached_key_calls = fake.total_calls() - key_calls
+    trace = timing.Trace(protocol, name)
+    started = time.monotonic()
+    with quiet():
+        module.deploy_node(token, ssh_key_id, name, module.REGION, module.SIZE,
+                           f'{name}{suffix}', trace)
+    elapsed = time.monotonic() - started
+
+    # Нижняя граница: droplet не может быть готов раньше имитированной загрузки
+    floor = fake.boot_time + fake.cloud_init
+    return {
+        'seconds': round(elapsed, 3),
+        'floor': round(floor, 3),
+        'overhead': round(elapsed - floor, 3),
+        'api_calls': fake.total_calls() - key_calls - cached_key_calls,
+        'ssh_key_calls': key_calls,
+        'ssh_key_calls_cached': cached_key_calls,
+        'poll_calls': fake.calls[('GET', '/v2/actions/{id}')] + fake.calls[('GET', '/v2/droplets/{id}')],
+        'phases': {p['phase']: p['seconds'] for p in trace.phases},
+    }
+
+
+def bench_fleet(fake, sizes):
+    import deploy_fleet
+    results = {}
+    for count in sizes:
+        token = f'bench-fleet-{count}'
+        fake.calls.clear()
+        started = time.monotonic()
+        with quiet():
+            inventory = deploy_fleet.deploy_fleet(token, 'wireguard', [('fra1', 's-1vcpu-1gb', count)],
+                                                  f'fleet{count}')
+        elapsed = time.monotonic() - started
+        calls = fake.total_calls()
+        polls = (fake.calls[('GET', '/v2/droplets')] + fake.calls[('GET', '/v2/droplets/{id}')]
+                 + fake.calls[('GET', '/v2/actions/{id}')])
+        results[str(count)] = {
+            'seconds': round(elapsed, 3),
+            'failed': sum(1 for info in inventory if info.get('error')),
+            'api_calls': calls,
+            'calls_per_node': round(calls / count, 2),
+            'poll_calls': polls,
+        }
+    # Эффективность параллелизма: время одного узла к времени всего парка
+    base = results[str(sizes[0])]['seconds']
+    for result in results.values():
+        result['efficiency'] = round(base / result['seconds'], 2)
+    return results
+
+
+def bench_errors(fake, error_rate, count):
+    import deploy_fleet
+    token = 'bench-errors'
+    fake.calls.clear()
+    fake.error_rate = error_rate
+    started = time.monotonic()
+    try:
+        with quiet():
+            inventory = deploy_fleet.deploy_fleet(token, 'wireguard', [('fra1', 's-1vcpu-1gb', count)],
+                                                  'errors')
+    finally:
+        fake.error_rate = 0.0
+    requests_made, retries = client_stats(token)
+    return {
+        'error_rate': error_rate,
+        'seconds': round(time.monotonic() - started, 3),
+        'failed': sum(1 for info in inventory if info.get('error')),
+        'injected': fake.errors_injected,
+        'retries': retries,
+        'api_calls': fake.total_calls(),
+    }
+
+
+def bench_delete(fake, count):
+    import delete_vpn
+    import delete_fleet
+    from do_api import get_client
+    token = 'bench-delete'
+    api = get_client(token)
+
+    def create(tag):
+        response = api.post('/droplets', json={'names': [f'{tag}-{i}' for i in range(count)],
+                                               'region': 'fra1', 'size': 's-1vcpu-1gb',
+                                               'image': 'ubuntu-22-04-x64', 'tags': [tag]})
+        return [droplet['id'] for droplet in response.json()['droplets']]
+
+    def measure(delete):
+        fake.calls.clear()
+        started = time.monotonic()
+        with quiet():
+            failed = delete()
+        return {
+            'deleted': count - failed,
+            'seconds': round(time.monotonic() - started, 3),
+            'api_calls': fake.total_calls(),
+        }
+
+    # Прежний путь: по одному droplet, последовательно
+    ids = create('del-seq')
+    results = {'nodes': count, 'sequential': measure(
+        lambda: sum(1 for droplet_id in ids if not delete_vpn.delete_droplet(token, droplet_id)))}
+    # Параллельно по ID (выборка из инвентаря) и одним запросом по тегу, с ожиданием удаления
+    ids = create('del-ids')
+    results['by_ids'] = measure(lambda: len(delete_fleet.delete_fleet(token, [], set(ids))))
+    ids = create('del-tag')
+    results['by_tag'] = measure(lambda: len(delete_fleet.delete_fleet(token, [], set(ids), 'del-tag')))
+    return results
+
+
+def bench_peers(count, bulk):
+    import wg_keys
+    import wg_peers
+    from ssh_session import get_session
+    state = wg_peers.PeerState.create('bench-peers', '203.0.113.250', '10.0.0.0/16',
+                                      wg_keys.generate_keypair()[1], 51820)
+    session = get_session(state.data['ip'], Path('bench_key'))
+
+    started = time.monotonic()
+    for i in range(count):
+        name = f'hot-{i}'
+        state.add_peer(name)
+        wg_peers.apply_changes(session, state, added=[name])
+    add_seconds = time.monotonic() - started
+
+    started = time.monotonic()
+    for i in range(count):
+        wg_peers.apply_changes(session, state, removed=[state.remove_peer(f'hot-{i}')])
+    revoke_seconds = time.monotonic() - started
+
+    for i in range(bulk):
+        state.add_peer(f'bulk-{i}')
+    started = time.monotonic()
+    wg_peers.sync_peers(session, state)
+    sync_seconds = time.monotonic() - started
+
+    return {
+        'ms_per_op': round((add_seconds + revoke_seconds) * 1000 / (2 * count), 2),
+        'bulk_peers': bulk,
+        'seconds': round(sync_seconds, 3),
+    }
+
+
+def bench_resume(fake):
+    import timing
+    import deploy_vpn
+    token = 'bench-resume'
+    name = 'bench-resume'
+    with quiet():
+        ssh_key_id = deploy_vpn.create_ssh_key(token)
+
+    def deploy():
+        trace = timing.Trace('wireguard', name)
+        started = time.monotonic()
+        try:
+            with quiet():
+                deploy_vpn.deploy_node(token, ssh_key_id, name, deploy_vpn.REGION, deploy_vpn.SIZE,
+                                       f'{name}.conf', trace)
+        except SystemExit:
+            pass
+        return round(time.monotonic() - started, 3)
+
+    # Первый запуск падает в ожидании droplet, как при таймауте или обрыве
+    # сети: к повторному запуску droplet уже загружен
+    def interrupted(*args, **kwargs):
+        time.sleep(fake.boot_time + fake.ip_delay)
+        sys.exit(1)
+
+    wait_for_droplet = deploy_vpn.wait_for_droplet
+    deploy_vpn.wait_for_droplet = interrupted
+    try:
+        failed_seconds = deploy()
+    finally:
+        deploy_vpn.wait_for_droplet = wait_for_droplet
+    fake.calls.clear()
+    seconds = deploy()
+    return {
+        'failed_run_seconds': failed_seconds,
+        'seconds': seconds,
+        'droplets_created': fake.calls[('POST', '/v2/droplets')],
+        'api_calls': fake.total_calls(),
+    }
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Вернуть список регрессий относительно baseline"""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for key, value in current.items():
+        old = previous.get(key)
+        if old is None or key.rsplit('.', 1)[-1] not in LOWER_IS_BETTER or '.phases.' in key:
+            continue
+        # Мелкие абсолютные значения шумят: порог не меньше 0.2 (секунды/запросы)
+        if value > old * (1 + tolerance) and value - old > 0.2:
+            regressions.append(f"{key}: {old} → {value}")
+    return regressions
+
+
+def print_results(results):
+    for key, value in flatten(results).items():
+        print(f"   {key:<40} {value}")
+
+
+def main():
+    global VERBOSE
+    parser = argparse.ArgumentParser(description="Бенчмарк развертывания на имитации DigitalOcean")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--fleet-sizes', nargs='+', type=int, default=[1, 10, 50])
+    parser.add_argument('--boot-time', type=float, default=2.0, help="new → active, секунды")
+    parser.add_argument('--ip-delay', type=float, default=0.5)
+    parser.add_argument('--cloud-init', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка ответа API, секунды")
+    parser.add_argument('--error-rate', type=float, default=0.2)
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    parser.add_argument('--baseline', help="сравнить с сохраненными результатами")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="допустимый рост метрик")
+    parser.add_argument('--verbose', action='store_true', help="показывать вывод скриптов")
+    args = parser.parse_args()
+    VERBOSE = args.verbose
+    # Пути оператора - до перехода во временный каталог
+    output = Path(args.json).resolve() if args.json else None
+    baseline_file = Path(args.baseline).resolve() if args.baseline else None
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    # Фиксированный seed: одинаковая последовательность ошибок от запуска к запуску
+    fake = fake_do.FakeDigitalOcean(args.latency, args.boot_time, args.ip_delay, args.cloud_init,
+                                    seed=1)
+    api_url = fake.start()
+    workdir = Path(tempfile.mkdtemp(prefix='vpn-bench-'))
+    prepare_environment(api_url, workdir)
+
+    print(f"🧪 Бенчмарк: API {api_url}, каталог {workdir}")
+    print(f"   boot {args.boot_time}s, IP +{args.ip_delay}s, cloud-init +{args.cloud_init}s, "
+          f"задержка API {args.latency * 1000:.0f} ms")
+
+    results = {}
+    for scenario in args.scenarios:
+        print(f"\n▶ {scenario}")
+        started = time.monotonic()
+        if scenario == 'deploy':
+            results['deploy'] = {protocol: bench_deploy(fake, protocol)
+                                 for protocol in ('wireguard', 'openvpn')}
+        elif scenario == 'fleet':
+            results['fleet'] = bench_fleet(fake, args.fleet_sizes)
+        elif scenario == 'errors':
+            results['errors'] = bench_errors(fake, args.error_rate, 5)
+        elif scenario == 'delete':
+            results['delete'] = bench_delete(fake, 20)
+        elif scenario == 'peers':
+            results['peers'] = bench_peers(50, 1000)
+        elif scenario == 'resume':
+            results['resume'] = bench_resume(fake)
+        print_results({scenario: results[scenario]})
+        print(f"   ({time.monotonic() - started:.1f}s)")
+
+    fake.stop()
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Результаты: {output}")
+
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Регрессии (> {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ Регрессий нет")
+
+if __name__ == '__main__':
+    main()
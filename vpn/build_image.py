@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Скрипт для сборки снимка (snapshot) с предустановленным VPN ПО
+
+Устанавливает пакеты на временный droplet, делает снимок, копирует его в
+нужные регионы и записывает ID в images.json. После этого create_droplet
+загружается со снимка и выполняет только настройку узла.
+
+После успешной сборки старые снимки протокола (<протокол>-ГГГГММДД-ЧЧММСС)
+удаляются: остаются KEEP_SNAPSHOTS самых новых, включая собранный, чтобы
+можно было откатиться на предыдущий.
+
+Пример:
+    python3 build_image.py --protocol wireguard --regions fra1 ams3
+    python3 build_image.py --protocol openvpn --if-stale
+    python3 build_image.py --keep 0   # не удалять старые снимки
+"""
+
+import re
+import sys
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from do_api import get_client, wait_for_action, list_all
+import readiness
+import images
+from ssh_session import get_session, close_session
+
+import deploy_vpn
+import deploy_openvpn
+
+PROTOCOLS = {
+    'wireguard': deploy_vpn,
+    'openvpn': deploy_openvpn,
+}
+
+READY_FLAG = '/root/image_ready.txt'
+KEEP_SNAPSHOTS = 2  # собранный снимок и предыдущий для отката
+
+# Очистка перед снимком: новый droplet должен пройти cloud-init заново
+# и получить собственные host ключи и machine-id
+PREPARE_SCRIPT = f"""
+rm -f {READY_FLAG}
+cloud-init clean --logs
+truncate -s 0 /etc/machine-id
+sync
+"""
+
+def create_builder(module, token, ssh_key_id, name, region, callback_url):
+    """Создать временный droplet, который только устанавливает пакеты"""
+    print(f"🚀 Создание droplet {name} для сборки снимка...")
+
+    user_data = ("#!/bin/bash\n" + module.INSTALL_SCRIPT
+                 + f"\ntouch {READY_FLAG}\n"
+                 + readiness.phone_home_snippet(callback_url))
+
+    data = {
+        'name': name,
+        'region': region,
+        'size': module.SIZE,
+        'image': module.IMAGE,
+        'ssh_keys': [ssh_key_id],
+        'user_data': user_data,
+        'monitoring': False,
+        'backups': False,
+        'ipv6': False
+    }
+
+    response = get_client(token).post('/droplets', json=data)
+    if response.status_code != 202:
+        print(f"❌ Ошибка создания droplet: {response.text}")
+        sys.exit(1)
+
+    droplet_id = response.json()['droplet']['id']
+    print(f"✅ Droplet создан: {droplet_id}")
+    actions = response.json().get('links', {}).get('actions', [])
+    return droplet_id, next((a['id'] for a in actions if a.get('rel') == 'create'), None)
+
+def droplet_action(api, droplet_id, action, timeout=600, **params):
+    """Запустить действие над droplet и дождаться его завершения"""
+    response = api.post(f'/droplets/{droplet_id}/actions', json={'type': action, **params})
+    if response.status_code != 201:
+        print(f"❌ Ошибка действия {action}: {response.text}")
+        return False
+    status = wait_for_action(api, response.json()['action']['id'], timeout=timeout)
+    if status != 'completed':
+        print(f"❌ Действие {action} завершилось со статусом {status}")
+        return False
+    return True
+
+def find_snapshot(api, droplet_id, snapshot_name):
+    """Найти ID снимка droplet по имени"""
+    response = api.get(f'/droplets/{droplet_id}/snapshots')
+    if response.status_code != 200:
+        return None
+    for snapshot in response.json().get('snapshots', []):
+        if snapshot['name'] == snapshot_name:
+            return snapshot['id']
+    return None
+
+def transfer_image(api, image_id, region):
+    """Скопировать снимок в регион"""
+    print(f"📦 Копирование снимка в {region}...")
+    response = api.post(f'/images/{image_id}/actions', json={'type': 'transfer', 'region': region})
+    if response.status_code != 201:
+        print(f"❌ Ошибка копирования в {region}: {response.text}")
+        return None
+    status = wait_for_action(api, response.json()['action']['id'], timeout=3600)
+    return region if status == 'completed' else None
+
+def prune_snapshots(api, protocol, current_id, keep=KEEP_SNAPSHOTS):
+    """Удалить старые снимки протокола, оставив keep самых новых; вернуть число удаленных"""
+    snapshots = list_all(api, '/snapshots?resource_type=droplet&per_page=200', 'snapshots')
+    if snapshots is None:
+        print("⚠️  Не удалось получить список снимков, старые снимки не удалены")
+        return 0
+    # Имя содержит время сборки: сортировка по имени - от новых к старым
+    pattern = re.compile(rf'{re.escape(protocol)}-\d{{8}}-\d{{6}}')
+    older = sorted((snapshot for snapshot in snapshots
+                    if pattern.fullmatch(snapshot['name']) and str(snapshot['id']) != str(current_id)),
+                   key=lambda snapshot: snapshot['name'], reverse=True)
+    removed = 0
+    for snapshot in older[keep - 1:]:
+        response = api.delete(f"/snapshots/{snapshot['id']}")
+        if response.status_code in (204, 404):
+            print(f"🗑️  Удален старый снимок {snapshot['name']} ({snapshot['id']})")
+            removed += 1
+        else:
+            print(f"⚠️  Не удалось удалить снимок {snapshot['name']}: {response.text}")
+    return removed
+
+def build_image(token, protocol, regions, keep=KEEP_SNAPSHOTS):
+    """Собрать снимок и записать его в реестр; вернуть запись реестра
+
+    keep - сколько снимков протокола оставить после сборки (0 - не удалять).
+    """
+    module = PROTOCOLS[protocol]
+    api = get_client(token)
+    stamp = datetime.now(timezone.utc)
+    name = f"{protocol}-image-builder"
+    snapshot_name = f"{protocol}-{stamp:%Y%m%d-%H%M%S}"
+
+    ssh_key_id = module.create_ssh_key(token)
+    callback_url, ready = readiness.register(name)
+    droplet_id, action_id = create_builder(module, token, ssh_key_id, name, regions[0], callback_url)
+
+    try:
+        ip = module.wait_for_droplet(token, droplet_id, action_id)
+        if not module.wait_for_ssh(ip):
+            print("❌ Не удалось подключиться по SSH")
+            return None
+
+        session = get_session(ip, module.SSH_KEY_PATH)
+
+        def installed():
+            result = session.run(f'test -f {READY_FLAG} && echo "ready"')
+            return result.returncode == 0 and 'ready' in result.stdout
+
+        print("⏳ Ожидание установки пакетов...")
+        if not readiness.wait_until(installed, ready, timeout=900):
+            print("❌ Timeout: установка пакетов не завершилась")
+            return None
+
+        session.run(PREPARE_SCRIPT, timeout=60)
+        close_session(ip)
+
+        print("⏻  Выключение droplet...")
+        if not droplet_action(api, droplet_id, 'power_off'):
+            return None
+
+        print(f"📸 Создание снимка {snapshot_name}...")
+        if not droplet_action(api, droplet_id, 'snapshot', timeout=1800, name=snapshot_name):
+            return None
+
+        snapshot_id = find_snapshot(api, droplet_id, snapshot_name)
+        if snapshot_id is None:
+            print("❌ Снимок не найден после создания")
+            return None
+        print(f"✅ Снимок создан: {snapshot_id}")
+
+        available = [regions[0]]
+        if len(regions) > 1:
+            with ThreadPoolExecutor(max_workers=len(regions) - 1) as pool:
+                done = pool.map(lambda region: transfer_image(api, snapshot_id, region), regions[1:])
+                available += [region for region in done if region]
+    finally:
+        print(f"🗑️  Удаление droplet {droplet_id}...")
+        api.delete(f'/droplets/{droplet_id}')
+
+    record = {
+        'snapshot_id': snapshot_id,
+        'name': snapshot_name,
+        'created_at': stamp.isoformat(),
+        'base_image': module.IMAGE,
+        'recipe': images.recipe_hash(module.INSTALL_SCRIPT),
+        'regions': available
+    }
+    images.save_image(protocol, record)
+    if keep:
+        prune_snapshots(api, protocol, snapshot_id, keep)
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка снимка с предустановленным VPN ПО")
+    parser.add_argument('--protocol', choices=sorted(PROTOCOLS), default='wireguard')
+    parser.add_argument('--regions', nargs='+', default=None,
+                        help="регионы, в которых нужен снимок (первый - регион сборки)")
+    parser.add_argument('--if-stale', action='store_true',
+                        help="собирать только если снимка нет или он устарел")
+    parser.add_argument('--keep', type=int, default=KEEP_SNAPSHOTS,
+                        help="сколько снимков протокола оставить после сборки (0 - не удалять)")
+    args = parser.parse_args()
+
+    module = PROTOCOLS[args.protocol]
+    regions = args.regions or [module.REGION]
+
+    if args.if_stale:
+        record = images.load_images().get(args.protocol)
+        reason = images.staleness(record, module.INSTALL_SCRIPT) if record else "снимка нет"
+        missing = set(regions) - set(record.get('regions', [])) if record else set()
+        if reason is None and not missing:
+            print(f"✅ Снимок {record['name']} ({record['snapshot_id']}) актуален")
+            return
+        print(f"🔄 Пересборка снимка: {reason or 'нет в регионах ' + ', '.join(sorted(missing))}")
+
+    print("=" * 60)
+    print(f"📸 Сборка снимка {args.protocol} на DigitalOcean")
+    print("=" * 60)
+
+    token = module.get_do_token()
+    record = build_image(token, args.protocol, regions, args.keep)
+    get_client(token).report()
+
+    if not record:
+        print("❌ Снимок не собран")
+        sys.exit(1)
+
+    print(f"\n✅ Снимок {record['name']} ({record['snapshot_id']}) записан в {images.IMAGES_FILE}")
+    print(f"   Регионы: {', '.join(record['regions'])}")
+
+if __name__ == '__main__':
+    main()
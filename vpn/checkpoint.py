@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Контрольные точки развертывания
+
+Результаты завершенных шагов развертывания (регион, ключи сервера,
+созданный droplet, его IP) записываются после каждого шага в
+deployments/<ID развертывания>.json. ID по умолчанию - протокол и имя
+droplet (wireguard-vpn-server), поэтому повторный запуск после сбоя
+(таймаут ожидания, обрыв сети) продолжает с последнего завершенного шага
+и берет уже созданный droplet вместо нового. После успешного
+развертывания файл удаляется.
+
+Перед продолжением проверяется, что droplet еще существует: если его
+удалили или создание droplet завершилось ошибкой (action errored - такой
+droplet удаляется), шаги от создания droplet выполняются заново. Файл содержит
+закрытый ключ сервера WireGuard и создается с правами 0600.
+
+    python3 checkpoint.py                                 # незавершенные развертывания
+    python3 checkpoint.py --discard wireguard-vpn-server  # начать заново
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+
+from do_api import get_client
+import inventory
+
+STATE_DIR = Path('deployments')
+
+# Шаги, результаты которых относятся к конкретному droplet
+DROPLET_STEPS = ('create_droplet', 'wait_for_droplet')
+
+
+def deployment_id(protocol, name):
+    return f"{protocol}-{name}"
+
+
+class Checkpoint:
+    """Результаты шагов одного развертывания"""
+
+    def __init__(self, deployment, params=None):
+        self.id = deployment
+        self.path = STATE_DIR / f'{deployment}.json'
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {'id': deployment, 'params': params or {}, 'started': time.time(), 'steps': {}}
+
+    @property
+    def steps(self):
+        return self.data['steps']
+
+    def __contains__(self, name):
+        return name in self.data['steps']
+
+    def get(self, name, default=None):
+        return self.data['steps'].get(name, default)
+
+    def save(self, name, value):
+        """Записать результат шага"""
+        with self._lock:
+            self.data['steps'][name] = value
+            self.data['updated'] = time.time()
+            self._write()
+
+    def forget(self, names):
+        """Забыть результаты шагов: они выполнятся заново"""
+        with self._lock:
+            for name in names:
+                self.data['steps'].pop(name, None)
+            self._write()
+
+    def discard(self):
+        """Удалить контрольную точку (развертывание завершено или начинается заново)"""
+        self.path.unlink(missing_ok=True)
+
+    def _write(self):
+        STATE_DIR.mkdir(mode=0o700, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def resume(token, protocol, name, params, deployment=None):
+    """Контрольная точка развертывания: незавершенная - для продолжения, иначе новая
+
+    params (размер, профиль сети, заданный регион) должны совпадать с
+    сохраненными, иначе продолжение достроило бы не тот сервер.
+    """
+    checkpoint = Checkpoint(deployment or deployment_id(protocol, name), params)
+    if not checkpoint.steps:
+        return checkpoint
+
+    saved = checkpoint.data['params']
+    changed = [key for key in params if saved.get(key) != params[key]]
+    if changed:
+        print(f"❌ Развертывание {checkpoint.id} начато с другими параметрами: "
+              + ", ".join(f"{key} {saved.get(key)} → {params[key]}" for key in changed))
+        print(f"   Повторите с прежними параметрами или начните заново: "
+              f"python3 checkpoint.py --discard {checkpoint.id}")
+        sys.exit(1)
+
+    droplet = checkpoint.get('create_droplet')
+    if droplet is not None:
+        api = get_client(token)
+        response = api.get(f'/droplets/{droplet[0]}')
+        if response.status_code == 404:
+            print(f"⚠️  Droplet {droplet[0]} из контрольной точки {checkpoint.id} удален, будет создан новый")
+            inventory.remove(droplet[0])
+            checkpoint.forget(DROPLET_STEPS)
+        elif (droplet[1] is not None and 'wait_for_droplet' not in checkpoint
+              and response.status_code == 200 and response.json()['droplet']['status'] != 'active'):
+            # Droplet с ошибкой создания не станет активным: ожидание его
+            # action при каждом запуске заканчивалось бы той же ошибкой
+            response = api.get(f'/actions/{droplet[1]}')
+            if response.status_code == 200 and response.json()['action']['status'] == 'errored':
+                print(f"⚠️  Создание droplet {droplet[0]} из контрольной точки {checkpoint.id} "
+                      f"завершилось ошибкой: droplet удаляется, будет создан новый")
+                if api.delete(f'/droplets/{droplet[0]}').status_code in (204, 404):
+                    inventory.remove(droplet[0])
+                checkpoint.forget(DROPLET_STEPS)
+    print(f"⏩ Продолжение развертывания {checkpoint.id} ({checkpoint.path})")
+    return checkpoint
+
+
+def list_checkpoints():
+    """Незавершенные развертывания, последние изменения первыми"""
+    if not STATE_DIR.exists():
+        return []
+    checkpoints = [Checkpoint(path.stem) for path in STATE_DIR.glob('*.json')]
+    return sorted(checkpoints, key=lambda c: c.data.get('updated', c.data['started']), reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Незавершенные развертывания")
+    parser.add_argument('--discard', nargs='+', metavar='ID', help="удалить контрольные точки")
+    args = parser.parse_args()
+
+    if args.discard:
+        for deployment in args.discard:
+            checkpoint = Checkpoint(deployment)
+            if not checkpoint.path.exists():
+                print(f"⚠️  Нет контрольной точки {deployment}")
+                continue
+            checkpoint.discard()
+            droplet = checkpoint.get('create_droplet')
+            print(f"🗑️  {deployment} удалена"
+                  + (f"; droplet {droplet[0]} остался в инвентаре (delete_vpn.py / delete_openvpn.py)"
+                     if droplet else ""))
+        return
+
+    checkpoints = list_checkpoints()
+    if not checkpoints:
+        print("Незавершенных развертываний нет")
+        return
+    print(f"{'ID':<36} {'droplet':>12} {'обновлено':<20} шаги")
+    for checkpoint in checkpoints:
+        droplet = checkpoint.get('create_droplet')
+        updated = time.strftime('%Y-%m-%d %H:%M:%S',
+                                time.localtime(checkpoint.data.get('updated', checkpoint.data['started'])))
+        print(f"{checkpoint.id:<36} {droplet[0] if droplet else '-':>12} {updated:<20} "
+              f"{', '.join(checkpoint.steps)}")
+
+if __name__ == '__main__':
+    main()
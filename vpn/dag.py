@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Планировщик шагов развертывания по графу зависимостей
+
+Шаг запускается, как только готовы результаты всех его зависимостей, так
+что независимые шаги (SSH ключ в аккаунте, выбор региона, генерация
+ключей) идут параллельно. У шага есть таймаут и число повторов; каждый
+шаг записывается фазой в timing.Trace. После прогона доступен
+критический путь - цепочка шагов, определившая общее время.
+
+С контрольной точкой (checkpoint.Checkpoint) результаты отмеченных шагов
+сохраняются по завершении; при повторном запуске они берутся из нее, а
+шаги, нужные только для уже сохраненных результатов, не выполняются.
+
+    graph = dag.Graph(trace)
+    graph.value('size', 's-1vcpu-1gb')
+    graph.step('region', lambda: regions.select_region('fra1'), timeout=10)
+    graph.step('droplet', create, deps=['region', 'size'], timeout=120)
+    results = graph.run()
+    graph.report()
+"""
+
+import time
+import threading
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+RETRY_BACKOFF = 1.0   # пауза перед первым повтором шага, удваивается
+
+
+class StepTimeout(Exception):
+    """Шаг не завершился за отведенное время"""
+
+
+def _same(value):
+    return value
+
+
+class Step:
+    def __init__(self, name, func, deps, timeout, retries, checkpoint=None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.retries = retries
+        self.saved = bool(checkpoint)
+        self.encode, self.decode = checkpoint if isinstance(checkpoint, tuple) else (_same, _same)
+
+
+class Graph:
+    """Шаги с зависимостями; результаты зависимостей передаются в шаг по порядку deps"""
+
+    def __init__(self, trace=None, checkpoint=None):
+        self.trace = trace
+        self.checkpoint = checkpoint
+        self.steps = {}
+        self.results = {}
+        # шаги, результаты которых взяты из контрольной точки
+        self.resumed = []
+        # шаг: (начало, конец, успех) по time.monotonic()
+        self.spans = {}
+        self._ends = {}
+
+    def value(self, name, value):
+        """Готовый вход без шага (например, ID SSH ключа, общий для парка)"""
+        self.results[name] = value
+
+    def step(self, name, func, deps=(), timeout=None, retries=0, checkpoint=None):
+        """Добавить шаг; зависимости должны быть объявлены раньше (циклы невозможны)
+
+        Повторяются только исключения Exception: SystemExit скриптов
+        развертывания и таймаут шага - окончательные ошибки. Шаги с
+        неидемпотентными запросами (создание droplet) не повторяются.
+        checkpoint - сохранять результат в контрольную точку графа: True,
+        если результат хранится в JSON как есть, или пара функций (в JSON,
+        из JSON).
+        """
+        unknown = [dep for dep in deps if dep not in self.steps and dep not in self.results]
+        if unknown:
+            raise ValueError(f"Шаг {name}: неизвестные зависимости {', '.join(unknown)}")
+        self.steps[name] = Step(name, func, deps, timeout, retries, checkpoint)
+
+    def _call(self, step):
+        args = [self.results[dep] for dep in step.deps]
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                try:
+                    result = step.func(*args)
+                except Exception as e:
+                    if attempt > step.retries:
+                        raise
+                    print(f"⚠️  Шаг {step.name}: {type(e).__name__}: {e}, повтор {attempt}/{step.retries}")
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+                    continue
+                # Результат сохраняется до того, как его увидят зависимые шаги
+                if step.saved and self.checkpoint is not None:
+                    self.checkpoint.save(step.name, step.encode(result))
+                return result
+        finally:
+            self._ends[step.name] = time.monotonic()
+
+    def _start(self, step):
+        """Запустить шаг в daemon потоке; вернуть Future с его результатом"""
+        future = Future()
+
+        def target():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(self._call(step))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name=f'step-{step.name}', daemon=True).start()
+        return future
+
+    def _restore(self):
+        """Шаги для выполнения с учетом контрольной точки
+
+        Сохраненные результаты берутся без запуска шагов. Шаг нужен, если
+        его результата нет, и он конечный или вход нужного шага; шаги
+        объявлены после своих зависимостей, поэтому хватает обратного прохода.
+        """
+        if self.checkpoint is None:
+            return dict(self.steps)
+        for name, step in self.steps.items():
+            if step.saved and name in self.checkpoint:
+                self.results[name] = step.decode(self.checkpoint.get(name))
+                self.resumed.append(name)
+        needed = set()
+        for name in reversed(list(self.steps)):
+            if name in self.resumed:
+                continue
+            dependents = [other for other in self.steps.values() if name in other.deps]
+            if not dependents or any(other.name in needed for other in dependents):
+                needed.add(name)
+        if self.resumed:
+            skipped = [name for name in self.steps if name not in needed and name not in self.resumed]
+            print(f"⏩ Из контрольной точки: {', '.join(self.resumed)}"
+                  + (f"; не нужны: {', '.join(skipped)}" if skipped else ""))
+            if self.trace is not None:
+                self.trace.resumed = list(self.resumed)
+        return {name: step for name, step in self.steps.items() if name in needed}
+
+    def _finish(self, step, start, end, error=None):
+        self.spans[step.name] = (start, end, error is None)
+        if self.trace is not None:
+            self.trace.span(step.name, start, end, error is None,
+                            f"{type(error).__name__}: {error}" if error is not None else None)
+
+    def run(self):
+        """Выполнить все шаги; вернуть {шаг: результат}
+
+        После первой ошибки новые шаги не запускаются, уже запущенные
+        дорабатывают, затем ошибка пробрасывается. Поток шага, превысившего
+        таймаут, прервать нельзя: запуск сразу завершается с StepTimeout, а
+        шаг остается в фоне. Шаги идут в daemon потоках, поэтому зависший
+        шаг (SSH, API) не задерживает и выход процесса.
+        """
+        pending = self._restore()
+        running = {}
+        error = None
+        try:
+            while pending or running:
+                if error is None:
+                    for name, step in list(pending.items()):
+                        if all(dep in self.results for dep in step.deps):
+                            del pending[name]
+                            running[self._start(step)] = (step, time.monotonic())
+                if not running:
+                    break
+
+                deadlines = [started + step.timeout for step, started in running.values()
+                             if step.timeout is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    step, started = running.pop(future)
+                    end = self._ends.get(step.name, time.monotonic())
+                    try:
+                        self.results[step.name] = future.result()
+                    except BaseException as e:
+                        self._finish(step, started, end, e)
+                        error = error or e
+                    else:
+                        self._finish(step, started, end)
+
+                now = time.monotonic()
+                for future, (step, started) in list(running.items()):
+                    if step.timeout is not None and now - started >= step.timeout:
+                        del running[future]
+                        e = StepTimeout(f"шаг {step.name} не завершился за {step.timeout}s")
+                        self._finish(step, started, now, e)
+                        error = error or e
+        finally:
+            if self.trace is not None:
+                self.trace.critical_path = [[name, round(seconds, 3)]
+                                            for name, seconds in self.critical_path()]
+
+        if error is not None:
+            raise error
+        return self.results
+
+    def critical_path(self):
+        """[(шаг, секунды)] от первого шага до того, что завершился последним
+
+        Предшественник шага - зависимость, завершившаяся последней: именно
+        ее ждал шаг перед стартом.
+        """
+        if not self.spans:
+            return []
+        name = max(self.spans, key=lambda n: self.spans[n][1])
+        path = []
+        while name is not None:
+            start, end, _ = self.spans[name]
+            path.append((name, end - start))
+            deps = [dep for dep in self.steps[name].deps if dep in self.spans]
+            name = max(deps, key=lambda d: self.spans[d][1]) if deps else None
+        return path[::-1]
+
+    def report(self):
+        """Вывести критический путь последнего прогона"""
+        path = self.critical_path()
+        if not path:
+            return
+        total = sum(seconds for _, seconds in path)
+        steps = ' → '.join(f"{name} {seconds:.2f}s" for name, seconds in path)
+        print(f"🧭 Критический путь ({total:.1f}s): {steps}")
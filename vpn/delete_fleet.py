@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Скрипт для массового удаления VPN серверов по тегу или запросу к инвентарю
+
+С --tag droplet удаляются одним запросом DELETE /droplets?tag_name=<тег>
+(deploy_fleet.py помечает узлы парка тегом fleet-<префикс>, все droplet -
+тегами vpn и vpn-<протокол>). Иначе серверы выбираются из инвентаря
+(inventory.py) и удаляются параллельно по ID. Подтверждение запрашивается
+один раз на весь набор; затем скрипт параллельно ждет, пока droplet
+исчезнут из API, и удаляет локальные конфигурации удаленных узлов.
+
+Пример:
+    python3 delete_fleet.py --tag fleet-vpn-server
+    python3 delete_fleet.py --protocol openvpn --region fra1
+    python3 delete_fleet.py --tag vpn --region ams3 --yes
+"""
+
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from do_api import get_client, list_all
+
+import delete_vpn
+import delete_openvpn
+import inventory
+
+# Локальные файлы узла удаляются так же, как при удалении одного сервера
+CLEANUP = {
+    'wireguard': delete_vpn.cleanup_local,
+    'openvpn': delete_openvpn.cleanup_local,
+}
+
+MAX_WORKERS = 20
+DELETE_TIMEOUT = 300   # секунды ожидания исчезновения droplet
+
+def list_tagged(api, tag):
+    """Все droplet с тегом (постранично, до 200 на страницу)"""
+    droplets = list_all(api, f'/droplets?tag_name={tag}&per_page=200', 'droplets')
+    if droplets is None:
+        print(f"❌ Ошибка получения списка droplet с тегом {tag}")
+        sys.exit(1)
+    return droplets
+
+def select_nodes(api, args):
+    """Записи для удаления: droplet с тегом из API или выборка из инвентаря
+
+    Droplet с тегом, которых нет в инвентаре (например, созданные на другой
+    машине), тоже удаляются; записи инвентаря с тегом, которых уже нет в
+    API, попадают в набор только для очистки локальных файлов.
+    """
+    query = {'protocol': args.protocol, 'region': args.region, 'name': args.name,
+             'status': args.status}
+    if args.tag and not any(query.values()):
+        records = {r['droplet_id']: r for r in inventory.find(tag=args.tag)}
+        live = set()
+        for droplet in list_tagged(api, args.tag):
+            live.add(droplet['id'])
+            records.setdefault(droplet['id'], {
+                'droplet_id': droplet['id'],
+                'name': droplet['name'],
+                'protocol': None,
+                'region': droplet['region']['slug'],
+                'ip': None,
+            })
+        return list(records.values()), live
+    records = inventory.find(tag=args.tag, **query)
+    return records, {r['droplet_id'] for r in records}
+
+def delete_one(api, droplet_id):
+    """Удалить droplet по ID; 404 - уже удален"""
+    response = api.delete(f'/droplets/{droplet_id}')
+    if response.status_code in (204, 404):
+        return None
+    return response.text
+
+def delete_by_ids(api, ids, workers=MAX_WORKERS):
+    """Удалить droplet параллельно; вернуть {ID: ошибка} для неудачных"""
+    if not ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(ids))) as pool:
+        errors = dict(zip(ids, pool.map(lambda droplet_id: delete_one(api, droplet_id), ids)))
+    return {droplet_id: error for droplet_id, error in errors.items() if error}
+
+def delete_by_tag(api, tag):
+    """Удалить все droplet с тегом одним запросом; вернуть текст ошибки или None"""
+    response = api.delete(f'/droplets?tag_name={tag}')
+    return None if response.status_code == 204 else response.text
+
+def droplet_exists(api, droplet_id):
+    response = api.get(f'/droplets/{droplet_id}', call_class='poll')
+    return response.status_code != 404
+
+def wait_deleted(api, ids, tag=None, timeout=DELETE_TIMEOUT, interval=2, max_interval=10,
+                 workers=MAX_WORKERS):
+    """Ждать, пока droplet исчезнут из API; вернуть ID, оставшиеся к таймауту
+
+    При удалении по тегу остаток проверяется списком по тегу (запрос на
+    страницу), иначе - параллельными запросами по ID.
+    """
+    remaining = set(ids)
+    deadline = time.monotonic() + timeout
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(remaining)))) as pool:
+        while remaining:
+            if tag:
+                present = {droplet['id'] for droplet in list_tagged(api, tag)}
+            else:
+                checked = list(remaining)
+                exists = pool.map(lambda droplet_id: droplet_exists(api, droplet_id), checked)
+                present = {droplet_id for droplet_id, alive in zip(checked, exists) if alive}
+            remaining &= present
+            if not remaining or time.monotonic() + interval > deadline:
+                break
+            time.sleep(interval)
+            interval = min(max_interval, interval * 1.5)
+    return remaining
+
+def cleanup(records, failed):
+    """Удалить записи инвентаря и локальные файлы удаленных узлов"""
+    cleaned = 0
+    for record in records:
+        if record['droplet_id'] in failed:
+            continue
+        cleanup_local = CLEANUP.get(record['protocol'])
+        if cleanup_local is not None:
+            cleanup_local(record)
+            cleaned += 1
+    return cleaned
+
+def delete_fleet(token, records, live, tag=None, workers=MAX_WORKERS):
+    """Удалить набор droplet и дождаться удаления; вернуть {ID: ошибка}"""
+    api = get_client(token)
+    ids = sorted(live)
+    if tag:
+        error = delete_by_tag(api, tag)
+        errors = {droplet_id: error for droplet_id in ids} if error else {}
+    else:
+        errors = delete_by_ids(api, ids, workers)
+
+    pending = [droplet_id for droplet_id in ids if droplet_id not in errors]
+    for droplet_id in wait_deleted(api, pending, tag, workers=workers):
+        errors[droplet_id] = f"droplet не удален за {DELETE_TIMEOUT}s"
+
+    cleanup(records, errors)
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовое удаление VPN серверов")
+    parser.add_argument('--tag', help="тег droplet (без других фильтров - удаление по тегу в API)")
+    parser.add_argument('--protocol', choices=sorted(CLEANUP))
+    parser.add_argument('--region')
+    parser.add_argument('--name')
+    parser.add_argument('--status', help="статус в инвентаре (creating, active)")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--yes', action='store_true', help="не спрашивать подтверждение")
+    args = parser.parse_args()
+
+    if not any((args.tag, args.protocol, args.region, args.name, args.status)):
+        parser.error("укажите --tag или фильтр инвентаря (--protocol, --region, --name, --status)")
+
+    token = delete_vpn.get_do_token()
+    api = get_client(token)
+    records, live = select_nodes(api, args)
+    if not records:
+        print("✅ Нет серверов, подходящих под условия")
+        return
+
+    print(f"🗑️  Будут удалены droplet ({len(live)}):")
+    for record in sorted(records, key=lambda r: r['name']):
+        state = '' if record['droplet_id'] in live else '  (уже удален, только локальные файлы)'
+        print(f"   {record['droplet_id']:<11} {record['name']:<28} {record['region'] or '':<6} "
+              f"{record['ip'] or ''}{state}")
+    if not args.yes:
+        confirm = input(f"⚠️  Удалить {len(records)} серверов? (yes/no): ")
+        if confirm.lower() != 'yes':
+            print("Отменено")
+            sys.exit(0)
+
+    # Удаление по тегу - только если набор совпадает с тегом в API целиком
+    by_tag = args.tag if args.tag and not any((args.protocol, args.region, args.name,
+                                                args.status)) else None
+    started = time.monotonic()
+    errors = delete_fleet(token, records, live, by_tag, args.workers)
+    elapsed = time.monotonic() - started
+
+    print(f"\n✅ Удалено {len(records) - len(errors)}/{len(records)} серверов за {elapsed:.1f}s")
+    if errors:
+        print("⚠️  Не удалены (локальные файлы сохранены):")
+        for droplet_id, error in sorted(errors.items()):
+            print(f"   {droplet_id}: {error}")
+
+    api.report()
+
+    if errors:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
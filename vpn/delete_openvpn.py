@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 """
 Скрипт для удаления OpenVPN сервера с DigitalOcean
+
+Серверы берутся из инвентаря (inventory.py) по droplet ID или имени;
+droplet ID, которого нет в инвентаре, удаляется как есть. Без
+аргументов удаляется единственный openvpn сервер из инвентаря.
+
+Пример:
+    python3 delete_openvpn.py
+    python3 delete_openvpn.py openvpn-server 412345678
 """
 
 import os
 import sys
 import json
-import requests
+import argparse
 from pathlib import Path
 
+from do_api import get_client
+import inventory
+
 def get_do_token():
     """Получить токен DigitalOcean из переменной окружения"""
     token = os.environ.get('DIGITALOCEAN_ACCESS_TOKEN')
@@ -21,54 +32,81 @@ def delete_droplet(token, droplet_id):
     """Удалить droplet"""
     print(f"🗑️  Удаление droplet {droplet_id}...")
     
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.delete(
-        f'https://api.digitalocean.com/v2/droplets/{droplet_id}',
-        headers=headers
-    )
+    response = get_client(token).delete(f'/droplets/{droplet_id}')
     
     if response.status_code == 204:
         print(f"✅ Droplet {droplet_id} удален")
         return True
+    elif response.status_code == 404:
+        print(f"✅ Droplet {droplet_id} уже удален")
+        return True
     else:
         print(f"❌ Ошибка удаления: {response.text}")
         return False
 
-def main():
-    info_file = Path('openvpn_info.json')
+def select_nodes(targets):
+    """Записи инвентаря для удаления: по ID/имени или единственный сервер"""
+    if targets:
+        records = []
+        for target in targets:
+            found = inventory.resolve(target, 'openvpn')
+            if not found and target.isdigit() and inventory.get(int(target)) is None:
+                # Droplet, созданный не этими скриптами: локальных файлов у него нет
+                print(f"⚠️  Droplet {target} нет в инвентаре, будет удален только droplet")
+                found = [{'droplet_id': int(target), 'name': target, 'protocol': None}]
+            if not found:
+                print(f"❌ Сервер {target} не найден в инвентаре ({inventory.DB_FILE})")
+                sys.exit(1)
+            records.extend(found)
+        return records
     
-    if not info_file.exists():
-        print("❌ Файл openvpn_info.json не найден")
-        print("   Укажите droplet_id вручную или запустите скрипт из директории с openvpn_info.json")
+    records = inventory.find(protocol='openvpn')
+    if not records:
+        print("❌ В инвентаре нет серверов openvpn")
+        print("   Укажите droplet_id вручную: python3 delete_openvpn.py <droplet_id>")
         sys.exit(1)
-    
-    with open(info_file, 'r') as f:
-        info = json.load(f)
-    
-    droplet_id = info.get('droplet_id')
-    
-    if not droplet_id:
-        print("❌ droplet_id не найден в openvpn_info.json")
+    if len(records) > 1:
+        print("❌ В инвентаре несколько серверов, укажите какие удалить:")
+        for record in records:
+            print(f"   {record['droplet_id']}  {record['name']}  {record['region']}  {record['ip'] or ''}")
         sys.exit(1)
+    return records
+
+def cleanup_local(record):
+    """Удалить запись инвентаря и локальные файлы сервера"""
+    inventory.remove(record['droplet_id'])
+    config_file = Path(record.get('config_file') or 'client1.ovpn')
+    if config_file.exists():
+        config_file.unlink()
+    
+    # Файл прежних версий скрипта, если он про этот droplet
+    info_file = Path('openvpn_info.json')
+    if info_file.exists():
+        with open(info_file, 'r') as f:
+            info = json.load(f)
+        if info.get('droplet_id') == record['droplet_id']:
+            info_file.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Удаление OpenVPN серверов")
+    parser.add_argument('targets', nargs='*', metavar='droplet', help="droplet ID или имя")
+    args = parser.parse_args()
     
     token = get_do_token()
+    records = select_nodes(args.targets)
     
-    confirm = input(f"⚠️  Вы уверены, что хотите удалить droplet {droplet_id}? (yes/no): ")
+    names = ', '.join(f"{r['name']} ({r['droplet_id']})" for r in records)
+    confirm = input(f"⚠️  Вы уверены, что хотите удалить droplet {names}? (yes/no): ")
     if confirm.lower() != 'yes':
         print("Отменено")
         sys.exit(0)
     
-    if delete_droplet(token, droplet_id):
-        # Удаляем локальные файлы
-        info_file.unlink()
-        config_file = Path('client1.ovpn')
-        if config_file.exists():
-            config_file.unlink()
-        print("✅ Локальные файлы удалены")
+    for record in records:
+        if delete_droplet(token, record['droplet_id']) and record['protocol'] is not None:
+            cleanup_local(record)
+            print(f"✅ Локальные файлы {record['name']} удалены")
+    
+    get_client(token).report()
 
 if __name__ == '__main__':
     main()
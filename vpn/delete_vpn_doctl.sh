@@ -3,15 +3,21 @@
 
 set -e
 
-if [ ! -f "vpn_info.json" ]; then
+# Python скрипты импортируют vpn_info.json в инвентарь и переименовывают его
+INFO_FILE="vpn_info.json"
+if [ ! -f "$INFO_FILE" ] && [ -f "vpn_info.json.imported" ]; then
+    INFO_FILE="vpn_info.json.imported"
+fi
+
+if [ ! -f "$INFO_FILE" ]; then
     echo "❌ Файл vpn_info.json не найден"
     exit 1
 fi
 
-DROPLET_ID=$(grep -o '"droplet_id": [0-9]*' vpn_info.json | grep -o '[0-9]*')
+DROPLET_ID=$(grep -o '"droplet_id": [0-9]*' "$INFO_FILE" | grep -o '[0-9]*')
 
 if [ -z "$DROPLET_ID" ]; then
-    echo "❌ droplet_id не найден в vpn_info.json"
+    echo "❌ droplet_id не найден в $INFO_FILE"
     exit 1
 fi
 
@@ -27,6 +33,6 @@ echo "🗑️  Удаление droplet $DROPLET_ID..."
 doctl compute droplet delete "$DROPLET_ID" -f
 
 # Удаляем локальные файлы
-rm -f vpn_info.json wg0.conf
+rm -f "$INFO_FILE" wg0.conf
 
 echo "✅ Droplet удален и локальные файлы очищены"
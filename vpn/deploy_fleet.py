@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Скрипт для параллельного развертывания парка VPN серверов в нескольких регионах
+
+Регион 'auto' распределяет узлы по --top-k ближайшим регионам (regions.py).
+Все узлы парка получают тег fleet-<префикс>: статус загружающихся droplet
+опрашивается одним списком по тегу (droplet_watch.py), удаление парка -
+одной командой python3 delete_fleet.py --tag fleet-<префикс>.
+
+Пример:
+    python3 deploy_fleet.py fra1:s-1vcpu-1gb:5 ams3:s-1vcpu-1gb:3 nyc1::2
+    python3 deploy_fleet.py --protocol openvpn fra1::10
+    python3 deploy_fleet.py --top-k 3 auto::12
+    python3 deploy_fleet.py --tuning baseline --prefix vpn-a fra1::3
+"""
+
+import sys
+import time
+import uuid
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from do_api import get_client
+
+import deploy_vpn
+import deploy_openvpn
+import timing
+import regions
+import checkpoint
+import droplet_watch
+import tuning
+
+PROTOCOLS = {
+    'wireguard': (deploy_vpn, '.conf'),
+    'openvpn': (deploy_openvpn, '.ovpn'),
+}
+
+FLEET_DIR = Path('fleet')
+MAX_WORKERS = 50
+
+def parse_spec(value, default_size):
+    """Разобрать 'region:size:count' (size можно опустить: 'fra1::3')"""
+    parts = value.split(':')
+    if len(parts) != 3 or not parts[0] or not parts[2].isdigit():
+        raise argparse.ArgumentTypeError(f"ожидается region:size:count, получено '{value}'")
+    region, size, count = parts
+    return region, size or default_size, int(count)
+
+def resolve_auto(specs, top_k, fallback):
+    """Заменить регион 'auto' на top_k ближайших, распределив узлы поровну"""
+    if not any(region == 'auto' for region, _, _ in specs):
+        return specs
+    best = regions.select_regions(top_k, fallback)
+    print(f"📡 Ближайшие регионы: {', '.join(best)}")
+    counts = {}
+    for region, size, count in specs:
+        if region != 'auto':
+            counts[(region, size)] = counts.get((region, size), 0) + count
+            continue
+        for i, picked in enumerate(best):
+            share = count // len(best) + (1 if i < count % len(best) else 0)
+            if share:
+                counts[(picked, size)] = counts.get((picked, size), 0) + share
+    return [(region, size, count) for (region, size), count in counts.items()]
+
+def fleet_tag(prefix):
+    """Тег droplet парка (DigitalOcean: буквы, цифры, '-', '_', ':')"""
+    return 'fleet-' + ''.join(c if c.isalnum() or c in '-_:' else '-' for c in prefix)
+
+def plan_nodes(specs, prefix, config_suffix, tuning_profile=None):
+    """Развернуть спецификацию (region, size, count) в список узлов"""
+    nodes = []
+    for region, size, count in specs:
+        for i in range(1, count + 1):
+            name = f"{prefix}-{region}-{i}"
+            nodes.append({
+                'name': name,
+                'region': region,
+                'size': size,
+                'config_file': str(FLEET_DIR / f"{name}{config_suffix}"),
+                'tags': [fleet_tag(prefix)],
+                'tuning': tuning_profile
+            })
+    return nodes
+
+def deploy_one(module, token, ssh_key_id, node, trace, watcher=None):
+    """Развернуть один узел парка; ошибки не прерывают остальные узлы"""
+    started = time.monotonic()
+    try:
+        info = module.deploy_node(token, ssh_key_id, node['name'], node['region'],
+                                  node['size'], node['config_file'], trace, node['tags'],
+                                  watcher, node['tuning'])
+    except (Exception, SystemExit) as e:
+        # create_droplet/wait_for_droplet завершают процесс через sys.exit
+        info = dict(node, error=f"{type(e).__name__}: {e}")
+        # Созданный droplet остается в контрольной точке узла: без него его не найти
+        progress = checkpoint.Checkpoint(checkpoint.deployment_id(trace.protocol, node['name']))
+        droplet = progress.get('create_droplet')
+        if droplet:
+            info['droplet_id'] = droplet[0]
+            info['ip'] = progress.get('wait_for_droplet')
+    info['seconds'] = round(time.monotonic() - started, 1)
+    timing.write([trace], region=node['region'], size=node['size'],
+                 tuning=tuning.get(node['tuning'])['id'])
+    return info
+
+def deploy_fleet(token, protocol, specs, prefix, workers=MAX_WORKERS, tuning_profile=None):
+    """Развернуть все узлы параллельно и вернуть инвентарь"""
+    module, config_suffix = PROTOCOLS[protocol]
+    nodes = plan_nodes(specs, prefix, config_suffix, tuning_profile)
+
+    # SSH ключ общий для всех узлов: регистрируем один раз до запуска потоков
+    started = time.monotonic()
+    ssh_key_id = module.create_ssh_key(token)
+    ssh_key_seconds = time.monotonic() - started
+
+    # Трассы узлов одного запуска связаны общим run_id
+    run_id = uuid.uuid4().hex[:12]
+    traces = {}
+    for node in nodes:
+        traces[node['name']] = timing.Trace(protocol, node['name'], run_id)
+        traces[node['name']].add('ssh_key', ssh_key_seconds)
+
+    # Готовность всех узлов - одним списком по тегу парка на такт опроса
+    watcher = droplet_watch.DropletWatcher(get_client(token), fleet_tag(prefix))
+
+    print(f"🚀 Развертывание {len(nodes)} узлов ({protocol}), потоков: {min(workers, len(nodes))}")
+    inventory = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(nodes))) as pool:
+        futures = [pool.submit(deploy_one, module, token, ssh_key_id, node, traces[node['name']],
+                               watcher)
+                   for node in nodes]
+        for future in as_completed(futures):
+            info = future.result()
+            inventory.append(info)
+            mark = '❌' if info.get('error') else '✅'
+            print(f"{mark} [{len(inventory)}/{len(nodes)}] {info['name']} "
+                  f"{info.get('ip') or ''} за {info['seconds']}s {info.get('error') or ''}")
+
+    inventory.sort(key=lambda info: info['name'])
+    return inventory
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельное развертывание VPN серверов")
+    parser.add_argument('specs', nargs='+', metavar='region:size:count',
+                        help="регион, размер (пусто = по умолчанию) и число узлов")
+    parser.add_argument('--protocol', choices=sorted(PROTOCOLS), default='wireguard')
+    parser.add_argument('--prefix', default=None, help="префикс имен droplet")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--top-k', type=int, default=3, help="число регионов для 'auto'")
+    parser.add_argument('--tuning', choices=sorted(tuning.PROFILES), default=tuning.DEFAULT,
+                        help="профиль настройки сети (tuning.py)")
+    args = parser.parse_args()
+
+    module = PROTOCOLS[args.protocol][0]
+    specs = [parse_spec(value, module.SIZE) for value in args.specs]
+    specs = resolve_auto(specs, args.top_k, module.REGION)
+    prefix = args.prefix or module.DROPLET_NAME
+
+    print("=" * 60)
+    print("🚀 Развертывание парка VPN серверов на DigitalOcean")
+    print("=" * 60)
+
+    token = module.get_do_token()
+    started = time.monotonic()
+    inventory = deploy_fleet(token, args.protocol, specs, prefix, args.workers, args.tuning)
+    elapsed = time.monotonic() - started
+
+    failed = [info for info in inventory if info.get('error')]
+    print(f"\n✅ Развернуто {len(inventory) - len(failed)}/{len(inventory)} узлов за {elapsed:.0f}s")
+    print(f"   Инвентарь: python3 inventory.py list --tag {fleet_tag(prefix)}")
+    print(f"   Трасса фаз: {timing.TRACE_FILE} (сводка: python3 timing.py)")
+    print(f"   Конфигурации: {FLEET_DIR}/")
+    print(f"   Профиль сети: {tuning.tag(tuning.get(args.tuning))}")
+    print(f"   Удаление парка: python3 delete_fleet.py --tag {fleet_tag(prefix)}")
+    if failed:
+        print("⚠️  Узлы с ошибками (повторный запуск продолжит с созданного droplet):")
+        for info in failed:
+            print(f"   {info['name']}: {info['error']} (droplet: {info.get('droplet_id') or 'не создан'})")
+
+    get_client(token).report()
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -4,95 +4,62 @@
 """
 
 import os
+import re
 import sys
-import json
 import time
 import subprocess
-import requests
 from pathlib import Path
 
+from do_api import get_client, public_ipv4
+import readiness
+from ssh_session import get_session
+import images
+import openvpn_pki
+import ssh_keys
+import timing
+import regions
+import inventory
+import dag
+import tuning
+import metrics_collector
+import checkpoint
+
 # Конфигурация
 DROPLET_NAME = "openvpn-server"
-REGION = "fra1"  # Frankfurt - один из самых дешевых регионов
+REGION = "fra1"  # Frankfurt - если не удалось выбрать регион по задержке (regions.py)
 SIZE = "s-1vcpu-1gb"  # Самый дешевый размер
 IMAGE = "ubuntu-22-04-x64"
 SSH_KEY_NAME = "openvpn-ssh-key"
-
-def get_do_token():
-    """Получить токен DigitalOcean из переменной окружения"""
-    token = os.environ.get('DIGITALOCEAN_ACCESS_TOKEN')
-    if not token:
-        print("❌ Ошибка: Установите переменную окружения DIGITALOCEAN_ACCESS_TOKEN")
-        print("   export DIGITALOCEAN_ACCESS_TOKEN='your-token'")
-        sys.exit(1)
-    return token
-
-def create_ssh_key(token):
-    """Создать SSH ключ для доступа к droplet"""
-    print("🔑 Создание SSH ключа...")
-    
-    # Генерируем SSH ключ если его нет
-    key_path = Path.home() / ".ssh" / "openvpn_do_key"
-    pub_key_path = key_path.with_suffix('.pub')
-    
-    if not key_path.exists():
-        subprocess.run([
-            'ssh-keygen', '-t', 'ed25519', '-f', str(key_path),
-            '-N', '', '-C', 'openvpn-server-key'
-        ], check=True, capture_output=True)
-    
-    # Читаем публичный ключ
-    with open(pub_key_path, 'r') as f:
-        public_key = f.read().strip()
-    
-    # Проверяем, существует ли ключ в DO
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.get('https://api.digitalocean.com/v2/account/keys', headers=headers)
-    if response.status_code == 200:
-        keys = response.json().get('ssh_keys', [])
-        for key in keys:
-            if key.get('public_key') == public_key:
-                print(f"✅ SSH ключ уже существует: {key['name']} (ID: {key['id']})")
-                return key['id']
-    
-    # Создаем новый ключ
-    data = {
-        'name': SSH_KEY_NAME,
-        'public_key': public_key
-    }
-    
-    response = requests.post(
-        'https://api.digitalocean.com/v2/account/keys',
-        headers=headers,
-        json=data
-    )
-    
-    if response.status_code == 201:
-        key_id = response.json()['ssh_key']['id']
-        print(f"✅ SSH ключ создан: {key_id}")
-        return key_id
-    else:
-        print(f"❌ Ошибка создания SSH ключа: {response.text}")
-        sys.exit(1)
-
-def create_droplet(token, ssh_key_id):
-    """Создать droplet с OpenVPN сервером"""
-    print(f"🚀 Создание droplet {DROPLET_NAME}...")
-    
-    # User data скрипт для установки OpenVPN
-    user_data = """#!/bin/bash
-export DEBIAN_FRONTEND=noninteractive
+SSH_KEY_PATH = Path.home() / ".ssh" / "openvpn_do_key"
+OPENVPN_PORT = 1194  # экземпляр i слушает OPENVPN_PORT + i
+CLIENT_NAME = "client1"
+# perf - AEAD шифры, DCO и по экземпляру OpenVPN на vCPU; compat - один
+# экземпляр с AES-256-CBC для клиентов OpenVPN старше 2.4
+OPENVPN_MODE = os.environ.get('VPN_OPENVPN_MODE', 'perf')
+MAX_INSTANCES = 16
+DATA_CIPHERS = "AES-256-GCM:CHACHA20-POLY1305:AES-128-GCM"
+TAGS = ["vpn", "vpn-openvpn"]  # у каждого droplet; массовое удаление: delete_fleet.py
+
+# Установка пакетов: выполняется при загрузке с базового образа
+# или один раз при сборке снимка (build_image.py)
+INSTALL_SCRIPT = """export DEBIAN_FRONTEND=noninteractive
 
 # Обновляем систему
 apt-get update -qq
 apt-get upgrade -y -qq
 
-# Устанавливаем OpenVPN и Easy-RSA
-apt-get install -y -qq openvpn easy-rsa iptables curl
+# Устанавливаем OpenVPN 2.6 из репозитория OpenVPN (в Ubuntu 22.04 - 2.5 без
+# DCO). PKI выпускается на машине оператора
+apt-get install -y -qq iptables curl gnupg
+mkdir -p /etc/apt/keyrings
+curl -fsSL https://swupdate.openvpn.net/repos/repo-public.gpg | gpg --dearmor > /etc/apt/keyrings/openvpn-repo-public.gpg
+echo "deb [signed-by=/etc/apt/keyrings/openvpn-repo-public.gpg] https://build.openvpn.net/debian/openvpn/release/2.6 $(lsb_release -cs) main" > /etc/apt/sources.list.d/openvpn-aptrepo.list
+apt-get update -qq
+apt-get install -y -qq openvpn
+
+# Модуль ядра data channel offload; если DKMS не соберется, OpenVPN
+# работает в userspace
+apt-get install -y -qq openvpn-dco-dkms || true
 
 # Включаем IP forwarding
 echo "net.ipv4.ip_forward=1" >> /etc/sysctl.conf
@@ -113,73 +80,98 @@ cat > /etc/network/if-up.d/iptables <<'IPTABLES_EOF'
 iptables-restore < /etc/iptables/rules.v4
 IPTABLES_EOF
 chmod +x /etc/network/if-up.d/iptables
+"""
+
+# Настройка конкретного узла. CA, сертификаты и ta.key выпускаются на
+# машине оператора (openvpn_pki.py) и подставляются в шаблон, поэтому на
+# droplet нет easy-rsa и gen-dh, а конфигурация клиента собирается локально
+SETUP_SCRIPT = """
+# Применяем правила firewall (в снимке они сохранены, но не загружены)
+iptables-restore < /etc/iptables/rules.v4
+
+# Записываем PKI
+mkdir -p /etc/openvpn/server
+umask 077
+
+cat > /etc/openvpn/server/ca.crt <<'PKI_EOF'
+{ca_cert}
+PKI_EOF
+
+cat > /etc/openvpn/server/server.crt <<'PKI_EOF'
+{server_cert}
+PKI_EOF
 
-# Настраиваем Easy-RSA
-cd /etc/openvpn
-make-cadir /etc/openvpn/easy-rsa
-cd /etc/openvpn/easy-rsa
-
-# Настраиваем переменные
-cat > vars <<'VARS_EOF'
-export KEY_COUNTRY="US"
-export KEY_PROVINCE="CA"
-export KEY_CITY="SanFrancisco"
-export KEY_ORG="OpenVPN"
-export KEY_EMAIL="admin@openvpn.local"
-export KEY_OU="MyOrganizationalUnit"
-export KEY_NAME="server"
-VARS_EOF
-
-# Инициализируем PKI
-./easyrsa init-pki <<< "yes"
-./easyrsa --batch build-ca nopass
-./easyrsa --batch gen-req server nopass
-./easyrsa --batch sign-req server server
-./easyrsa gen-dh
-
-# Генерируем ключ для TLS
-openvpn --genkey --secret ta.key
+cat > /etc/openvpn/server/server.key <<'PKI_EOF'
+{server_key}
+PKI_EOF
 
+cat > /etc/openvpn/server/ta.key <<'PKI_EOF'
+{ta_key}
+PKI_EOF
+{dh_file}{firewall}
 # Создаем конфигурацию сервера
-cat > /etc/openvpn/server.conf <<'SERVER_EOF'
-port 1194
+{server_configs}
+# Запускаем OpenVPN
+{start}
+# Сохраняем информацию
+cat > /root/openvpn_info.txt <<'INFO_EOF'
+=== OpenVPN Server Setup Complete ===
+Port: {ports}
+Protocol: UDP
+INFO_EOF
+
+echo "OpenVPN Server Setup Complete" > /root/setup_complete.txt
+"""
+
+# Конфигурация одного экземпляра сервера: /etc/openvpn/{instance}.conf,
+# сервис openvpn@{instance}
+SERVER_CONFIG = """cat > /etc/openvpn/{instance}.conf <<'SERVER_EOF'
+port {port}
 proto udp
-dev tun
-ca /etc/openvpn/easy-rsa/pki/ca.crt
-cert /etc/openvpn/easy-rsa/pki/issued/server.crt
-key /etc/openvpn/easy-rsa/pki/private/server.key
-dh /etc/openvpn/easy-rsa/pki/dh.pem
-tls-auth /etc/openvpn/easy-rsa/ta.key 0
-server 10.8.0.0 255.255.255.0
-ifconfig-pool-persist ipp.txt
+dev {dev}
+ca /etc/openvpn/server/ca.crt
+cert /etc/openvpn/server/server.crt
+key /etc/openvpn/server/server.key
+{dh_config}
+tls-auth /etc/openvpn/server/ta.key 0
+server {network} 255.255.255.0
+ifconfig-pool-persist {ipp_file}
 push "redirect-gateway def1 bypass-dhcp"
 push "dhcp-option DNS 8.8.8.8"
 push "dhcp-option DNS 8.8.4.4"
 keepalive 10 120
-cipher AES-256-CBC
-auth SHA256
+{data_channel}
 user nobody
 group nogroup
 persist-key
 persist-tun
-status openvpn-status.log
+status {status_file}
 verb 3
 explicit-exit-notify 1
-SERVER_EOF
+{tuning_options}SERVER_EOF
+"""
 
-# Создаем клиентский ключ
-./easyrsa --batch gen-req client1 nopass
-./easyrsa --batch sign-req client client1
+# Правила из INSTALL_SCRIPT покрывают только tun0 и 10.8.0.0/24
+PERF_FIREWALL = """
+# Экземпляры OpenVPN: tun0..tunN, подсети 10.8.0.0/24..10.8.N.0/24
+iptables -t nat -A POSTROUTING -s 10.8.0.0/16 -o eth0 -j MASQUERADE
+iptables -A FORWARD -i tun+ -o eth0 -s 10.8.0.0/16 -j ACCEPT
+iptables -A FORWARD -i eth0 -o tun+ -d 10.8.0.0/16 -j ACCEPT
+iptables-save > /etc/iptables/rules.v4
+modprobe ovpn-dco-v2 2>/dev/null || true
+"""
 
-# Получаем IP сервера
-SERVER_IP=$(curl -s ifconfig.me)
+DH_FILE = """
+cat > /etc/openvpn/server/dh.pem <<'PKI_EOF'
+{dh}
+PKI_EOF
+"""
 
-# Создаем конфигурацию клиента
-cat > /root/client1.ovpn <<CLIENT_EOF
-client
+# Конфигурация клиента, собирается локально по IP droplet
+CLIENT_CONFIG = """client
 dev tun
 proto udp
-remote $SERVER_IP 1194
+{remotes}
 resolv-retry infinite
 nobind
 persist-key
@@ -188,66 +180,183 @@ ca [inline]
 cert [inline]
 key [inline]
 tls-auth [inline] 1
-cipher AES-256-CBC
-auth SHA256
+{data_channel}
 verb 3
 redirect-gateway def1
-
+{tuning_options}
 <ca>
-$(cat /etc/openvpn/easy-rsa/pki/ca.crt)
+{ca_cert}
 </ca>
 
 <cert>
-$(cat /etc/openvpn/easy-rsa/pki/issued/client1.crt)
+{client_cert}
 </cert>
 
 <key>
-$(cat /etc/openvpn/easy-rsa/pki/private/client1.key)
+{client_key}
 </key>
 
 <tls-auth>
-$(cat /etc/openvpn/easy-rsa/ta.key)
+{ta_key}
 </tls-auth>
-CLIENT_EOF
-
-# Запускаем OpenVPN
-systemctl enable openvpn@server
-systemctl start openvpn@server
+"""
 
-# Сохраняем информацию
-cat > /root/openvpn_info.txt <<INFO_EOF
-=== OpenVPN Server Setup Complete ===
-Server IP: $SERVER_IP
-Port: 1194
-Protocol: UDP
-Client config: /root/client1.ovpn
-INFO_EOF
+def get_do_token():
+    """Получить токен DigitalOcean из переменной окружения"""
+    token = os.environ.get('DIGITALOCEAN_ACCESS_TOKEN')
+    if not token:
+        print("❌ Ошибка: Установите переменную окружения DIGITALOCEAN_ACCESS_TOKEN")
+        print("   export DIGITALOCEAN_ACCESS_TOKEN='your-token'")
+        sys.exit(1)
+    return token
 
-echo "OpenVPN Server Setup Complete" > /root/setup_complete.txt
-"""
+def create_ssh_key(token):
+    """Создать SSH ключ для доступа к droplet (или найти уже загруженный)"""
+    print("🔑 Создание SSH ключа...")
     
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
+    # Генерируем SSH ключ если его нет
+    key_path = SSH_KEY_PATH
+    pub_key_path = key_path.with_suffix('.pub')
+    
+    if not key_path.exists():
+        subprocess.run([
+            'ssh-keygen', '-t', 'ed25519', '-f', str(key_path),
+            '-N', '', '-C', 'openvpn-server-key'
+        ], check=True, capture_output=True)
+    
+    # Читаем публичный ключ
+    with open(pub_key_path, 'r') as f:
+        public_key = f.read().strip()
+    
+    # Ключ ищется по отпечатку, ID кэшируется: обычно без запросов к API
+    try:
+        key_id, source = ssh_keys.ensure_key(token, public_key, SSH_KEY_NAME)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    if source == 'created':
+        print(f"✅ SSH ключ создан: {key_id}")
+    else:
+        print(f"✅ SSH ключ уже существует (ID: {key_id})")
+    return key_id
+
+def instance_count(size, mode=None):
+    """Число экземпляров OpenVPN для размера droplet: по одному на vCPU в режиме perf
+
+    Экземпляр OpenVPN обрабатывает data channel в одном потоке, поэтому
+    на droplet с несколькими vCPU запускается несколько экземпляров на
+    соседних портах. vCPU берутся из slug размера (s-4vcpu-8gb, c-8).
+    """
+    if (mode or OPENVPN_MODE) != 'perf':
+        return 1
+    match = re.search(r'(\d+)vcpu', size) or re.match(r'c2?-(\d+)', size)
+    return min(int(match.group(1)), MAX_INSTANCES) if match else 1
+    
+def instance_ports(instances):
+    return [OPENVPN_PORT + i for i in range(instances)]
+    
+def data_channel(mode, server):
+    """Параметры шифрования data channel
+
+    В режиме perf шифр согласуется из AEAD (AES-GCM, ChaCha20-Poly1305 на
+    CPU без AES-NI); с такими шифрами OpenVPN 2.6 использует DCO, если
+    модуль ovpn-dco загружен. auth задает HMAC для tls-auth.
+
+    В режиме compat сервер (OpenVPN 2.5+ игнорирует cipher при согласовании)
+    добавляет AES-256-CBC в data-ciphers и отдает его клиентам без NCP через
+    data-ciphers-fallback; клиенту старше 2.4 data-ciphers неизвестен,
+    поэтому в его конфигурации остается cipher.
+    """
+    if mode != 'perf':
+        if not server:
+            return "cipher AES-256-CBC\nauth SHA256"
+        return (f"data-ciphers {DATA_CIPHERS}:AES-256-CBC\n"
+                "data-ciphers-fallback AES-256-CBC\nauth SHA256")
+    lines = [f"data-ciphers {DATA_CIPHERS}", "auth SHA256"]
+    if server:
+        lines.insert(0, "topology subnet")
+    return "\n".join(lines)
+    
+def server_configs(instances, mode, dh_config, tuning_options):
+    """Конфигурации экземпляров сервера и команды их запуска; вернуть (configs, start)"""
+    if mode != 'perf':
+        names = [('server', 'tun', '10.8.0.0', 'ipp.txt', 'openvpn-status.log')]
+    else:
+        names = [(f'server-{i}', f'tun{i}', f'10.8.{i}.0', f'ipp-{i}.txt', f'openvpn-status-{i}.log')
+                 for i in range(instances)]
+    
+    configs, start = [], []
+    for port, (instance, dev, network, ipp_file, status_file) in zip(instance_ports(instances), names):
+        configs.append(SERVER_CONFIG.format(
+            instance=instance,
+            port=port,
+            dev=dev,
+            dh_config=dh_config,
+            network=network,
+            ipp_file=ipp_file,
+            data_channel=data_channel(mode, server=True),
+            status_file=status_file,
+            tuning_options=tuning_options
+        ))
+        start.append(f"systemctl enable openvpn@{instance}\nsystemctl start openvpn@{instance}\n")
+    return "".join(configs), "".join(start)
+    
+def render_user_data(server_pki, region, callback_url=None, profile=None, instances=1, mode=None,
+                     agent=""):
+    """Образ и user_data для droplet; вернуть (image, user_data)
+
+    server_pki - материалы сервера из openvpn_pki.server_bundle(). Профиль
+    сети (tuning.py) применяется до запуска OpenVPN. instances - число
+    экземпляров сервера (instance_count), agent - установка агента метрик
+    (metrics_collector.install_snippet).
+    """
+    profile = profile or tuning.get()
+    mode = mode or OPENVPN_MODE
+    image, baked = images.resolve_image('openvpn', region, INSTALL_SCRIPT, IMAGE)
+    
+    # User data скрипт: с готового снимка выполняется только настройка узла
+    dh = server_pki['dh']
+    configs, start = server_configs(
+        instances, mode,
+        "dh /etc/openvpn/server/dh.pem" if dh else f"dh none\necdh-curve {openvpn_pki.CURVE}",
+        tuning.openvpn_server_options(profile)
+    )
+    setup = SETUP_SCRIPT.format(
+        ca_cert=server_pki['ca_cert'],
+        server_cert=server_pki['server_cert'],
+        server_key=server_pki['server_key'],
+        ta_key=server_pki['ta_key'],
+        dh_file=DH_FILE.format(dh=dh) if dh else "",
+        firewall=PERF_FIREWALL if mode == 'perf' else "",
+        server_configs=configs,
+        start=start,
+        ports=' '.join(map(str, instance_ports(instances)))
+    )
+    user_data = ("#!/bin/bash\n" + ("" if baked else INSTALL_SCRIPT)
+                 + tuning.server_script(profile) + setup + agent
+                 + readiness.phone_home_snippet(callback_url))
+    return image, user_data
+    
+def create_droplet(token, ssh_key_id, image, user_data, name=DROPLET_NAME, region=REGION,
+                   size=SIZE, tags=()):
+    """Создать droplet; вернуть (droplet_id, ID action создания)"""
+    print(f"🚀 Создание droplet {name}...")
     
     data = {
-        'name': DROPLET_NAME,
-        'region': REGION,
-        'size': SIZE,
-        'image': IMAGE,
+        'name': name,
+        'region': region,
+        'size': size,
+        'image': image,
         'ssh_keys': [ssh_key_id],
         'user_data': user_data,
         'monitoring': False,
         'backups': False,
-        'ipv6': False
+        'ipv6': False,
+        'tags': TAGS + [tag for tag in tags if tag not in TAGS]
     }
     
-    response = requests.post(
-        'https://api.digitalocean.com/v2/droplets',
-        headers=headers,
-        json=data
-    )
+    response = get_client(token).post('/droplets', json=data)
     
     if response.status_code == 202:
         droplet = response.json()['droplet']
@@ -256,74 +365,92 @@ echo "OpenVPN Server Setup Complete" > /root/setup_complete.txt
         print(f"   Имя: {droplet['name']}")
         print(f"   Регион: {droplet['region']['name']}")
         print(f"   Размер: {droplet['size_slug']}")
-        return droplet_id
+        # Готовность droplet отслеживается по action создания
+        actions = response.json().get('links', {}).get('actions', [])
+        action_id = next((a['id'] for a in actions if a.get('rel') == 'create'), None)
+        return droplet_id, action_id
     else:
         print(f"❌ Ошибка создания droplet: {response.text}")
+        # Ключ мог быть удален из аккаунта: следующий запуск перепроверит кэш
+        if response.status_code == 422:
+            ssh_keys.forget(token, ssh_key_id)
         sys.exit(1)
 
-def wait_for_droplet(token, droplet_id):
-    """Ждать пока droplet станет активным"""
+def wait_for_droplet(token, droplet_id, action_id=None, timeout=300, watcher=None):
+    """Ждать пока droplet станет активным и получит публичный IP
+
+    Готовность отслеживается по action создания (короткий ответ), droplet
+    запрашивается только после его завершения; IP берется из первого ответа,
+    где он есть. Паузы растут от readiness.POLL_INITIAL до POLL_MAX.
+    В парке статус раздает watcher (droplet_watch.DropletWatcher): один
+    список по тегу на такт вместо запросов по каждому droplet.
+    """
     print("⏳ Ожидание активации droplet...")
     
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
+    if watcher is not None:
+        ip, error = watcher.wait(droplet_id, timeout, action_id)
+        if error is not None:
+            print(f"❌ Ошибка создания droplet: action {action_id} - {error}")
+            print("   Повторный запуск удалит этот droplet и создаст новый")
+            sys.exit(1)
+        if ip is None:
+            print("❌ Timeout: Droplet не стал активным")
+            sys.exit(1)
+        print(f"✅ Droplet активен! IP: {ip}")
+        return ip
     
-    max_attempts = 60
-    for attempt in range(max_attempts):
-        response = requests.get(
-            f'https://api.digitalocean.com/v2/droplets/{droplet_id}',
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            droplet = response.json()['droplet']
-            status = droplet['status']
-            
-            if status == 'active':
-                # Ждем еще немного для получения IP
-                time.sleep(10)
-                response = requests.get(
-                    f'https://api.digitalocean.com/v2/droplets/{droplet_id}',
-                    headers=headers
-                )
-                droplet = response.json()['droplet']
-                
-                ipv4 = None
-                for network in droplet.get('networks', {}).get('v4', []):
-                    if network['type'] == 'public':
-                        ipv4 = network['ip_address']
-                        break
-                
-                if ipv4:
-                    print(f"✅ Droplet активен! IP: {ipv4}")
-                    return ipv4
-                else:
-                    print("⏳ Ожидание назначения IP адреса...")
-            else:
-                print(f"   Статус: {status}...")
-        
-        time.sleep(5)
+    api = get_client(token)
+    state = {'action': 'in-progress' if action_id else 'completed', 'ip': None}
+    
+    def active():
+        if state['action'] == 'in-progress':
+            response = api.get(f'/actions/{action_id}', call_class='poll')
+            if response.status_code != 200:
+                return False
+            state['action'] = response.json()['action']['status']
+            if state['action'] == 'in-progress':
+                return False
+            if state['action'] != 'completed':
+                return True
     
-    print("❌ Timeout: Droplet не стал активным")
-    sys.exit(1)
+        response = api.get(f'/droplets/{droplet_id}', call_class='poll')
+        if response.status_code != 200:
+            return False
+        droplet = response.json()['droplet']
+        state['ip'] = public_ipv4(droplet)
+        if droplet['status'] == 'active' and state['ip']:
+            return True
+        print(f"   Статус: {droplet['status']}, IP: {state['ip'] or 'еще не назначен'}...")
+        return False
+    
+    if not readiness.wait_until(active, timeout=timeout):
+        print("❌ Timeout: Droplet не стал активным")
+        sys.exit(1)
+    if state['action'] != 'completed':
+        print(f"❌ Ошибка создания droplet: action {action_id} - {state['action']}")
+        print("   Повторный запуск удалит этот droplet и создаст новый")
+        sys.exit(1)
+    
+    print(f"✅ Droplet активен! IP: {state['ip']}")
+    return state['ip']
 
 def wait_for_ssh(ip, max_attempts=30):
-    """Ждать пока SSH станет доступен"""
+    """Ждать пока SSH станет доступен
+
+    Первое успешное подключение становится master соединением, по которому
+    затем идут все остальные команды к этому droplet.
+    """
     print("⏳ Ожидание доступности SSH...")
     
-    key_path = Path.home() / ".ssh" / "openvpn_do_key"
+    session = get_session(ip, SSH_KEY_PATH)
     
     for attempt in range(max_attempts):
-        result = subprocess.run(
-            ['ssh', '-i', str(key_path), '-o', 'StrictHostKeyChecking=no',
-             '-o', 'ConnectTimeout=5', f'root@{ip}', 'echo "SSH ready"'],
-            capture_output=True,
-            timeout=10
-        )
+        try:
+            result = session.run('echo "SSH ready"', timeout=10)
+        except subprocess.TimeoutExpired:
+            result = None
         
-        if result.returncode == 0:
+        if result is not None and result.returncode == 0:
             print("✅ SSH доступен!")
             return True
         
@@ -332,58 +459,33 @@ def wait_for_ssh(ip, max_attempts=30):
     print("❌ Timeout: SSH не стал доступен")
     return False
 
-def get_openvpn_config(ip):
-    """Получить конфигурацию OpenVPN с сервера"""
-    print("📥 Получение конфигурации OpenVPN...")
-    
-    key_path = Path.home() / ".ssh" / "openvpn_do_key"
-    
-    # Ждем пока OpenVPN установится
-    print("⏳ Ожидание установки OpenVPN...")
-    time.sleep(60)  # OpenVPN требует больше времени для установки
-    
-    max_attempts = 30
-    for attempt in range(max_attempts):
-        result = subprocess.run(
-            ['ssh', '-i', str(key_path), '-o', 'StrictHostKeyChecking=no',
-             f'root@{ip}', 'test -f /root/setup_complete.txt && echo "ready"'],
-            capture_output=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0 and b'ready' in result.stdout:
-            break
-        
-        print(f"   Попытка {attempt + 1}/{max_attempts}...")
-        time.sleep(10)
-    
-    # Получаем конфигурацию клиента
-    result = subprocess.run(
-        ['ssh', '-i', str(key_path), '-o', 'StrictHostKeyChecking=no',
-         f'root@{ip}', 'cat /root/client1.ovpn'],
-        capture_output=True,
-        text=True,
-        timeout=10
-    )
-    
-    if result.returncode == 0:
-        config = result.stdout
-        # Обновляем IP адрес если нужно
-        return config
-    else:
-        print(f"❌ Ошибка получения конфигурации: {result.stderr}")
-        return None
-
-def save_config(config, ip):
+def render_client_config(ip, client_pki, profile=None, ports=(OPENVPN_PORT,), mode=None):
+    """Собрать конфигурацию клиента локально по IP droplet
+
+    client_pki - материалы клиента из openvpn_pki.client_bundle(); MTU и
+    mssfix берутся из профиля сети сервера. Каждый экземпляр сервера -
+    отдельная строка remote: клиент выбирает случайную (remote-random), и
+    подключения распределяются по экземплярам.
+    """
+    profile = profile or tuning.get()
+    remotes = [f"remote {ip} {port}" for port in ports]
+    if len(remotes) > 1:
+        remotes.append("remote-random")
+    return CLIENT_CONFIG.format(remotes="\n".join(remotes),
+                                data_channel=data_channel(mode or OPENVPN_MODE, server=False),
+                                tuning_options=tuning.openvpn_client_options(profile), **client_pki)
+
+def save_config(config, ip, config_file='client1.ovpn', ports=(OPENVPN_PORT,)):
     """Сохранить конфигурацию в файл"""
-    config_file = Path('client1.ovpn')
+    config_file = Path(config_file)
+    config_file.parent.mkdir(parents=True, exist_ok=True)
     with open(config_file, 'w') as f:
         f.write(config)
     
     print(f"✅ Конфигурация сохранена в {config_file}")
     print(f"\n📋 Информация о OpenVPN сервере:")
     print(f"   IP адрес: {ip}")
-    print(f"   Порт: 1194")
+    print(f"   Порт: {', '.join(map(str, ports))}")
     print(f"   Протокол: UDP")
     print(f"\n📱 Для подключения:")
     print(f"   1. Установите OpenVPN клиент")
@@ -392,42 +494,132 @@ def save_config(config, ip):
     
     return config_file
 
+def deploy_node(token, ssh_key_id=None, name=DROPLET_NAME, region=None, size=SIZE,
+                config_file='client1.ovpn', trace=None, tags=(),
+                watcher=None, tuning_profile=None, deployment_id=None):
+    """Развернуть один сервер и вернуть информацию о нем
+
+    Шаги выполняет dag.Graph: независимые (SSH ключ в аккаунте, выбор
+    региона, выпуск сертификатов) идут параллельно, остальные стартуют, как
+    только готовы их входы. Конфигурация клиента готова сразу после
+    получения IP: PKI выпущена локально, SSH для нее не нужен. Фазы
+    замеряются в trace (timing.Trace), после прогона печатается
+    критический путь. Профиль сети tuning_profile (по умолчанию
+    VPN_TUNING) записывается в тег droplet и в инвентарь. В режиме perf
+    (VPN_OPENVPN_MODE) на droplet запускается по экземпляру на vCPU.
+    Результаты шагов до IP droplet сохраняются в контрольную точку
+    deployment_id (по умолчанию протокол и имя): повторный запуск после
+    сбоя продолжает с того же droplet.
+    """
+    trace = trace or timing.Trace('openvpn', name)
+    profile = tuning.get(tuning_profile)
+    ports = instance_ports(instance_count(size))
+    tags = TAGS + [tag for tag in tags if tag not in TAGS] + [tuning.tag(profile)]
+    progress = checkpoint.resume(token, 'openvpn', name,
+                                 {'size': size, 'region': region, 'tuning': profile['id'],
+                                  'mode': OPENVPN_MODE}, deployment_id)
+    callback_url, ready = readiness.register(name)
+    # Агент метрик ставится, только если задан сборщик (VPN_METRICS_ADDR)
+    agent = metrics_collector.install_snippet(name, 'openvpn')
+    graph = dag.Graph(trace, progress)
+    
+    if ssh_key_id is None:
+        graph.step('ssh_key', lambda: create_ssh_key(token), timeout=60, retries=1)
+    else:
+        graph.value('ssh_key', ssh_key_id)
+    if region is None:
+        graph.step('region', lambda: regions.select_region(REGION),
+                   timeout=regions.PROBE_TIMEOUT + 5, checkpoint=True)
+    else:
+        graph.value('region', region)
+    
+    # Сертификаты сервера и клиента выпускает один шаг: оба используют общий CA
+    graph.step('pki', lambda: (openvpn_pki.server_bundle(name),
+                               openvpn_pki.client_bundle(CLIENT_NAME)), timeout=600)
+    graph.step('user_data', lambda region, pki: render_user_data(pki[0], region, callback_url,
+                                                                 profile, len(ports),
+                                                                 agent=agent),
+               deps=['region', 'pki'], timeout=30)
+    graph.step('create_droplet', lambda ssh_key, region, user_data: create_droplet(
+                   token, ssh_key, *user_data, name, region, size, tags),
+               deps=['ssh_key', 'region', 'user_data'], timeout=120, checkpoint=True)
+    
+    # Droplet попадает в инвентарь сразу: даже при сбое дальше он не потеряется
+    graph.step('inventory_new', lambda region, droplet: inventory.add(
+                   {'droplet_id': droplet[0], 'name': name, 'region': region, 'size': size,
+                    'config_file': str(config_file), 'tags': tags,
+                    'tuning': profile['id'], 'mode': OPENVPN_MODE, 'ports': ports}, 'openvpn'),
+               deps=['region', 'create_droplet'], timeout=60, retries=2)
+    graph.step('wait_for_droplet',
+               lambda droplet: wait_for_droplet(token, *droplet, watcher=watcher),
+               deps=['create_droplet'], timeout=330, retries=1, checkpoint=True)
+    
+    def client_config(region, pki, droplet, ip):
+        info = {
+            'droplet_id': droplet[0],
+            'ip': ip,
+            'name': name,
+            'region': region,
+            'size': size,
+            'tuning': profile['id'],
+            'mode': OPENVPN_MODE,
+            'ports': ports,
+            'tags': tags
+        }
+        config = render_client_config(ip, pki[1], profile, ports)
+        info['config_file'] = str(save_config(config, ip, config_file, ports))
+        return info
+    
+    graph.step('client_config', client_config,
+               deps=['region', 'pki', 'create_droplet', 'wait_for_droplet'], timeout=30)
+    graph.step('inventory', lambda info, _: inventory.add(info, 'openvpn'),
+               deps=['client_config', 'inventory_new'], timeout=60, retries=2)
+    
+    # Сигнал готовности только подтверждает запуск сервера: клиент OpenVPN
+    # сам повторяет подключение, пока сервер не поднимется. Droplet из
+    # прошлого запуска сообщает о готовности прежнему приемнику: не ждем.
+    # Ожидание после активации droplet: droplet с ошибкой создания сигнала
+    # не пришлет, и запуск не должен ждать его до таймаута
+    if ready is not None and 'create_droplet' not in progress:
+        def cloud_init(_):
+            started = ready.wait(180)
+            if started:
+                print(f"✅ OpenVPN на {name} запущен")
+            else:
+                print(f"⚠️  {name}: нет сигнала готовности, сервер может еще настраиваться")
+            return started
+    
+        graph.step('cloud_init', cloud_init, deps=['wait_for_droplet'], timeout=200)
+    
+    results = graph.run()
+    graph.report()
+    progress.discard()
+    return results['client_config']
+
 def main():
     print("=" * 60)
     print("🚀 Развертывание OpenVPN сервера на DigitalOcean")
     print("=" * 60)
     
     token = get_do_token()
-    ssh_key_id = create_ssh_key(token)
-    droplet_id = create_droplet(token, ssh_key_id)
-    ip = wait_for_droplet(token, droplet_id)
-    
-    if wait_for_ssh(ip):
-        config = get_openvpn_config(ip)
-        if config:
-            config_file = save_config(config, ip)
-            
-            # Сохраняем информацию о droplet
-            info = {
-                'droplet_id': droplet_id,
-                'ip': ip,
-                'name': DROPLET_NAME,
-                'region': REGION,
-                'size': SIZE
-            }
-            
-            with open('openvpn_info.json', 'w') as f:
-                json.dump(info, f, indent=2)
-            
-            print(f"\n✅ OpenVPN сервер успешно развернут!")
-            print(f"   Droplet ID: {droplet_id}")
-            print(f"   Конфигурация: {config_file}")
-            print(f"\n💡 Для удаления сервера:")
-            print(f"   python3 delete_openvpn.py")
-        else:
-            print("❌ Не удалось получить конфигурацию OpenVPN")
-    else:
-        print("❌ Не удалось подключиться по SSH")
+    trace = timing.Trace('openvpn', DROPLET_NAME)
+    try:
+        # SSH ключ регистрируется параллельно с остальными шагами
+        info = deploy_node(token, trace=trace)
+    finally:
+        timing.write([trace])
+    
+    # Информация о droplet - в инвентаре (inventory.py)
+    config_file = info.pop('config_file')
+    
+    print(f"\n✅ OpenVPN сервер успешно развернут!")
+    print(f"   Droplet ID: {info['droplet_id']}")
+    print(f"   Конфигурация: {config_file}")
+    print(f"   Время до готовности: {trace.record()['time_to_ready']}s ({timing.TRACE_FILE})")
+    print(f"\n💡 Для удаления сервера:")
+    print(f"   python3 delete_openvpn.py")
+    
+    get_client(token).report()
 
 if __name__ == '__main__':
     main()
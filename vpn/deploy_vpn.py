@@ -5,18 +5,88 @@
 
 import os
 import sys
-import json
 import time
 import subprocess
-import requests
 from pathlib import Path
 
+from do_api import get_client, public_ipv4
+import readiness
+from ssh_session import get_session
+import images
+import wg_keys
+import wg_peers
+import ssh_keys
+import timing
+import regions
+import inventory
+import dag
+import tuning
+import metrics_collector
+import checkpoint
+
 # Конфигурация
 DROPLET_NAME = "vpn-server"
-REGION = "fra1"  # Frankfurt - один из самых дешевых регионов
+REGION = "fra1"  # Frankfurt - если не удалось выбрать регион по задержке (regions.py)
 SIZE = "s-1vcpu-1gb"  # Самый дешевый размер
 IMAGE = "ubuntu-22-04-x64"
 SSH_KEY_NAME = "vpn-ssh-key"
+SSH_KEY_PATH = Path.home() / ".ssh" / "vpn_do_key"
+WG_PORT = 51820
+WG_SUBNET = os.environ.get('VPN_WG_SUBNET', '10.0.0.0/24')  # /16 - до 65 тыс. пиров
+CLIENT_NAME = "client1"
+TAGS = ["vpn", "vpn-wireguard"]  # у каждого droplet; массовое удаление: delete_fleet.py
+
+# Установка пакетов: выполняется при загрузке с базового образа
+# или один раз при сборке снимка (build_image.py)
+INSTALL_SCRIPT = """export DEBIAN_FRONTEND=noninteractive
+apt-get update
+apt-get install -y wireguard wireguard-tools iptables qrencode
+
+# Включаем IP forwarding
+echo "net.ipv4.ip_forward=1" >> /etc/sysctl.conf
+sysctl -p
+"""
+
+# Настройка конкретного узла. Ключи генерируются на машине оператора
+# (wg_keys.py) и подставляются в шаблон, поэтому конфигурация клиента
+# собирается локально и не требует SSH
+SETUP_SCRIPT = """
+# Создаем конфигурацию WireGuard
+mkdir -p /etc/wireguard
+chmod 700 /etc/wireguard
+umask 077
+
+# Создаем конфигурацию сервера
+cat > /etc/wireguard/wg0.conf <<'EOF'
+[Interface]
+PrivateKey = {server_private_key}
+Address = {server_address}
+ListenPort = {port}
+{mtu_line}PostUp = iptables -A FORWARD -i wg0 -j ACCEPT; iptables -A FORWARD -o wg0 -j ACCEPT; iptables -t nat -A POSTROUTING -o eth0 -j MASQUERADE
+PostDown = iptables -D FORWARD -i wg0 -j ACCEPT; iptables -D FORWARD -o wg0 -j ACCEPT; iptables -t nat -D POSTROUTING -o eth0 -j MASQUERADE
+{peers}EOF
+
+# Запускаем WireGuard
+systemctl enable wg-quick@wg0
+systemctl start wg-quick@wg0
+
+# Выводим информацию
+echo "=== VPN Server Setup Complete ===" > /root/vpn_info.txt
+echo "Server Public Key: {server_public_key}" >> /root/vpn_info.txt
+"""
+
+# Конфигурация клиента, собирается локально по IP droplet
+CLIENT_CONFIG = """[Interface]
+PrivateKey = {client_private_key}
+Address = {address}
+DNS = 8.8.8.8
+{mtu_line}
+[Peer]
+PublicKey = {server_public_key}
+Endpoint = {ip}:{port}
+AllowedIPs = 0.0.0.0/0
+PersistentKeepalive = 25
+"""
 
 def get_do_token():
     """Получить токен DigitalOcean из переменной окружения"""
@@ -28,11 +98,11 @@ def get_do_token():
     return token
 
 def create_ssh_key(token):
-    """Создать SSH ключ для доступа к droplet"""
+    """Создать SSH ключ для доступа к droplet (или найти уже загруженный)"""
     print("🔑 Создание SSH ключа...")
     
     # Генерируем SSH ключ если его нет
-    key_path = Path.home() / ".ssh" / "vpn_do_key"
+    key_path = SSH_KEY_PATH
     pub_key_path = key_path.with_suffix('.pub')
     
     if not key_path.exists():
@@ -45,132 +115,64 @@ def create_ssh_key(token):
     with open(pub_key_path, 'r') as f:
         public_key = f.read().strip()
     
-    # Проверяем, существует ли ключ в DO
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.get('https://api.digitalocean.com/v2/account/keys', headers=headers)
-    if response.status_code == 200:
-        keys = response.json().get('ssh_keys', [])
-        for key in keys:
-            if key.get('public_key') == public_key:
-                print(f"✅ SSH ключ уже существует: {key['name']} (ID: {key['id']})")
-                return key['id']
-    
-    # Создаем новый ключ
-    data = {
-        'name': SSH_KEY_NAME,
-        'public_key': public_key
-    }
-    
-    response = requests.post(
-        'https://api.digitalocean.com/v2/account/keys',
-        headers=headers,
-        json=data
-    )
+    # Ключ ищется по отпечатку, ID кэшируется: обычно без запросов к API
+    try:
+        key_id, source = ssh_keys.ensure_key(token, public_key, SSH_KEY_NAME)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     
-    if response.status_code == 201:
-        key_id = response.json()['ssh_key']['id']
+    if source == 'created':
         print(f"✅ SSH ключ создан: {key_id}")
-        return key_id
     else:
-        print(f"❌ Ошибка создания SSH ключа: {response.text}")
-        sys.exit(1)
-
-def create_droplet(token, ssh_key_id):
-    """Создать droplet с VPN сервером"""
-    print(f"🚀 Создание droplet {DROPLET_NAME}...")
-    
-    # User data скрипт для установки WireGuard
-    user_data = """#!/bin/bash
-export DEBIAN_FRONTEND=noninteractive
-apt-get update
-apt-get install -y wireguard wireguard-tools iptables qrencode
-
-# Включаем IP forwarding
-echo "net.ipv4.ip_forward=1" >> /etc/sysctl.conf
-sysctl -p
-
-# Создаем конфигурацию WireGuard
-mkdir -p /etc/wireguard
-cd /etc/wireguard
-wg genkey | tee server_private.key | wg pubkey > server_public.key
-
-# Создаем конфигурацию сервера
-cat > /etc/wireguard/wg0.conf <<EOF
-[Interface]
-PrivateKey = $(cat server_private.key)
-Address = 10.0.0.1/24
-ListenPort = 51820
-PostUp = iptables -A FORWARD -i wg0 -j ACCEPT; iptables -A FORWARD -o wg0 -j ACCEPT; iptables -t nat -A POSTROUTING -o eth0 -j MASQUERADE
-PostDown = iptables -D FORWARD -i wg0 -j ACCEPT; iptables -D FORWARD -o wg0 -j ACCEPT; iptables -t nat -D POSTROUTING -o eth0 -j MASQUERADE
+        print(f"✅ SSH ключ уже существует (ID: {key_id})")
+    return key_id
 
-EOF
+def render_user_data(server_private_key, peer_state, region, callback_url=None, profile=None,
+                     agent=""):
+    """Образ и user_data для droplet; вернуть (image, user_data)
 
-# Генерируем ключи для клиента
-wg genkey | tee client_private.key | wg pubkey > client_public.key
-CLIENT_PRIVATE=$(cat client_private.key)
-CLIENT_PUBLIC=$(cat client_public.key)
-SERVER_PUBLIC=$(cat server_public.key)
-SERVER_PRIVATE=$(cat server_private.key)
-
-# Добавляем клиента в конфигурацию
-cat >> /etc/wireguard/wg0.conf <<EOF
-
-[Peer]
-PublicKey = $CLIENT_PUBLIC
-AllowedIPs = 10.0.0.2/32
-EOF
-
-# Запускаем WireGuard
-systemctl enable wg-quick@wg0
-systemctl start wg-quick@wg0
-
-# Сохраняем конфигурацию клиента
-cat > /root/client.conf <<EOF
-[Interface]
-PrivateKey = $CLIENT_PRIVATE
-Address = 10.0.0.2/24
-DNS = 8.8.8.8
-
-[Peer]
-PublicKey = $SERVER_PUBLIC
-Endpoint = $(curl -s ifconfig.me):51820
-AllowedIPs = 0.0.0.0/0
-PersistentKeepalive = 25
-EOF
-
-# Выводим информацию
-echo "=== VPN Server Setup Complete ===" > /root/vpn_info.txt
-echo "Server Public Key: $SERVER_PUBLIC" >> /root/vpn_info.txt
-echo "Client Public Key: $CLIENT_PUBLIC" >> /root/vpn_info.txt
-echo "Client Config saved to /root/client.conf" >> /root/vpn_info.txt
-"""
+    Ключ сервера (base64) и пиры из peer_state (wg_peers.PeerState)
+    передаются в user_data: сервер ключи не генерирует. Профиль сети
+    (tuning.py) применяется до запуска WireGuard; agent - установка
+    агента метрик (metrics_collector.install_snippet).
+    """
+    profile = profile or tuning.get()
+    image, baked = images.resolve_image('wireguard', region, INSTALL_SCRIPT, IMAGE)
     
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
+    # User data скрипт: с готового снимка выполняется только настройка узла
+    setup = SETUP_SCRIPT.format(
+        server_private_key=server_private_key,
+        server_public_key=peer_state.data['server_public_key'],
+        server_address=server_interface_address(peer_state),
+        peers=peer_state.peers_section(),
+        port=WG_PORT,
+        mtu_line=tuning.wg_mtu_line(peer_state.data.get('mtu'))
+    )
+    user_data = ("#!/bin/bash\n" + ("" if baked else INSTALL_SCRIPT)
+                 + tuning.server_script(profile) + setup + agent
+                 + readiness.phone_home_snippet(callback_url))
+    return image, user_data
+
+def create_droplet(token, ssh_key_id, image, user_data, name=DROPLET_NAME, region=REGION,
+                   size=SIZE, tags=()):
+    """Создать droplet; вернуть (droplet_id, ID action создания)"""
+    print(f"🚀 Создание droplet {name}...")
     
     data = {
-        'name': DROPLET_NAME,
-        'region': REGION,
-        'size': SIZE,
-        'image': IMAGE,
+        'name': name,
+        'region': region,
+        'size': size,
+        'image': image,
         'ssh_keys': [ssh_key_id],
         'user_data': user_data,
         'monitoring': False,
         'backups': False,
-        'ipv6': False
+        'ipv6': False,
+        'tags': TAGS + [tag for tag in tags if tag not in TAGS]
     }
     
-    response = requests.post(
-        'https://api.digitalocean.com/v2/droplets',
-        headers=headers,
-        json=data
-    )
+    response = get_client(token).post('/droplets', json=data)
     
     if response.status_code == 202:
         droplet = response.json()['droplet']
@@ -179,74 +181,92 @@ echo "Client Config saved to /root/client.conf" >> /root/vpn_info.txt
         print(f"   Имя: {droplet['name']}")
         print(f"   Регион: {droplet['region']['name']}")
         print(f"   Размер: {droplet['size_slug']}")
-        return droplet_id
+        # Готовность droplet отслеживается по action создания
+        actions = response.json().get('links', {}).get('actions', [])
+        action_id = next((a['id'] for a in actions if a.get('rel') == 'create'), None)
+        return droplet_id, action_id
     else:
         print(f"❌ Ошибка создания droplet: {response.text}")
+        # Ключ мог быть удален из аккаунта: следующий запуск перепроверит кэш
+        if response.status_code == 422:
+            ssh_keys.forget(token, ssh_key_id)
         sys.exit(1)
 
-def wait_for_droplet(token, droplet_id):
-    """Ждать пока droplet станет активным"""
+def wait_for_droplet(token, droplet_id, action_id=None, timeout=300, watcher=None):
+    """Ждать пока droplet станет активным и получит публичный IP
+
+    Готовность отслеживается по action создания (короткий ответ), droplet
+    запрашивается только после его завершения; IP берется из первого ответа,
+    где он есть. Паузы растут от readiness.POLL_INITIAL до POLL_MAX.
+    В парке статус раздает watcher (droplet_watch.DropletWatcher): один
+    список по тегу на такт вместо запросов по каждому droplet.
+    """
     print("⏳ Ожидание активации droplet...")
     
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
+    if watcher is not None:
+        ip, error = watcher.wait(droplet_id, timeout, action_id)
+        if error is not None:
+            print(f"❌ Ошибка создания droplet: action {action_id} - {error}")
+            print("   Повторный запуск удалит этот droplet и создаст новый")
+            sys.exit(1)
+        if ip is None:
+            print("❌ Timeout: Droplet не стал активным")
+            sys.exit(1)
+        print(f"✅ Droplet активен! IP: {ip}")
+        return ip
     
-    max_attempts = 60
-    for attempt in range(max_attempts):
-        response = requests.get(
-            f'https://api.digitalocean.com/v2/droplets/{droplet_id}',
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            droplet = response.json()['droplet']
-            status = droplet['status']
-            
-            if status == 'active':
-                # Ждем еще немного для получения IP
-                time.sleep(10)
-                response = requests.get(
-                    f'https://api.digitalocean.com/v2/droplets/{droplet_id}',
-                    headers=headers
-                )
-                droplet = response.json()['droplet']
-                
-                ipv4 = None
-                for network in droplet.get('networks', {}).get('v4', []):
-                    if network['type'] == 'public':
-                        ipv4 = network['ip_address']
-                        break
-                
-                if ipv4:
-                    print(f"✅ Droplet активен! IP: {ipv4}")
-                    return ipv4
-                else:
-                    print("⏳ Ожидание назначения IP адреса...")
-            else:
-                print(f"   Статус: {status}...")
-        
-        time.sleep(5)
+    api = get_client(token)
+    state = {'action': 'in-progress' if action_id else 'completed', 'ip': None}
+    
+    def active():
+        if state['action'] == 'in-progress':
+            response = api.get(f'/actions/{action_id}', call_class='poll')
+            if response.status_code != 200:
+                return False
+            state['action'] = response.json()['action']['status']
+            if state['action'] == 'in-progress':
+                return False
+            if state['action'] != 'completed':
+                return True
     
-    print("❌ Timeout: Droplet не стал активным")
-    sys.exit(1)
+        response = api.get(f'/droplets/{droplet_id}', call_class='poll')
+        if response.status_code != 200:
+            return False
+        droplet = response.json()['droplet']
+        state['ip'] = public_ipv4(droplet)
+        if droplet['status'] == 'active' and state['ip']:
+            return True
+        print(f"   Статус: {droplet['status']}, IP: {state['ip'] or 'еще не назначен'}...")
+        return False
+    
+    if not readiness.wait_until(active, timeout=timeout):
+        print("❌ Timeout: Droplet не стал активным")
+        sys.exit(1)
+    if state['action'] != 'completed':
+        print(f"❌ Ошибка создания droplet: action {action_id} - {state['action']}")
+        print("   Повторный запуск удалит этот droplet и создаст новый")
+        sys.exit(1)
+    
+    print(f"✅ Droplet активен! IP: {state['ip']}")
+    return state['ip']
 
 def wait_for_ssh(ip, max_attempts=30):
-    """Ждать пока SSH станет доступен"""
+    """Ждать пока SSH станет доступен
+
+    Первое успешное подключение становится master соединением, по которому
+    затем идут все остальные команды к этому droplet.
+    """
     print("⏳ Ожидание доступности SSH...")
     
-    key_path = Path.home() / ".ssh" / "vpn_do_key"
+    session = get_session(ip, SSH_KEY_PATH)
     
     for attempt in range(max_attempts):
-        result = subprocess.run(
-            ['ssh', '-i', str(key_path), '-o', 'StrictHostKeyChecking=no',
-             '-o', 'ConnectTimeout=5', f'root@{ip}', 'echo "SSH ready"'],
-            capture_output=True,
-            timeout=10
-        )
+        try:
+            result = session.run('echo "SSH ready"', timeout=10)
+        except subprocess.TimeoutExpired:
+            result = None
         
-        if result.returncode == 0:
+        if result is not None and result.returncode == 0:
             print("✅ SSH доступен!")
             return True
         
@@ -255,102 +275,183 @@ def wait_for_ssh(ip, max_attempts=30):
     print("❌ Timeout: SSH не стал доступен")
     return False
 
-def get_vpn_config(ip):
-    """Получить конфигурацию VPN с сервера"""
-    print("📥 Получение конфигурации VPN...")
-    
-    key_path = Path.home() / ".ssh" / "vpn_do_key"
-    
-    # Ждем пока WireGuard установится (может занять время)
-    print("⏳ Ожидание установки WireGuard...")
-    time.sleep(30)
-    
-    max_attempts = 20
-    for attempt in range(max_attempts):
-        result = subprocess.run(
-            ['ssh', '-i', str(key_path), '-o', 'StrictHostKeyChecking=no',
-             f'root@{ip}', 'test -f /root/client.conf && echo "ready"'],
-            capture_output=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0 and b'ready' in result.stdout:
-            break
-        
-        time.sleep(5)
-    
-    # Получаем конфигурацию клиента
-    result = subprocess.run(
-        ['ssh', '-i', str(key_path), '-o', 'StrictHostKeyChecking=no',
-         f'root@{ip}', 'cat /root/client.conf'],
-        capture_output=True,
-        text=True,
-        timeout=10
+def server_interface_address(peer_state):
+    """Адрес интерфейса сервера с префиксом всей подсети пиров"""
+    prefix = peer_state.allocator.network.prefixlen
+    return f"{peer_state.data['server_address']}/{prefix}"
+
+def render_client_config(peer_state, peer_name):
+    """Собрать конфигурацию пира локально по состоянию сервера"""
+    peer = peer_state.peers[peer_name]
+    prefix = peer_state.allocator.network.prefixlen
+    return CLIENT_CONFIG.format(
+        client_private_key=peer['private_key'],
+        address=f"{peer['address']}/{prefix}",
+        server_public_key=peer_state.data['server_public_key'],
+        ip=peer_state.data['ip'],
+        port=peer_state.data['port'],
+        # MTU клиента совпадает с MTU сервера из профиля сети
+        mtu_line=tuning.wg_mtu_line(peer_state.data.get('mtu'))
     )
-    
-    if result.returncode == 0:
-        config = result.stdout
-        # Обновляем Endpoint с реальным IP
-        config = config.replace('$(curl -s ifconfig.me):51820', f'{ip}:51820')
-        return config
-    else:
-        print(f"❌ Ошибка получения конфигурации: {result.stderr}")
-        return None
 
-def save_config(config, ip):
+def save_config(config, ip, config_file='wg0.conf'):
     """Сохранить конфигурацию в файл"""
-    config_file = Path('wg0.conf')
+    config_file = Path(config_file)
+    config_file.parent.mkdir(parents=True, exist_ok=True)
     with open(config_file, 'w') as f:
         f.write(config)
     
     print(f"✅ Конфигурация сохранена в {config_file}")
     print(f"\n📋 Информация о VPN сервере:")
     print(f"   IP адрес: {ip}")
-    print(f"   Порт: 51820")
+    print(f"   Порт: {WG_PORT}")
     print(f"   Протокол: WireGuard")
     print(f"\n📱 Для подключения:")
     print(f"   1. Установите WireGuard клиент")
     print(f"   2. Импортируйте файл {config_file}")
-    print(f"   3. Или отсканируйте QR код (если доступен)")
+    # QR код строится по запросу: на развертывание парка он не тратит время
+    print(f"   3. Или отсканируйте QR код: python3 qr_codes.py {config_file}")
     
     return config_file
 
+def deploy_node(token, ssh_key_id=None, name=DROPLET_NAME, region=None, size=SIZE,
+                config_file='wg0.conf', trace=None, tags=(),
+                watcher=None, tuning_profile=None, deployment_id=None):
+    """Развернуть один сервер и вернуть информацию о нем
+
+    Шаги выполняет dag.Graph: независимые (SSH ключ в аккаунте, выбор
+    региона, генерация ключей) идут параллельно, остальные стартуют, как
+    только готовы их входы. Конфигурация клиента готова сразу после
+    получения IP: ключи созданы локально, SSH для нее не нужен. Фазы
+    замеряются в trace (timing.Trace), после прогона печатается
+    критический путь. Профиль сети tuning_profile (по умолчанию
+    VPN_TUNING) записывается в тег droplet и в инвентарь. Результаты
+    шагов до IP droplet сохраняются в контрольную точку deployment_id (по
+    умолчанию протокол и имя): повторный запуск после сбоя продолжает
+    с того же droplet.
+    """
+    trace = trace or timing.Trace('wireguard', name)
+    profile = tuning.get(tuning_profile)
+    tags = TAGS + [tag for tag in tags if tag not in TAGS] + [tuning.tag(profile)]
+    progress = checkpoint.resume(token, 'wireguard', name,
+                                 {'size': size, 'region': region, 'tuning': profile['id']},
+                                 deployment_id)
+    callback_url, ready = readiness.register(name)
+    # Агент метрик ставится, только если задан сборщик (VPN_METRICS_ADDR)
+    agent = metrics_collector.install_snippet(name, 'wireguard')
+    graph = dag.Graph(trace, progress)
+    
+    if ssh_key_id is None:
+        graph.step('ssh_key', lambda: create_ssh_key(token), timeout=60, retries=1)
+    else:
+        graph.value('ssh_key', ssh_key_id)
+    if region is None:
+        graph.step('region', lambda: regions.select_region(REGION),
+                   timeout=regions.PROBE_TIMEOUT + 5, checkpoint=True)
+    else:
+        graph.value('region', region)
+    
+    def keygen():
+        server_private_key, server_public_key = wg_keys.generate_keypair()
+        peer_state = wg_peers.PeerState.create(name, None, WG_SUBNET, server_public_key, WG_PORT)
+        # MTU нужен и для конфигураций клиентов, добавленных позже (manage_peers.py)
+        peer_state.data['tuning'] = profile['id']
+        peer_state.data['mtu'] = profile['wg_mtu']
+        peer_state.add_peer(CLIENT_NAME)
+        return server_private_key, peer_state
+    
+    # Ключ сервера уже в user_data созданного droplet: при продолжении - те же ключи
+    graph.step('keygen', keygen, timeout=30,
+               checkpoint=(lambda keys: [keys[0], dict(keys[1].data)],
+                           lambda saved: (saved[0], wg_peers.PeerState(saved[1]))))
+    graph.step('user_data', lambda region, keys: render_user_data(keys[0], keys[1], region,
+                                                                  callback_url, profile, agent),
+               deps=['region', 'keygen'], timeout=30)
+    graph.step('create_droplet', lambda ssh_key, region, user_data: create_droplet(
+                   token, ssh_key, *user_data, name, region, size, tags),
+               deps=['ssh_key', 'region', 'user_data'], timeout=120, checkpoint=True)
+    
+    # Droplet попадает в инвентарь сразу: даже при сбое дальше он не потеряется
+    graph.step('inventory_new', lambda region, droplet: inventory.add(
+                   {'droplet_id': droplet[0], 'name': name, 'region': region, 'size': size,
+                    'config_file': str(config_file), 'tags': tags,
+                    'tuning': profile['id']}, 'wireguard'),
+               deps=['region', 'create_droplet'], timeout=60, retries=2)
+    graph.step('wait_for_droplet',
+               lambda droplet: wait_for_droplet(token, *droplet, watcher=watcher),
+               deps=['create_droplet'], timeout=330, retries=1, checkpoint=True)
+    
+    def client_config(region, keys, droplet, ip):
+        # Состояние пиров нужно manage_peers.py для добавления клиентов
+        peer_state = keys[1]
+        peer_state.data['ip'] = ip
+        peer_state.save()
+    
+        info = {
+            'droplet_id': droplet[0],
+            'ip': ip,
+            'name': name,
+            'region': region,
+            'size': size,
+            'server_public_key': peer_state.data['server_public_key'],
+            'subnet': WG_SUBNET,
+            'tuning': profile['id'],
+            'tags': tags
+        }
+        config = render_client_config(peer_state, CLIENT_NAME)
+        info['config_file'] = str(save_config(config, ip, config_file))
+        return info
+    
+    graph.step('client_config', client_config,
+               deps=['region', 'keygen', 'create_droplet', 'wait_for_droplet'], timeout=30)
+    graph.step('inventory', lambda info, _: inventory.add(info, 'wireguard'),
+               deps=['client_config', 'inventory_new'], timeout=60, retries=2)
+    
+    # Сигнал готовности только подтверждает запуск сервера: клиент может
+    # подключаться уже сейчас, WireGuard сам повторит handshake. Droplet из
+    # прошлого запуска сообщает о готовности прежнему приемнику: не ждем.
+    # Ожидание после активации droplet: droplet с ошибкой создания сигнала
+    # не пришлет, и запуск не должен ждать его до таймаута
+    if ready is not None and 'create_droplet' not in progress:
+        def cloud_init(_):
+            started = ready.wait(180)
+            if started:
+                print(f"✅ WireGuard на {name} запущен")
+            else:
+                print(f"⚠️  {name}: нет сигнала готовности, сервер может еще настраиваться")
+            return started
+    
+        graph.step('cloud_init', cloud_init, deps=['wait_for_droplet'], timeout=200)
+    
+    results = graph.run()
+    graph.report()
+    progress.discard()
+    return results['client_config']
+
 def main():
     print("=" * 60)
     print("🚀 Развертывание WireGuard VPN сервера на DigitalOcean")
     print("=" * 60)
     
     token = get_do_token()
-    ssh_key_id = create_ssh_key(token)
-    droplet_id = create_droplet(token, ssh_key_id)
-    ip = wait_for_droplet(token, droplet_id)
-    
-    if wait_for_ssh(ip):
-        config = get_vpn_config(ip)
-        if config:
-            config_file = save_config(config, ip)
-            
-            # Сохраняем информацию о droplet
-            info = {
-                'droplet_id': droplet_id,
-                'ip': ip,
-                'name': DROPLET_NAME,
-                'region': REGION,
-                'size': SIZE
-            }
-            
-            with open('vpn_info.json', 'w') as f:
-                json.dump(info, f, indent=2)
-            
-            print(f"\n✅ VPN сервер успешно развернут!")
-            print(f"   Droplet ID: {droplet_id}")
-            print(f"   Конфигурация: {config_file}")
-            print(f"\n💡 Для удаления сервера:")
-            print(f"   python3 delete_vpn.py")
-        else:
-            print("❌ Не удалось получить конфигурацию VPN")
-    else:
-        print("❌ Не удалось подключиться по SSH")
+    trace = timing.Trace('wireguard', DROPLET_NAME)
+    try:
+        # SSH ключ регистрируется параллельно с остальными шагами
+        info = deploy_node(token, trace=trace)
+    finally:
+        timing.write([trace])
+    
+    # Информация о droplet - в инвентаре (inventory.py)
+    config_file = info.pop('config_file')
+    
+    print(f"\n✅ VPN сервер успешно развернут!")
+    print(f"   Droplet ID: {info['droplet_id']}")
+    print(f"   Конфигурация: {config_file}")
+    print(f"   Время до готовности: {trace.record()['time_to_ready']}s ({timing.TRACE_FILE})")
+    print(f"\n💡 Для удаления сервера:")
+    print(f"   python3 delete_vpn.py")
+    
+    get_client(token).report()
 
 if __name__ == '__main__':
     main()
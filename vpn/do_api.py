@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Общий клиент DigitalOcean API для vpn скриптов
+
+Один requests.Session на токен: keep-alive пул соединений, повторы с
+jitter-задержкой для 429/5xx, таймауты по классам запросов, упреждающее
+торможение по заголовкам RateLimit-* и учет задержки каждого запроса.
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = os.environ.get('DO_API_URL', 'https://api.digitalocean.com/v2')
+
+# Таймауты (connect, read) в секундах по классам запросов
+TIMEOUTS = {
+    'read': (3.05, 15),    # разовые GET (ключи, списки)
+    'poll': (3.05, 5),     # частые опросы статуса
+    'write': (3.05, 30),   # создание/удаление ресурсов
+}
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5     # секунды, первая пауза перед повтором
+BACKOFF_MAX = 30       # верхняя граница паузы
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Когда в окне rate limit остается меньше запросов, чем RATE_LIMIT_RESERVE,
+# размазываем оставшийся бюджет до момента сброса окна
+RATE_LIMIT_RESERVE = 50
+
+VERBOSE = os.environ.get('DO_API_VERBOSE') == '1'
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class DOClient:
+    """Клиент DigitalOcean API с пулом соединений и повторами"""
+
+    def __init__(self, token, base_url=API_URL, pool_size=32):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        })
+
+        self._lock = threading.Lock()
+        self.rate_remaining = None
+        self.rate_reset = None
+        # (method, path, call_class, status, seconds, attempts)
+        self.latencies = []
+
+    def get(self, path, call_class='read', **kwargs):
+        return self.request('GET', path, call_class, **kwargs)
+
+    def post(self, path, call_class='write', **kwargs):
+        return self.request('POST', path, call_class, **kwargs)
+
+    def delete(self, path, call_class='write', **kwargs):
+        return self.request('DELETE', path, call_class, **kwargs)
+
+    def request(self, method, path, call_class='read', **kwargs):
+        """Выполнить запрос с повторами; вернуть последний ответ
+
+        POST повторяется только при 429 и при ошибке установки соединения:
+        в остальных случаях запрос мог уже создать ресурс на стороне API.
+        """
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        kwargs.setdefault('timeout', TIMEOUTS[call_class])
+        idempotent = method != 'POST'
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._throttle()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                safe = idempotent or isinstance(e, requests.ConnectTimeout)
+                if not safe or attempt > MAX_RETRIES:
+                    self._record(method, path, call_class, None, started, attempt)
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._update_rate_limit(response)
+            status = response.status_code
+            retryable = status == 429 or (idempotent and status in RETRY_STATUSES)
+            if not retryable or attempt > MAX_RETRIES:
+                self._record(method, path, call_class, status, started, attempt)
+                return response
+
+            delay = self._retry_after(response) if status == 429 else None
+            time.sleep(delay if delay is not None else self._backoff(attempt))
+
+    def _backoff(self, attempt):
+        """Экспоненциальная пауза с full jitter"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+    def _retry_after(self, response):
+        value = response.headers.get('Retry-After')
+        if value and value.isdigit():
+            return min(BACKOFF_MAX, int(value)) + random.uniform(0, 1)
+        reset = response.headers.get('RateLimit-Reset')
+        if reset and reset.isdigit():
+            return min(BACKOFF_MAX, max(0, int(reset) - time.time())) + random.uniform(0, 1)
+        return None
+
+    def _update_rate_limit(self, response):
+        remaining = response.headers.get('RateLimit-Remaining')
+        reset = response.headers.get('RateLimit-Reset')
+        if remaining is None or not remaining.isdigit():
+            return
+        with self._lock:
+            self.rate_remaining = int(remaining)
+            if reset and reset.isdigit():
+                self.rate_reset = int(reset)
+
+    def _throttle(self):
+        """Притормозить до отказа API, если бюджет запросов почти исчерпан"""
+        with self._lock:
+            remaining, reset = self.rate_remaining, self.rate_reset
+            if remaining is None or reset is None or remaining >= RATE_LIMIT_RESERVE:
+                return
+            window = max(0.0, reset - time.time())
+            delay = min(BACKOFF_MAX, window / (remaining + 1))
+            # Резервируем запрос, чтобы параллельные потоки не съели бюджет разом
+            self.rate_remaining = max(0, remaining - 1)
+        if delay > 0:
+            if VERBOSE:
+                print(f"   ⏸  Rate limit: осталось {remaining}, пауза {delay:.1f}s", file=sys.stderr)
+            time.sleep(delay)
+
+    def _record(self, method, path, call_class, status, started, attempts):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.latencies.append((method, path, call_class, status, elapsed, attempts))
+        if VERBOSE:
+            print(f"   ↔  {method} {path} → {status} за {elapsed * 1000:.0f} ms"
+                  f" (попыток: {attempts})", file=sys.stderr)
+
+    def report(self):
+        """Вывести сводку задержек запросов по классам"""
+        with self._lock:
+            records = list(self.latencies)
+        if not records:
+            return
+        print("\n📊 DigitalOcean API:")
+        for call_class in sorted({r[2] for r in records}):
+            times = sorted(r[4] for r in records if r[2] == call_class)
+            retries = sum(r[5] - 1 for r in records if r[2] == call_class)
+            p50 = times[len(times) // 2]
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            print(f"   {call_class:<6} запросов: {len(times):>3}  повторов: {retries:>2}  "
+                  f"p50: {p50 * 1000:.0f} ms  p95: {p95 * 1000:.0f} ms  max: {times[-1] * 1000:.0f} ms")
+
+
+def wait_for_action(api, action_id, timeout=600, interval=2, max_interval=15):
+    """Ждать завершения action; вернуть его итоговый статус
+
+    Возвращает 'completed', 'errored' или 'timeout'.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = api.get(f'/actions/{action_id}', call_class='poll')
+        if response.status_code == 200:
+            status = response.json()['action']['status']
+            if status != 'in-progress':
+                return status
+        time.sleep(interval)
+        interval = min(max_interval, interval * 1.5)
+    return 'timeout'
+
+
+def list_all(api, path, key, call_class='read'):
+    """Все объекты списка по всем страницам (links.pages.next)
+
+    Возвращает None, если API ответил ошибкой (после повторов клиента).
+    """
+    items = []
+    url = path
+    while url:
+        response = api.get(url, call_class=call_class)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        items.extend(data.get(key, []))
+        url = data.get('links', {}).get('pages', {}).get('next')
+    return items
+
+
+def public_ipv4(droplet):
+    """Публичный IPv4 droplet или None, если он еще не назначен"""
+    for network in droplet.get('networks', {}).get('v4', []):
+        if network['type'] == 'public':
+            return network['ip_address']
+    return None
+
+
+def get_client(token):
+    """Вернуть общий клиент для токена (один пул соединений на процесс)"""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = _clients[token] = DOClient(token)
+        return client
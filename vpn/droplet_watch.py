@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Пакетное ожидание готовности droplet парка
+
+Вместо отдельного опроса каждого droplet один фоновый поток запрашивает
+список droplet с тегом парка (GET /droplets?tag_name=..., до 200 на
+страницу) и раздает статус ожидающим потокам развертывания. Число запросов
+на такт опроса - число страниц списка, а не число узлов. Пауза между
+тактами растет как в readiness.wait_until и сбрасывается к начальной,
+когда появляется новый ожидающий droplet.
+
+Droplet, который STALE_TICKS тактов подряд не стал active, проверяется по
+action создания: при ошибке (errored) ожидающий узнает о ней сразу, а не
+по таймауту.
+
+    watcher = DropletWatcher(get_client(token), 'fleet-vpn-server')
+    ip, error = watcher.wait(droplet_id, timeout=300, action_id=action_id)
+"""
+
+import time
+import threading
+
+from do_api import list_all, public_ipv4
+import readiness
+
+PER_PAGE = 200
+STALE_TICKS = 3   # тактов без active до проверки action создания
+
+
+class DropletWatcher:
+    """Опрос статуса всех ожидаемых droplet одним списком по тегу"""
+
+    def __init__(self, api, tag, initial=readiness.POLL_INITIAL, factor=readiness.POLL_FACTOR,
+                 max_interval=readiness.POLL_MAX):
+        self.api = api
+        self.tag = tag
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+
+        self._lock = threading.Lock()
+        self._waiting = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        # Число тактов опроса (для бенчмарка)
+        self.ticks = 0
+
+    def wait(self, droplet_id, timeout=300, action_id=None):
+        """Ждать, пока droplet станет active с публичным IP
+
+        Вернуть (IP, None); при таймауте (None, None), при ошибке action
+        создания action_id - (None, статус action).
+        """
+        entry = {'ready': threading.Event(), 'ip': None, 'action': action_id, 'error': None, 'stale': 0}
+        with self._lock:
+            self._waiting[droplet_id] = entry
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f'watch-{self.tag}')
+                self._thread.start()
+        # Новый droplet: не ждать конца длинной паузы, опросить заново с короткой
+        self._wakeup.set()
+
+        if not entry['ready'].wait(timeout):
+            with self._lock:
+                self._waiting.pop(droplet_id, None)
+            return None, None
+        return entry['ip'], entry['error']
+
+    def _poll(self):
+        """Один такт опроса: список по тегу, готовые droplet будят своих ожидающих"""
+        droplets = list_all(self.api, f'/droplets?tag_name={self.tag}&per_page={PER_PAGE}',
+                            'droplets', call_class='poll')
+        self.ticks += 1
+        if droplets is None:
+            return
+
+        stale = []
+        with self._lock:
+            for droplet in droplets:
+                entry = self._waiting.get(droplet['id'])
+                if entry is None:
+                    continue
+                if droplet['status'] != 'active':
+                    entry['stale'] += 1
+                    if entry['action'] is not None and entry['stale'] % STALE_TICKS == 0:
+                        stale.append((droplet['id'], entry['action']))
+                    continue
+                ip = public_ipv4(droplet)
+                if ip:
+                    entry['ip'] = ip
+                    entry['ready'].set()
+                    del self._waiting[droplet['id']]
+
+        # Запросы action - вне блокировки: wait() не ждет конца такта
+        for droplet_id, action_id in stale:
+            response = self.api.get(f'/actions/{action_id}', call_class='poll')
+            if response.status_code != 200:
+                continue
+            status = response.json()['action']['status']
+            if status in ('in-progress', 'completed'):
+                continue
+            with self._lock:
+                entry = self._waiting.pop(droplet_id, None)
+                if entry is not None:
+                    entry['error'] = status
+                    entry['ready'].set()
+
+    def _run(self):
+        interval = self.initial
+        while True:
+            woken = self._wakeup.wait(interval)
+            self._wakeup.clear()
+            if woken:
+                # Только что созданный droplet заведомо не готов; пауза заодно
+                # собирает droplet, созданные следом, в один такт
+                time.sleep(self.initial)
+                interval = self.initial
+            else:
+                interval = min(self.max_interval, interval * self.factor)
+
+            with self._lock:
+                if not self._waiting:
+                    self._thread = None
+                    return
+            try:
+                self._poll()
+            except Exception as e:
+                # Ошибка сети после повторов do_api: следующий такт повторит запрос
+                print(f"⚠️  Опрос droplet с тегом {self.tag}: {type(e).__name__}: {e}")
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Пакетная выгрузка конфигураций клиентов и QR кодов в архив
+
+Конфигурации (и для WireGuard - QR коды PNG и для терминала) собираются
+в пуле процессов и по мере готовности пишутся потоком в zip или tar(.gz):
+в памяти держится только окно из нескольких задач на процесс, поэтому
+выгрузка тысяч пиров не растит память. Архив можно писать в stdout (-o -).
+
+Отпечатки входных данных пиров сохраняются в exports/<протокол>-<сервер>.json;
+с --changed выгружаются только новые и изменившиеся пиры, а отозванные
+перечисляются в removed.txt внутри архива.
+
+WireGuard - пиры из wg_peers/<сервер>.json (manage_peers.py add).
+OpenVPN - клиенты по именам: сертификаты выпускаются в openvpn_pki/ (уже
+выпущенные берутся как есть), адрес и порты сервера - из инвентаря.
+
+    python3 export_configs.py --server vpn-server -o team.zip
+    python3 export_configs.py --server vpn-server -o team.tar.gz --qr png terminal
+    python3 export_configs.py --server vpn-server -o delta.zip --changed
+    python3 export_configs.py --protocol openvpn --server vpn-openvpn --count 50 -o team.zip
+    python3 export_configs.py --server vpn-server -o - --format tar | ssh host 'tar x'
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tarfile
+import zipfile
+import argparse
+from io import BytesIO
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import deploy_vpn
+import deploy_openvpn
+import openvpn_pki
+import wg_peers
+import qr_codes
+import inventory
+import manage_peers
+import tuning
+
+MANIFEST_DIR = Path('exports')
+QR_FORMATS = ('png', 'terminal')
+IN_FLIGHT = 4   # задач на процесс пула, ожидающих записи в архив
+
+FORMATS = {
+    'zip': ('.zip',),
+    'tar': ('.tar',),
+    'tgz': ('.tar.gz', '.tgz'),
+}
+
+
+def tuning_profile(profile_id):
+    """Профиль сети сервера по id из инвентаря (throughput-v2 -> throughput)"""
+    name = (profile_id or '').rpartition('-v')[0]
+    return tuning.get(name if name in tuning.PROFILES else None)
+
+
+def wireguard_jobs(state, names=None):
+    """Задачи выгрузки пиров WireGuard: (протокол, имя, данные пира и сервера)"""
+    server = {key: value for key, value in state.data.items() if key != 'peers'}
+    for name in names or state.peers:
+        yield 'wireguard', name, {'server': server, 'peer': state.peers[name]}
+
+
+def openvpn_jobs(record, names):
+    """Задачи выгрузки клиентов OpenVPN сервера из инвентаря"""
+    server = {
+        'ip': record['ip'],
+        'ports': record.get('ports') or [deploy_openvpn.OPENVPN_PORT],
+        'mode': record.get('mode') or 'compat',
+        'tuning': record.get('tuning'),
+    }
+    for name in names:
+        yield 'openvpn', name, server
+
+
+def fingerprint(job):
+    """Отпечаток входных данных пира: неизменные пиры повторно не выгружаются"""
+    protocol, name, data = job
+    data = dict(data, name=name)
+    if protocol == 'openvpn':
+        cert = openvpn_pki.PKI_DIR / f'{name}.crt'
+        data['cert'] = cert.read_text() if cert.exists() else None
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def render(job, formats=()):
+    """Файлы одного пира (выполняется в процессе пула): имя, [(файл, байты)], отпечаток"""
+    protocol, name, data = job
+    if protocol == 'wireguard':
+        # Состояние сервера только с этим пиром: в задачу не копируются все пиры
+        state = wg_peers.PeerState(dict(data['server'], peers={name: data['peer']}))
+        config = deploy_vpn.render_client_config(state, name)
+        files = [(f'{name}.conf', config.encode())]
+    else:
+        config = deploy_openvpn.render_client_config(data['ip'], openvpn_pki.client_bundle(name),
+                                                     tuning_profile(data['tuning']), data['ports'],
+                                                     data['mode'])
+        files = [(f'{name}.ovpn', config.encode())]
+        formats = ()
+
+    if formats:
+        modules = qr_codes.matrix(config)
+        if 'png' in formats:
+            files.append((f'{name}.png', qr_codes.png(modules)))
+        if 'terminal' in formats:
+            files.append((f'{name}.txt', qr_codes.terminal(modules).encode()))
+    return name, files, fingerprint(job)
+
+
+def render_all(jobs, formats=(), workers=None):
+    """Результаты render() по мере готовности; в пуле не больше workers * IN_FLIGHT задач"""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for job in jobs:
+            pending.add(pool.submit(render, job, formats))
+            if len(pending) >= workers * IN_FLIGHT:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
+class Archive:
+    """Потоковая запись файлов в zip или tar(.gz); в архиве закрытые ключи - права 0600"""
+
+    def __init__(self, output, kind):
+        if output == '-':
+            self.stream = sys.stdout.buffer
+        else:
+            self.stream = open(os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb')
+        self.kind = kind
+        if kind == 'zip':
+            self.archive = zipfile.ZipFile(self.stream, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            # Режим w| пишет поток без перемотки, годится и для stdout
+            self.archive = tarfile.open(fileobj=self.stream, mode='w|gz' if kind == 'tgz' else 'w|')
+
+    def add(self, name, data):
+        if self.kind == 'zip':
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o600 << 16
+            self.archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o600
+            self.archive.addfile(info, BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+        if self.stream is not sys.stdout.buffer:
+            self.stream.close()
+
+
+def archive_kind(output, kind=None):
+    """Формат архива: явный или по расширению файла"""
+    if kind:
+        return kind
+    for name, suffixes in FORMATS.items():
+        if output.endswith(suffixes):
+            return name
+    return 'zip'
+
+
+def manifest_path(protocol, server):
+    return MANIFEST_DIR / f'{protocol}-{server}.json'
+
+
+def load_manifest(protocol, server):
+    try:
+        with open(manifest_path(protocol, server), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'peers': {}, 'qr': []}
+
+
+def save_manifest(protocol, server, manifest):
+    """Атомарно записать отпечатки выгруженных пиров"""
+    MANIFEST_DIR.mkdir(mode=0o700, exist_ok=True)
+    path = manifest_path(protocol, server)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def export(jobs, output, kind, prefix, formats=(), manifest=None, changed_only=False, removed=(),
+           workers=None, log=sys.stdout):
+    """Выгрузить пиров в архив; вернуть обновленный manifest и число выгруженных/пропущенных"""
+    manifest = manifest or {'peers': {}, 'qr': []}
+    known = manifest['peers'] if changed_only and manifest.get('qr') == list(formats) else {}
+    skipped = 0
+
+    def selected():
+        nonlocal skipped
+        for job in jobs:
+            if known.get(job[1]) == fingerprint(job):
+                skipped += 1
+                continue
+            yield job
+
+    archive = Archive(output, kind)
+    exported = 0
+    peers = dict(manifest['peers'])
+    try:
+        for name, files, digest in render_all(selected(), formats, workers):
+            for filename, data in files:
+                archive.add(f'{prefix}/{filename}', data)
+            peers[name] = digest
+            exported += 1
+            if exported % 100 == 0:
+                print(f"   {exported} пиров...", file=log)
+        if removed:
+            archive.add(f'{prefix}/removed.txt', "".join(f"{name}\n" for name in removed).encode())
+    finally:
+        archive.close()
+
+    for name in removed:
+        peers.pop(name, None)
+    return {'peers': peers, 'qr': list(formats), 'exported_at': time.time()}, exported, skipped
+
+
+def client_names(args):
+    """Имена клиентов OpenVPN: из аргументов или --count/--prefix как в manage_peers.py"""
+    if args.peers:
+        return args.peers
+    width = len(str(args.start + args.count - 1))
+    return [f"{args.prefix}-{i:0{max(4, width)}d}" for i in range(args.start, args.start + args.count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная выгрузка конфигураций клиентов в архив")
+    parser.add_argument('peers', nargs='*', help="имена пиров (по умолчанию все пиры WireGuard сервера)")
+    parser.add_argument('--protocol', choices=('wireguard', 'openvpn'), default='wireguard')
+    parser.add_argument('--server', help="имя сервера (droplet)")
+    parser.add_argument('-o', '--output', required=True, help="файл архива или - для stdout")
+    parser.add_argument('--format', choices=sorted(FORMATS), help="формат архива (по умолчанию по расширению)")
+    parser.add_argument('--qr', nargs='*', choices=QR_FORMATS, default=['png'],
+                        help="QR коды WireGuard: png, terminal (без значений - без QR)")
+    parser.add_argument('--changed', action='store_true', help="только новые и изменившиеся пиры")
+    parser.add_argument('--workers', type=int, help="процессов (по умолчанию по числу CPU)")
+    parser.add_argument('--count', type=int, default=1, help="клиентов OpenVPN, если имена не заданы")
+    parser.add_argument('--prefix', default='client')
+    parser.add_argument('--start', type=int, default=1, help="номер первого клиента")
+    args = parser.parse_args()
+
+    # Архив в stdout: сообщения только в stderr
+    log = sys.stderr if args.output == '-' else sys.stdout
+    kind = archive_kind(args.output, args.format)
+    formats = tuple(args.qr) if args.protocol == 'wireguard' else ()
+    if formats and not qr_codes.available():
+        print("⚠️  Нет генератора QR (pip install qrcode или apt install qrencode): только конфигурации",
+              file=log)
+        formats = ()
+
+    removed = []
+    if args.protocol == 'wireguard':
+        state = manage_peers.load_state(args.server)
+        server = state.name
+        missing = [name for name in args.peers if name not in state.peers]
+        if missing:
+            print(f"❌ Пиры не найдены: {', '.join(missing)}", file=log)
+            sys.exit(1)
+        manifest = load_manifest(args.protocol, server)
+        if args.changed and not args.peers:
+            removed = sorted(set(manifest['peers']) - set(state.peers))
+        jobs = wireguard_jobs(state, args.peers)
+        total = len(args.peers or state.peers)
+    else:
+        records = [r for r in inventory.find(protocol='openvpn', name=args.server) if r.get('ip')]
+        if not args.server or not records:
+            print(f"❌ OpenVPN сервер {args.server or '(--server)'} не найден в инвентаре", file=log)
+            sys.exit(1)
+        server = records[0]['name']
+        # CA и tls-auth создаются до пула: процессы выпускают только сертификаты клиентов
+        openvpn_pki.ensure_ca()
+        openvpn_pki.tls_auth_key()
+        names = client_names(args)
+        manifest = load_manifest(args.protocol, server)
+        jobs = openvpn_jobs(records[0], names)
+        total = len(names)
+
+    if args.changed and manifest.get('qr') != list(formats) and manifest['peers']:
+        print("ℹ️  Набор QR форматов изменился: выгружаются все пиры", file=log)
+
+    print(f"📦 Выгрузка {total} пиров {server} в {args.output} ({kind}"
+          f"{', QR: ' + ', '.join(formats) if formats else ''})...", file=log)
+    started = time.monotonic()
+    manifest, exported, skipped = export(jobs, args.output, kind, server, formats, manifest, args.changed,
+                                         removed, args.workers, log)
+    save_manifest(args.protocol, server, manifest)
+
+    print(f"✅ Выгружено {exported} пиров за {time.monotonic() - started:.1f}s"
+          f"{f', без изменений {skipped}' if skipped else ''}"
+          f"{f', отозвано {len(removed)} (removed.txt)' if removed else ''}", file=log)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Локальная имитация DigitalOcean API для тестов и бенчмарков без затрат
+
+Поддерживаются ресурсы, которые используют скрипты развертывания:
+/v2/account/keys, /v2/droplets (создание, чтение, список с тегом и
+пагинацией, удаление по ID и по тегу), /v2/actions и /v2/snapshots (список
+и удаление; снимки добавляются через add_snapshot). Droplet проходит
+состояния new → active с настраиваемыми задержками, публичный IP
+назначается отдельно. Если в user_data есть сигнал готовности
+(readiness.phone_home_snippet), он отправляется после "cloud-init".
+
+Задержки и ошибки:
+    latency        задержка каждого ответа (секунды)
+    boot_time      new → active
+    ip_delay       задержка назначения IP после active
+    cloud_init     задержка сигнала готовности после active
+    error_rate     доля ответов 500 (кроме POST, чтобы не плодить ресурсы)
+    rate_limit     запросов в окне RATE_LIMIT_WINDOW, затем 429
+    create_error_rate  доля droplet, action создания которых завершается
+                   ошибкой (errored): droplet остается в статусе new
+
+Запуск отдельно:
+    python3 fake_do.py --port 8700 --boot-time 5
+    DO_API_URL=http://127.0.0.1:8700/v2 DIGITALOCEAN_ACCESS_TOKEN=fake python3 deploy_vpn.py
+"""
+
+import re
+import json
+import base64
+import time
+import random
+import hashlib
+import argparse
+import threading
+import itertools
+import urllib.request
+from collections import Counter
+from urllib.parse import urlparse, parse_qs, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RATE_LIMIT_WINDOW = 60
+CALLBACK_RE = re.compile(r"-X POST '([^']+)'")
+
+
+class FakeDigitalOcean:
+    """Состояние имитации и HTTP сервер"""
+
+    def __init__(self, latency=0.0, boot_time=2.0, ip_delay=0.5, cloud_init=1.0,
+                 error_rate=0.0, rate_limit=5000, seed=None, create_error_rate=0.0):
+        self.latency = latency
+        self.boot_time = boot_time
+        self.ip_delay = ip_delay
+        self.cloud_init = cloud_init
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.create_error_rate = create_error_rate
+        self.random = random.Random(seed)
+
+        self.keys = {}
+        self.droplets = {}
+        self.actions = {}
+        self.snapshots = {}
+        self._ids = itertools.count(100000)
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_used = 0
+
+        # Счетчики для бенчмарков: (метод, шаблон пути) → число запросов
+        self.calls = Counter()
+        self.errors_injected = 0
+
+        self.base_url = None
+        self._server = None
+        self._thread = None
+
+    # --- жизненный цикл сервера
+
+    def start(self, host='127.0.0.1', port=0):
+        """Запустить сервер в фоновом потоке; вернуть базовый URL API (с /v2)"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, payload, headers = fake.handle(self.command, self.path, body)
+                data = b"" if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self.base_url = f"http://{host}:{self._server.server_address[1]}/v2"
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # --- диспетчер
+
+    def handle(self, method, raw_path, body):
+        """Обработать запрос; вернуть (статус, JSON, заголовки)"""
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(raw_path)
+        path = url.path.rstrip('/')
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        query['_path'] = path
+        route = re.sub(r'/\d+(?=/|$)', '/{id}', re.sub(r'/([0-9a-f]{2}:){15}[0-9a-f]{2}', '/{fp}', path))
+        with self._lock:
+            self.calls[(method, route)] += 1
+            headers = self._rate_limit_headers()
+            if self._window_used > self.rate_limit:
+                return 429, {'id': 'too_many_requests', 'message': 'API Rate limit exceeded'}, headers
+            if method != 'POST' and self.error_rate and self.random.random() < self.error_rate:
+                self.errors_injected += 1
+                return 500, {'id': 'server_error', 'message': 'Injected error'}, headers
+
+            handler = ROUTES.get((method, route))
+            if handler is None:
+                return 404, {'id': 'not_found', 'message': f'{method} {path}'}, headers
+            args = [int(part) for part in re.findall(r'/(\d+)(?=/|$)', path)]
+            if route.endswith('{fp}'):
+                args = [path.rsplit('/', 1)[-1]]
+            status, payload = handler(self, *args, query=query, body=body)
+            return status, payload, headers
+
+    def _rate_limit_headers(self):
+        now = time.time()
+        if now - self._window_start >= RATE_LIMIT_WINDOW:
+            self._window_start, self._window_used = now, 0
+        self._window_used += 1
+        return {
+            'RateLimit-Limit': str(self.rate_limit),
+            'RateLimit-Remaining': str(max(0, self.rate_limit - self._window_used)),
+            'RateLimit-Reset': str(int(self._window_start + RATE_LIMIT_WINDOW)),
+        }
+
+    # --- SSH ключи
+
+    def _list_keys(self, query, body):
+        return 200, self._page('ssh_keys', list(self.keys.values()), query)
+
+    def _get_key(self, key, query, body):
+        for record in self.keys.values():
+            if key in (record['id'], record['fingerprint']):
+                return 200, {'ssh_key': record}
+        return 404, {'id': 'not_found', 'message': 'The resource you requested could not be found.'}
+
+    def _create_key(self, query, body):
+        public_key = body.get('public_key', '')
+        # Как в DigitalOcean: MD5 от тела ключа (base64 часть строки)
+        parts = public_key.split()
+        try:
+            blob = base64.b64decode(parts[1]) if len(parts) > 1 else b''
+        except ValueError:
+            return 422, {'id': 'unprocessable_entity', 'message': 'Key invalid type'}
+        digest = hashlib.md5(blob).hexdigest()
+        fingerprint = ':'.join(digest[i:i + 2] for i in range(0, 32, 2))
+        if any(k['fingerprint'] == fingerprint for k in self.keys.values()):
+            return 422, {'id': 'unprocessable_entity', 'message': 'SSH Key is already in use on your account'}
+        key_id = next(self._ids)
+        self.keys[key_id] = {'id': key_id, 'name': body.get('name'), 'public_key': public_key,
+                             'fingerprint': fingerprint}
+        return 201, {'ssh_key': self.keys[key_id]}
+
+    # --- droplets
+
+    def _create_droplet(self, query, body):
+        names = body.get('names') or [body.get('name')]
+        created = [self._new_droplet(name, body) for name in names]
+        if 'names' in body:
+            return 202, {'droplets': [self._view(d) for d in created],
+                         'links': {'actions': [{'id': d['_action'], 'rel': 'create', 'href': ''}
+                                               for d in created]}}
+        return 202, {'droplet': self._view(created[0]),
+                     'links': {'actions': [{'id': created[0]['_action'], 'rel': 'create', 'href': ''}]}}
+
+    def _new_droplet(self, name, body):
+        droplet_id = next(self._ids)
+        action_id = next(self._ids)
+        now = time.monotonic()
+        droplet = {
+            'id': droplet_id,
+            'name': name,
+            'status': 'new',
+            'region': {'slug': body.get('region'), 'name': body.get('region')},
+            'size_slug': body.get('size'),
+            'image': {'slug': body.get('image')} if isinstance(body.get('image'), str)
+                     else {'id': body.get('image')},
+            'tags': list(body.get('tags') or []),
+            'networks': {'v4': [], 'v6': []},
+            '_created': now,
+            '_action': action_id,
+            '_ip': f"203.0.{(droplet_id >> 8) & 0xFF}.{droplet_id & 0xFF}",
+            '_errored': bool(self.create_error_rate) and self.random.random() < self.create_error_rate,
+        }
+        self.droplets[droplet_id] = droplet
+        self.actions[action_id] = {'id': action_id, 'type': 'create', 'resource_id': droplet_id,
+                                   'resource_type': 'droplet', '_created': now,
+                                   '_errored': droplet['_errored']}
+
+        match = CALLBACK_RE.search(body.get('user_data') or '')
+        if match and not droplet['_errored']:
+            delay = self.boot_time + self.cloud_init
+            threading.Timer(delay, self._phone_home, args=(match.group(1),)).start()
+        return droplet
+
+    def _phone_home(self, url):
+        try:
+            urllib.request.urlopen(urllib.request.Request(url, method='POST'), timeout=5).close()
+        except OSError:
+            pass
+
+    def _advance(self, droplet):
+        """Перевести droplet в состояние, соответствующее прошедшему времени"""
+        age = time.monotonic() - droplet['_created']
+        if droplet['status'] == 'new' and age >= self.boot_time and not droplet['_errored']:
+            droplet['status'] = 'active'
+        if droplet['status'] == 'active' and not droplet['networks']['v4'] \
+                and age >= self.boot_time + self.ip_delay:
+            droplet['networks']['v4'] = [
+                {'ip_address': droplet['_ip'], 'type': 'public', 'netmask': '255.255.240.0'},
+                {'ip_address': f"10.110.{(droplet['id'] >> 8) & 0xFF}.{droplet['id'] & 0xFF}",
+                 'type': 'private', 'netmask': '255.255.0.0'},
+            ]
+
+    def _view(self, droplet):
+        self._advance(droplet)
+        return {k: v for k, v in droplet.items() if not k.startswith('_')}
+
+    def _get_droplet(self, droplet_id, query, body):
+        droplet = self.droplets.get(droplet_id)
+        if droplet is None:
+            return 404, {'id': 'not_found', 'message': 'The resource you requested could not be found.'}
+        return 200, {'droplet': self._view(droplet)}
+
+    def _list_droplets(self, query, body):
+        droplets = list(self.droplets.values())
+        if 'tag_name' in query:
+            droplets = [d for d in droplets if query['tag_name'] in d['tags']]
+        if 'name' in query:
+            droplets = [d for d in droplets if d['name'] == query['name']]
+        return 200, self._page('droplets', [self._view(d) for d in droplets], query)
+
+    def _delete_droplet(self, droplet_id, query, body):
+        if self.droplets.pop(droplet_id, None) is None:
+            return 404, {'id': 'not_found', 'message': 'The resource you requested could not be found.'}
+        return 204, None
+
+    def _delete_by_tag(self, query, body):
+        tag = query.get('tag_name')
+        if not tag:
+            return 422, {'id': 'unprocessable_entity', 'message': 'tag_name is required'}
+        for droplet_id in [d['id'] for d in self.droplets.values() if tag in d['tags']]:
+            del self.droplets[droplet_id]
+        return 204, None
+
+    # --- actions
+
+    def _get_action(self, action_id, query, body):
+        action = self.actions.get(action_id)
+        if action is None:
+            return 404, {'id': 'not_found', 'message': 'The resource you requested could not be found.'}
+        done = time.monotonic() - action['_created'] >= self.boot_time
+        view = {k: v for k, v in action.items() if not k.startswith('_')}
+        if not done:
+            view['status'] = 'in-progress'
+        else:
+            view['status'] = 'errored' if action['_errored'] else 'completed'
+        return 200, {'action': view}
+
+    # --- snapshots
+
+    def add_snapshot(self, name, created_at, resource_type='droplet'):
+        """Добавить снимок (в имитации нет действия snapshot); вернуть его ID"""
+        with self._lock:
+            snapshot_id = next(self._ids)
+            self.snapshots[snapshot_id] = {
+                'id': str(snapshot_id),
+                'name': name,
+                'created_at': created_at,
+                'resource_type': resource_type,
+                'regions': ['fra1']
+            }
+        return snapshot_id
+
+    def _list_snapshots(self, query, body):
+        snapshots = list(self.snapshots.values())
+        if 'resource_type' in query:
+            snapshots = [s for s in snapshots if s['resource_type'] == query['resource_type']]
+        return 200, self._page('snapshots', snapshots, query)
+
+    def _delete_snapshot(self, snapshot_id, query, body):
+        if self.snapshots.pop(snapshot_id, None) is None:
+            return 404, {'id': 'not_found', 'message': 'The resource you requested could not be found.'}
+        return 204, None
+
+    # --- пагинация
+
+    def _page(self, key, items, query):
+        per_page = min(200, int(query.get('per_page', 20)))
+        page = int(query.get('page', 1))
+        chunk = items[(page - 1) * per_page:page * per_page]
+        links = {}
+        if page * per_page < len(items):
+            params = {k: v for k, v in query.items() if not k.startswith('_')}
+            params.update(page=page + 1, per_page=per_page)
+            links['pages'] = {'next': f"{self.base_url}{query['_path'][3:]}?{urlencode(params)}"}
+        return {key: chunk, 'links': links, 'meta': {'total': len(items)}}
+
+    # --- сводка
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+ROUTES = {
+    ('GET', '/v2/account/keys'): FakeDigitalOcean._list_keys,
+    ('POST', '/v2/account/keys'): FakeDigitalOcean._create_key,
+    ('GET', '/v2/account/keys/{id}'): FakeDigitalOcean._get_key,
+    ('GET', '/v2/account/keys/{fp}'): FakeDigitalOcean._get_key,
+    ('GET', '/v2/droplets'): FakeDigitalOcean._list_droplets,
+    ('POST', '/v2/droplets'): FakeDigitalOcean._create_droplet,
+    ('DELETE', '/v2/droplets'): FakeDigitalOcean._delete_by_tag,
+    ('GET', '/v2/droplets/{id}'): FakeDigitalOcean._get_droplet,
+    ('DELETE', '/v2/droplets/{id}'): FakeDigitalOcean._delete_droplet,
+    ('GET', '/v2/actions/{id}'): FakeDigitalOcean._get_action,
+    ('GET', '/v2/snapshots'): FakeDigitalOcean._list_snapshots,
+    ('DELETE', '/v2/snapshots/{id}'): FakeDigitalOcean._delete_snapshot,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная имитация DigitalOcean API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--boot-time', type=float, default=5.0)
+    parser.add_argument('--ip-delay', type=float, default=0.5)
+    parser.add_argument('--cloud-init', type=float, default=2.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=5000)
+    parser.add_argument('--create-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeDigitalOcean(args.latency, args.boot_time, args.ip_delay, args.cloud_init,
+                            args.error_rate, args.rate_limit,
+                            create_error_rate=args.create_error_rate)
+    url = fake.start(args.host, args.port)
+    print(f"🧪 Имитация DigitalOcean API: {url}")
+    print(f"   export DO_API_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Имитация ssh для тестов и бенчмарков без droplet
+
+Подставляется вместо OpenSSH через VPN_SSH_BIN:
+    VPN_SSH_BIN=./fake_ssh.py python3 manage_peers.py add --count 100
+
+Команды не выполняются: распознаются те, что отправляют скрипты (`wg set`,
+`wg syncconf`, `wg show wg0 dump`, echo, tar), и по ним ведется состояние
+WireGuard каждого хоста в FAKE_SSH_STATE_DIR/<ip>.json.
+
+Переменные окружения:
+    FAKE_SSH_LATENCY     задержка одной команды, секунды (по умолчанию 0.005)
+    FAKE_SSH_FAIL_RATE   доля команд, завершающихся ошибкой соединения (255)
+    FAKE_SSH_STATE_DIR   каталог состояния (по умолчанию /tmp/fake-ssh)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+from pathlib import Path
+
+LATENCY = float(os.environ.get('FAKE_SSH_LATENCY', '0.005'))
+FAIL_RATE = float(os.environ.get('FAKE_SSH_FAIL_RATE', '0'))
+STATE_DIR = Path(os.environ.get('FAKE_SSH_STATE_DIR', '/tmp/fake-ssh'))
+
+PEER_RE = re.compile(r'peer (\S+) (remove|allowed-ips (\S+))')
+
+
+def parse_args(argv):
+    """Вернуть (хост, команда или None, управляющая операция -O или None)"""
+    host, command, control = None, None, None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in ('-i', '-o', '-p', '-l', '-F'):
+            i += 2
+            continue
+        if arg == '-O':
+            control = argv[i + 1]
+            i += 2
+            continue
+        if host is None:
+            host = arg.split('@')[-1]
+        else:
+            command = ' '.join(argv[i:])
+            break
+        i += 1
+    return host, command, control
+
+
+def load_state(host):
+    path = STATE_DIR / f'{host}.json'
+    if path.exists():
+        return json.loads(path.read_text())
+    return {'peers': {}}
+
+
+def save_state(host, state):
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    path = STATE_DIR / f'{host}.json'
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def parse_peer_sections(text):
+    """{публичный ключ: allowed-ips} из секций [Peer]"""
+    peers, key = {}, None
+    for line in text.splitlines():
+        name, _, value = line.partition('=')
+        name, value = name.strip(), value.strip()
+        if name == 'PublicKey':
+            key = value
+            peers[key] = ''
+        elif name == 'AllowedIPs' and key:
+            peers[key] = value
+    return peers
+
+
+def execute(host, command, stdin):
+    """Выполнить распознанную команду; вернуть (код, stdout)"""
+    if command.startswith('echo '):
+        return 0, command[5:].strip('\'"') + "\n"
+    if command.startswith('tar '):
+        return 0, ""
+
+    state = load_state(host)
+    if 'wg syncconf' in command:
+        state['peers'] = parse_peer_sections(stdin)
+        save_state(host, state)
+        return 0, ""
+    if 'wg set wg0' in command:
+        for key, op, allowed in PEER_RE.findall(command):
+            if op == 'remove':
+                state['peers'].pop(key, None)
+            else:
+                state['peers'][key] = allowed
+        save_state(host, state)
+        return 0, ""
+    if command.strip() == 'wg show wg0 dump':
+        lines = ["PRIVATE\tPUBLIC\t51820\toff"]
+        for key, allowed in state['peers'].items():
+            lines.append(f"{key}\t(none)\t(none)\t{allowed}\t0\t0\t0\toff")
+        return 0, "\n".join(lines) + "\n"
+    return 0, ""
+
+
+def main():
+    host, command, control = parse_args(sys.argv[1:])
+    if control is not None:
+        # Master соединение "всегда живо"
+        return 0
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        sys.stderr.write(f"ssh: connect to host {host} port 22: Connection refused\n")
+        return 255
+    # stdin читается только скриптами, которые его ждут (`cat >> ...`):
+    # без input subprocess наследует stdin вызывающего процесса
+    stdin = sys.stdin.read() if command and 'cat >' in command else ""
+    time.sleep(LATENCY)
+    code, output = execute(host, command or "", stdin)
+    sys.stdout.write(output)
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
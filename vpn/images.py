@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Реестр заранее собранных снимков (snapshot) для быстрой загрузки серверов
+
+build_image.py один раз устанавливает пакеты на временный droplet, делает
+снимок и записывает его ID в images.json. create_droplet загружается с этого
+снимка и выполняет только настройку узла. Снимок считается устаревшим, если
+он старше MAX_IMAGE_AGE_DAYS или изменился скрипт установки пакетов.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+IMAGES_FILE = Path('images.json')
+MAX_IMAGE_AGE_DAYS = int(os.environ.get('VPN_IMAGE_MAX_AGE_DAYS', '14'))
+
+# Отключить снимки и всегда ставить пакеты при загрузке: VPN_USE_IMAGES=0
+USE_IMAGES = os.environ.get('VPN_USE_IMAGES', '1') != '0'
+
+_lock = threading.Lock()
+_warned = set()
+
+
+def recipe_hash(install_script):
+    """Хэш скрипта установки: снимок собран по этому рецепту"""
+    return hashlib.sha256(install_script.encode()).hexdigest()[:16]
+
+
+def load_images():
+    if not IMAGES_FILE.exists():
+        return {}
+    with open(IMAGES_FILE, 'r') as f:
+        return json.load(f)
+
+
+def save_image(protocol, record):
+    """Записать снимок протокола в реестр"""
+    with _lock:
+        registry = load_images()
+        registry[protocol] = record
+        tmp = IMAGES_FILE.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp, IMAGES_FILE)
+
+
+def staleness(record, install_script):
+    """Причина устаревания снимка или None, если он актуален"""
+    if record.get('recipe') != recipe_hash(install_script):
+        return "изменился скрипт установки"
+    created = datetime.fromisoformat(record['created_at'])
+    age = datetime.now(timezone.utc) - created
+    if age.days >= MAX_IMAGE_AGE_DAYS:
+        return f"возраст {age.days} дн. (лимит {MAX_IMAGE_AGE_DAYS})"
+    return None
+
+
+def resolve_image(protocol, region, install_script, base_image='ubuntu-22-04-x64'):
+    """Выбрать образ для droplet; вернуть (image, baked)
+
+    baked=True означает, что пакеты уже установлены в снимке и user_data
+    может пропустить установку.
+    """
+    if not USE_IMAGES:
+        return base_image, False
+
+    record = load_images().get(protocol)
+    if not record:
+        return base_image, False
+
+    reason = staleness(record, install_script)
+    if reason is None and record.get('base_image') != base_image:
+        reason = f"собран на {record.get('base_image')}"
+    if reason is None and region not in record.get('regions', []):
+        reason = f"нет в регионе {region}"
+
+    if reason:
+        with _lock:
+            if (protocol, reason) not in _warned:
+                _warned.add((protocol, reason))
+                print(f"⚠️  Снимок {protocol} не используется: {reason}")
+                print(f"   Пересобрать: python3 build_image.py --protocol {protocol}")
+        return base_image, False
+
+    return record['snapshot_id'], True
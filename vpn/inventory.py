@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Локальный инвентарь развернутых серверов (SQLite)
+
+Все скрипты развертывания и удаления записывают сюда каждый droplet:
+запись создается сразу после создания droplet (чтобы он не потерялся при
+сбое) и дополняется IP и путем к конфигурации. Индексы по имени, региону,
+протоколу и тегам; WAL и busy_timeout позволяют писать из нескольких
+потоков и процессов одновременно.
+
+Старые файлы vpn_info.json, openvpn_info.json и fleet_inventory.json
+импортируются один раз при открытии и переименовываются в *.imported:
+источник записей один, удаленная запись из старого файла не вернется.
+
+    python3 inventory.py list --protocol wireguard --region fra1
+    python3 inventory.py list --tag vpn-fleet
+    python3 inventory.py show vpn-server
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+DB_FILE = Path(os.environ.get('VPN_INVENTORY', 'vpn_inventory.db'))
+
+# Файлы, которые писали скрипты до появления инвентаря: (файл, протокол по умолчанию)
+LEGACY_FILES = [
+    (Path('vpn_info.json'), 'wireguard'),
+    (Path('openvpn_info.json'), 'openvpn'),
+    (Path('fleet_inventory.json'), None),
+]
+
+COLUMNS = ('droplet_id', 'name', 'protocol', 'region', 'size', 'ip', 'status',
+           'config_file', 'created')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    droplet_id  INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    protocol    TEXT NOT NULL,
+    region      TEXT,
+    size        TEXT,
+    ip          TEXT,
+    status      TEXT NOT NULL DEFAULT 'creating',
+    config_file TEXT,
+    created     REAL NOT NULL,
+    extra       TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS nodes_name ON nodes(name);
+CREATE INDEX IF NOT EXISTS nodes_region ON nodes(region);
+CREATE INDEX IF NOT EXISTS nodes_protocol ON nodes(protocol);
+CREATE TABLE IF NOT EXISTS tags (
+    droplet_id  INTEGER NOT NULL REFERENCES nodes(droplet_id) ON DELETE CASCADE,
+    tag         TEXT NOT NULL,
+    PRIMARY KEY (tag, droplet_id)
+);
+CREATE INDEX IF NOT EXISTS tags_droplet ON tags(droplet_id);
+CREATE TABLE IF NOT EXISTS imported (
+    path        TEXT PRIMARY KEY,
+    mtime       REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def connect():
+    """Соединение текущего потока (sqlite3 не разделяет соединения между потоками)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != DB_FILE:
+        conn = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.path = conn, DB_FILE
+        import_legacy(conn)
+    return conn
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT: запись сразу берет блокировку, без дедлоков WAL"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# Теги собираются тем же запросом, без отдельного запроса на каждую запись
+SELECT = """SELECT nodes.*, (SELECT group_concat(tag, ' ') FROM tags
+                             WHERE tags.droplet_id = nodes.droplet_id) AS tag_list
+            FROM nodes"""
+
+
+def _row(row):
+    record = {column: row[column] for column in COLUMNS}
+    record.update(json.loads(row['extra']))
+    record['tags'] = sorted(row['tag_list'].split()) if row['tag_list'] else []
+    return record
+
+
+def _upsert(conn, record, protocol=None):
+    fields = {column: record.get(column) for column in COLUMNS}
+    extra = {k: v for k, v in record.items() if k not in COLUMNS and k != 'tags'}
+
+    # Обновление сохраняет уже известные поля, если в новой записи их нет
+    existing = conn.execute("SELECT * FROM nodes WHERE droplet_id = ?",
+                            (fields['droplet_id'],)).fetchone()
+    if existing is not None:
+        for column in COLUMNS:
+            if fields[column] is None:
+                fields[column] = existing[column]
+        extra = dict(json.loads(existing['extra']), **extra)
+    fields['protocol'] = fields['protocol'] or protocol
+    fields['created'] = fields['created'] or time.time()
+    if record.get('status') is None and (fields['status'] in (None, 'creating')):
+        fields['status'] = 'active' if fields['ip'] else 'creating'
+
+    # UPSERT, а не INSERT OR REPLACE: REPLACE удаляет строку и каскадом ее теги
+    conn.execute(
+        f"INSERT INTO nodes ({', '.join(COLUMNS)}, extra) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))}, ?) "
+        f"ON CONFLICT(droplet_id) DO UPDATE SET "
+        + ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:] + ('extra',)),
+        [fields[column] for column in COLUMNS] + [json.dumps(extra)]
+    )
+    if 'tags' in record:
+        conn.execute("DELETE FROM tags WHERE droplet_id = ?", (fields['droplet_id'],))
+        conn.executemany("INSERT INTO tags (droplet_id, tag) VALUES (?, ?)",
+                         [(fields['droplet_id'], tag) for tag in record['tags']])
+
+
+def import_legacy(conn):
+    """Импортировать JSON файлы прежних версий скриптов и переименовать их в *.imported
+
+    Если переименовать нельзя, файл повторно импортируется только после изменения.
+    """
+    for path, protocol in LEGACY_FILES:
+        if not path.exists():
+            continue
+        mtime = path.stat().st_mtime
+        row = conn.execute("SELECT mtime FROM imported WHERE path = ?",
+                           (str(path.resolve()),)).fetchone()
+        if row is not None and row['mtime'] >= mtime:
+            continue
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if 'nodes' in data:
+            records, protocol = data['nodes'], data.get('protocol', protocol)
+        else:
+            records = [data]
+        with _transaction(conn):
+            for record in records:
+                if record.get('droplet_id'):
+                    _upsert(conn, dict(record, imported_from=path.name), protocol)
+            conn.execute("INSERT OR REPLACE INTO imported (path, mtime) VALUES (?, ?)",
+                         (str(path.resolve()), mtime))
+        try:
+            os.replace(path, path.with_name(path.name + '.imported'))
+        except OSError:
+            pass
+
+
+def add(record, protocol=None):
+    """Добавить или обновить запись droplet (ключ - droplet_id)"""
+    conn = connect()
+    with _transaction(conn):
+        _upsert(conn, record, protocol)
+
+
+def remove(droplet_id):
+    conn = connect()
+    with _transaction(conn):
+        conn.execute("DELETE FROM nodes WHERE droplet_id = ?", (droplet_id,))
+
+
+def get(droplet_id):
+    row = connect().execute(f"{SELECT} WHERE droplet_id = ?", (droplet_id,)).fetchone()
+    return None if row is None else _row(row)
+
+
+def find(protocol=None, region=None, name=None, tag=None, status=None):
+    """Записи по условиям (все условия через AND), новые первыми"""
+    where, params = [], []
+    for column, value in (('protocol', protocol), ('region', region), ('name', name),
+                          ('status', status)):
+        if value is not None:
+            where.append(f"nodes.{column} = ?")
+            params.append(value)
+    if tag is not None:
+        where.append("nodes.droplet_id IN (SELECT droplet_id FROM tags WHERE tag = ?)")
+        params.append(tag)
+    query = SELECT
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY created DESC"
+    return [_row(row) for row in connect().execute(query, params)]
+
+
+def resolve(target, protocol=None):
+    """Записи по droplet ID или имени"""
+    if str(target).isdigit():
+        record = get(int(target))
+        return [record] if record and protocol in (None, record['protocol']) else []
+    return find(protocol=protocol, name=target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Инвентарь VPN серверов")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    listing = commands.add_parser('list', help="список серверов")
+    listing.add_argument('--protocol', choices=['wireguard', 'openvpn'])
+    listing.add_argument('--region')
+    listing.add_argument('--name')
+    listing.add_argument('--tag')
+    listing.add_argument('--json', action='store_true', help="вывод в JSON")
+
+    show = commands.add_parser('show', help="запись сервера по ID или имени")
+    show.add_argument('target')
+
+    commands.add_parser('import', help="импортировать старые JSON файлы")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        connect()
+        print(f"✅ Записей в {DB_FILE}: {len(find())}")
+    elif args.command == 'show':
+        for record in resolve(args.target):
+            print(json.dumps(record, indent=2, ensure_ascii=False))
+    else:
+        records = find(args.protocol, args.region, args.name, args.tag)
+        if args.json:
+            print(json.dumps(records, indent=2, ensure_ascii=False))
+            return
+        for r in records:
+            print(f"{r['droplet_id']:<11} {r['name']:<28} {r['protocol']:<9} {r['region'] or '':<6} "
+                  f"{r['ip'] or '':<16} {r['status']:<9} {','.join(r['tags'])}")
+        print(f"\nВсего: {len(records)}")
+
+if __name__ == '__main__':
+    main()
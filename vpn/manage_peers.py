@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Скрипт для управления пирами WireGuard сервера
+
+Пиры добавляются и отзываются на работающем сервере через `wg set`:
+адреса выделяются из подсети сервера, изменения сохраняются в wg0.conf,
+а подключенные клиенты не замечают изменений. `sync` заново применяет все
+локальное состояние одним `wg syncconf`, тоже без перезапуска wg-quick@wg0.
+
+Пример:
+    python3 manage_peers.py add --count 1000 --prefix user
+    python3 manage_peers.py revoke user-0002 user-0003
+    python3 manage_peers.py list --live
+    python3 manage_peers.py config user-0001 > user-0001.conf
+    python3 manage_peers.py sync --server vpn-server
+"""
+
+import sys
+import time
+import argparse
+
+import deploy_vpn
+import wg_peers
+import inventory
+from ssh_session import get_session
+
+def load_state(server):
+    """Загрузить состояние сервера; без имени - единственный известный сервер"""
+    names = wg_peers.list_states()
+    if server is None:
+        if len(names) != 1:
+            print("❌ Укажите сервер через --server" if names else
+                  "❌ Нет серверов: сначала запустите deploy_vpn.py")
+            if names:
+                print(f"   Известные серверы: {', '.join(names)}")
+            sys.exit(1)
+        server = names[0]
+    if server not in names:
+        print(f"❌ Нет состояния для сервера {server} в {wg_peers.STATE_DIR}/")
+        sys.exit(1)
+    return wg_peers.PeerState.load(server)
+
+def server_session(state):
+    return get_session(state.data['ip'], deploy_vpn.SSH_KEY_PATH)
+
+def check_result(state, result):
+    if result.returncode != 0:
+        print(f"❌ Ошибка применения на {state.name}: {result.stderr.strip()}")
+        print(f"   Локальное состояние сохранено, повторите: python3 manage_peers.py sync --server {state.name}")
+        sys.exit(1)
+
+def push(state):
+    """Применить всех пиров на сервере одним запросом"""
+    started = time.monotonic()
+    result = wg_peers.sync_peers(server_session(state), state)
+    elapsed = time.monotonic() - started
+    check_result(state, result)
+    print(f"✅ {len(state.peers)} пиров применено на {state.name} за {elapsed:.2f}s (без перезапуска)")
+
+def apply(state, added=(), removed=()):
+    """Применить добавленных и отозванных пиров через `wg set`"""
+    started = time.monotonic()
+    result = wg_peers.apply_changes(server_session(state), state, added, removed)
+    elapsed = time.monotonic() - started
+    check_result(state, result)
+    print(f"✅ {state.name}: +{len(added)} -{len(removed)} пиров за {elapsed * 1000:.0f} мс (без перезапуска)")
+
+def cmd_add(args):
+    state = load_state(args.server)
+    # autoscale.py выводит такой сервер из парка: новые клиенты на нем не нужны
+    draining = [r for r in inventory.find(name=state.name, protocol='wireguard')
+                if r['status'] == 'draining']
+    if draining:
+        print(f"❌ {state.name} выводится из работы (draining), выберите другой сервер")
+        sys.exit(1)
+    started = time.monotonic()
+    width = len(str(args.start + args.count - 1))
+    added = []
+    for i in range(args.start, args.start + args.count):
+        name = f"{args.prefix}-{i:0{max(4, width)}d}"
+        if name in state.peers:
+            continue
+        state.add_peer(name)
+        added.append(name)
+    state.save()
+    print(f"🔑 {len(added)} пиров создано за {time.monotonic() - started:.2f}s "
+          f"(занято адресов {state.allocator.used}/{state.allocator.size} в {state.data['subnet']})")
+    if added:
+        apply(state, added=added)
+
+def cmd_sync(args):
+    push(load_state(args.server))
+
+def cmd_revoke(args):
+    state = load_state(args.server)
+    missing = [name for name in args.peers if name not in state.peers]
+    if missing:
+        print(f"❌ Пиры не найдены: {', '.join(missing)}")
+        sys.exit(1)
+    removed = [state.remove_peer(name) for name in args.peers]
+    state.save()
+    apply(state, removed=removed)
+
+def cmd_list(args):
+    state = load_state(args.server)
+    live = None
+    if args.live:
+        live = wg_peers.live_peers(server_session(state))
+        if live is None:
+            print(f"⚠️  Не удалось получить `wg show` с {state.name}, показано локальное состояние")
+    now = time.time()
+    for name, peer in state.peers.items():
+        line = f"{name:<24} {peer['address']:<16} {peer['public_key']}"
+        if live is not None:
+            status = live.get(peer['public_key'])
+            if status is None:
+                line += "  нет на сервере"
+            elif status['latest_handshake']:
+                line += (f"  handshake {int(now - status['latest_handshake'])}s назад"
+                         f"  rx {status['rx_bytes']} tx {status['tx_bytes']}")
+            else:
+                line += "  не подключался"
+        print(line)
+    print(f"\nВсего: {len(state.peers)} пиров в {state.data['subnet']}")
+    if live is not None:
+        known = {peer['public_key'] for peer in state.peers.values()}
+        unknown = len(set(live) - known)
+        if unknown:
+            print(f"⚠️  На сервере {unknown} пиров, которых нет в локальном состоянии "
+                  f"(python3 manage_peers.py sync --server {state.name})")
+
+def cmd_config(args):
+    state = load_state(args.server)
+    if args.peer not in state.peers:
+        print(f"❌ Пир {args.peer} не найден", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(deploy_vpn.render_client_config(state, args.peer))
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--server', help="имя сервера (droplet)")
+
+    parser = argparse.ArgumentParser(description="Управление пирами WireGuard")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', parents=[common], help="добавить пиров на работающем сервере")
+    add.add_argument('--count', type=int, default=1)
+    add.add_argument('--prefix', default='peer')
+    add.add_argument('--start', type=int, default=1, help="номер первого пира")
+    add.set_defaults(func=cmd_add)
+
+    sync = commands.add_parser('sync', parents=[common], help="применить локальное состояние на сервере")
+    sync.set_defaults(func=cmd_sync)
+
+    revoke = commands.add_parser('revoke', parents=[common], help="отозвать пиров на работающем сервере")
+    revoke.add_argument('peers', nargs='+')
+    revoke.set_defaults(func=cmd_revoke)
+
+    peers = commands.add_parser('list', parents=[common], help="список пиров")
+    peers.add_argument('--live', action='store_true', help="состояние пиров на сервере (`wg show`)")
+    peers.set_defaults(func=cmd_list)
+
+    config = commands.add_parser('config', parents=[common], help="вывести конфигурацию пира")
+    config.add_argument('peer')
+    config.set_defaults(func=cmd_config)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
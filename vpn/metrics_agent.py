@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Агент метрик VPN узла
+
+Устанавливается через user_data (metrics_collector.install_snippet) и
+работает как сервис vpn-metrics-agent. Раз в INTERVAL секунд снимает
+счетчики туннеля (пиры, активные пиры, байты), загрузку CPU, softirq
+NET_RX и потери UDP и отправляет их одним UDP пакетом на сборщик
+оператора (metrics_collector.py). SSH для сбора метрик не нужен.
+
+Пакет - кадр с дельта-кодированием: раз в KEYFRAME_EVERY отсчетов
+отправляется ключевой кадр с абсолютными значениями, остальные кадры
+несут разности с последним ключевым (zigzag varint, 40-80 байт). Потеря
+пакета не ломает следующие кадры; после перезапуска сборщика данные
+узла появляются со следующим ключевым кадром. Кадр подписан HMAC-SHA256
+(8 байт) общим ключом парка.
+
+Пиры считаются инкрементально (peer_status.py): между отсчетами хранится
+состояние пиров, файлы статуса OpenVPN дочитываются со смещения.
+
+Только стандартная библиотека: модуль копируется на droplet как есть,
+вместе с peer_status.py.
+
+    python3 metrics_agent.py --collector 203.0.113.7:8790 --name vpn-fra1-1 --protocol wireguard
+"""
+
+import os
+import glob
+import hmac
+import time
+import socket
+import hashlib
+import argparse
+import subprocess
+
+import peer_status
+
+MAGIC = b'VM1'
+KEYFRAME = 0
+DELTA = 1
+TAG_SIZE = 8
+INTERVAL = 10
+KEYFRAME_EVERY = 12
+KEY_FILE = '/etc/vpn-metrics.key'
+
+# Порядок полей в кадре; новые поля добавляются только в конец
+FIELDS = (
+    'peers', 'active_peers', 'rx_bytes', 'tx_bytes',
+    'cpu_busy', 'cpu_total', 'softirq_net_rx',
+    'udp_in_errors', 'udp_rcvbuf_errors', 'udp_sndbuf_errors', 'softnet_dropped',
+)
+
+# Состояние пиров между отсчетами
+WG_PEERS = peer_status.WgDump()
+OPENVPN_FILES = {}
+
+
+class FrameError(ValueError):
+    """Поврежденный, чужой или неподписанный кадр"""
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise FrameError("обрезанный varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value // 2 if not value & 1 else -(value + 1) // 2
+
+
+def encode(key, name, seq, timestamp, values, base=None, base_seq=None):
+    """Кадр отсчета: ключевой (base=None) или разность с ключевым base"""
+    kind = KEYFRAME if base is None else DELTA
+    numbers = values if base is None else [v - b for v, b in zip(values, base)]
+    name = name.encode()
+    body = bytearray(MAGIC)
+    body.append(kind)
+    body += _varint(len(name)) + name
+    body += _varint(seq) + _varint(int(timestamp)) + _varint(seq if base_seq is None else base_seq)
+    body += _varint(len(numbers))
+    for number in numbers:
+        body += _varint(_zigzag(number))
+    return bytes(body) + hmac.new(key, bytes(body), hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def decode(key, frame):
+    """Разобрать кадр: (вид, имя, seq, время, seq ключевого кадра, значения)"""
+    body, tag = frame[:-TAG_SIZE], frame[-TAG_SIZE:]
+    if not body.startswith(MAGIC) or len(body) < len(MAGIC) + 1:
+        raise FrameError("не кадр метрик")
+    if not hmac.compare_digest(tag, hmac.new(key, body, hashlib.sha256).digest()[:TAG_SIZE]):
+        raise FrameError("неверная подпись")
+    kind = body[len(MAGIC)]
+    pos = len(MAGIC) + 1
+    length, pos = _read_varint(body, pos)
+    name = body[pos:pos + length].decode()
+    pos += length
+    seq, pos = _read_varint(body, pos)
+    timestamp, pos = _read_varint(body, pos)
+    base_seq, pos = _read_varint(body, pos)
+    count, pos = _read_varint(body, pos)
+    numbers = []
+    for _ in range(count):
+        number, pos = _read_varint(body, pos)
+        numbers.append(_unzigzag(number))
+    return kind, name, seq, timestamp, base_seq, numbers
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def tunnel_counters(protocol, now):
+    """(пиры, активные пиры, rx, tx) туннельных интерфейсов"""
+    rx = tx = 0
+    for iface in glob.glob('/sys/class/net/wg*') + glob.glob('/sys/class/net/tun*'):
+        rx += int(_read(f'{iface}/statistics/rx_bytes') or 0)
+        tx += int(_read(f'{iface}/statistics/tx_bytes') or 0)
+
+    peers = active = 0
+    if protocol == 'wireguard':
+        try:
+            dump = subprocess.run(['wg', 'show', 'all', 'dump'], capture_output=True, text=True,
+                                  timeout=5).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            dump = ''
+        WG_PEERS.update(dump)
+        peers = len(WG_PEERS.table)
+        active = WG_PEERS.table.active(now)
+    else:
+        # Клиенты из CLIENT LIST всех экземпляров; keepalive 10 120 отключает
+        # молчащих клиентов, поэтому подключенный клиент считается активным
+        for path in glob.glob('/etc/openvpn/openvpn-status*.log'):
+            status = OPENVPN_FILES.setdefault(path, peer_status.OpenVPNStatus(path))
+            status.poll()
+            peers += len(status.table)
+        active = peers
+    return peers, active, rx, tx
+
+
+def system_counters():
+    """(cpu busy, cpu total в jiffies, softirq NET_RX, UDP InErrors, RcvbufErrors,
+    SndbufErrors, отброшено softnet)"""
+    cpu = [int(v) for v in _read('/proc/stat').split('\n', 1)[0].split()[1:9]]
+    total = sum(cpu)
+    busy = total - cpu[3] - cpu[4]
+
+    net_rx = 0
+    for line in _read('/proc/softirqs').splitlines():
+        if line.strip().startswith('NET_RX:'):
+            net_rx = sum(int(v) for v in line.split()[1:])
+
+    udp = [line.split()[1:] for line in _read('/proc/net/snmp').splitlines() if line.startswith('Udp:')]
+    stats = dict(zip(udp[0], map(int, udp[1]))) if len(udp) == 2 else {}
+
+    dropped = sum(int(line.split()[1], 16) for line in _read('/proc/net/softnet_stat').splitlines()
+                  if line.strip())
+    return (busy, total, net_rx, stats.get('InErrors', 0), stats.get('RcvbufErrors', 0),
+            stats.get('SndbufErrors', 0), dropped)
+
+
+def sample(protocol):
+    now = int(time.time())
+    return now, list(tunnel_counters(protocol, now) + system_counters())
+
+
+def run(collector, name, protocol, key, interval=INTERVAL):
+    host, _, port = collector.rpartition(':')
+    address = (host, int(port))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    seq = 0
+    base = base_seq = None
+    while True:
+        started = time.monotonic()
+        timestamp, values = sample(protocol)
+        if seq % KEYFRAME_EVERY == 0:
+            frame = encode(key, name, seq, timestamp, values)
+            base, base_seq = values, seq
+        else:
+            frame = encode(key, name, seq, timestamp, values, base, base_seq)
+        try:
+            sock.sendto(frame, address)
+        except OSError:
+            pass
+        seq += 1
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агент метрик VPN узла")
+    parser.add_argument('--collector', required=True, help="адрес сборщика host:port")
+    parser.add_argument('--name', required=True)
+    parser.add_argument('--protocol', choices=('wireguard', 'openvpn'), required=True)
+    parser.add_argument('--key-file', default=KEY_FILE)
+    parser.add_argument('--interval', type=float, default=INTERVAL)
+    args = parser.parse_args()
+
+    with open(args.key_file, 'rb') as f:
+        key = bytes.fromhex(f.read().decode().strip())
+    os.nice(10)
+    run(args.collector, args.name, args.protocol, key, args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Сборщик метрик парка от агентов узлов (metrics_agent.py)
+
+Агенты сами отправляют UDP кадры на адрес VPN_METRICS_ADDR: сборщик не
+опрашивает узлы, один поток разбирает кадры сотен узлов. По двум
+последним отсчетам узла считаются скорости (трафик, загрузка CPU, потери
+UDP), последние отсчеты отдаются в формате node_metrics (autoscale.py
+--listen) и могут дописываться в autoscale_metrics.jsonl.
+
+Агент ставится из user_data, если задан VPN_METRICS_ADDR; кадры подписаны
+ключом парка из ~/.cache/vpn-do/metrics.key (создается при первом
+развертывании).
+
+Переменные окружения:
+    VPN_METRICS_ADDR   публичный адрес сборщика для агентов, например 203.0.113.7:8790
+    VPN_METRICS_BIND   адрес для прослушивания (по умолчанию 0.0.0.0:<порт из адреса>)
+
+    python3 metrics_collector.py
+    python3 metrics_collector.py --record --report 30
+"""
+
+import os
+import time
+import socket
+import secrets
+import argparse
+import threading
+from pathlib import Path
+
+import metrics_agent
+import peer_status
+import inventory
+
+METRICS_ADDR = os.environ.get('VPN_METRICS_ADDR')
+METRICS_BIND = os.environ.get('VPN_METRICS_BIND')
+DEFAULT_PORT = 8790
+KEY_FILE = Path.home() / ".cache" / "vpn-do" / "metrics.key"
+STALE_AFTER = 3 * metrics_agent.INTERVAL   # секунды без кадров до пропажи узла
+
+AGENT_SERVICE = """[Unit]
+Description=VPN metrics agent
+After=network-online.target
+
+[Service]
+ExecStart=/usr/bin/python3 /usr/local/lib/vpn-metrics/metrics_agent.py --collector {addr} --name {name} --protocol {protocol}
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+
+def metrics_key():
+    """Ключ подписи кадров парка (создается при первом вызове)"""
+    if not KEY_FILE.exists():
+        KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        KEY_FILE.write_text(secrets.token_hex(32))
+        KEY_FILE.chmod(0o600)
+    return bytes.fromhex(KEY_FILE.read_text().strip())
+
+
+def install_snippet(name, protocol, addr=None):
+    """Фрагмент user_data: агент как systemd сервис (пусто, если сборщик не задан)"""
+    addr = addr or METRICS_ADDR
+    if not addr:
+        return ""
+    modules = "".join(
+        f"cat > /usr/local/lib/vpn-metrics/{Path(module.__file__).name} <<'AGENT_EOF'\n"
+        f"{Path(module.__file__).read_text()}AGENT_EOF\n"
+        for module in (metrics_agent, peer_status)
+    )
+    return (
+        "\n# Агент метрик (metrics_agent.py, peer_status.py)\n"
+        f"echo {metrics_key().hex()} > {metrics_agent.KEY_FILE}\n"
+        f"chmod 600 {metrics_agent.KEY_FILE}\n"
+        "mkdir -p /usr/local/lib/vpn-metrics\n"
+        f"{modules}"
+        "cat > /etc/systemd/system/vpn-metrics-agent.service <<'AGENT_EOF'\n"
+        f"{AGENT_SERVICE.format(addr=addr, name=name, protocol=protocol)}AGENT_EOF\n"
+        "systemctl daemon-reload\n"
+        "systemctl enable --now vpn-metrics-agent.service\n"
+    )
+
+
+class NodeStream:
+    """Ключевой кадр и два последних отсчета одного узла"""
+
+    def __init__(self):
+        self.base_seq = None
+        self.base = None
+        self.last = None
+        self.previous = None
+        self.seq = None
+
+    def add(self, kind, seq, timestamp, base_seq, numbers):
+        """Применить кадр; False, если он относится к неизвестному ключевому кадру"""
+        if kind == metrics_agent.KEYFRAME:
+            self.base_seq, self.base = seq, numbers
+            values = numbers
+        elif base_seq == self.base_seq and self.base is not None:
+            values = [b + d for b, d in zip(self.base, numbers)]
+        else:
+            return False
+        if self.seq is not None and seq <= self.seq and kind != metrics_agent.KEYFRAME:
+            return True   # повтор или опоздавший кадр
+        self.seq = seq
+        self.previous, self.last = self.last, (timestamp, dict(zip(metrics_agent.FIELDS, values)))
+        return True
+
+    def sample(self, name):
+        """Отсчет в формате node_metrics со скоростями по двум последним кадрам"""
+        timestamp, values = self.last
+        sample = dict(values, name=name, time=timestamp)
+        if self.previous is not None and timestamp > self.previous[0]:
+            before = self.previous[1]
+            elapsed = timestamp - self.previous[0]
+            cpu = values['cpu_total'] - before['cpu_total']
+            sample['bps'] = max(0, values['rx_bytes'] + values['tx_bytes']
+                                - before['rx_bytes'] - before['tx_bytes']) / elapsed
+            sample['cpu'] = (values['cpu_busy'] - before['cpu_busy']) / cpu if cpu > 0 else 0.0
+            sample['udp_drops'] = max(0, values['udp_rcvbuf_errors'] + values['softnet_dropped']
+                                      - before['udp_rcvbuf_errors'] - before['softnet_dropped']) / elapsed
+        return sample
+
+
+class Collector:
+    """UDP приемник кадров агентов"""
+
+    def __init__(self, bind=None, key=None):
+        port = METRICS_ADDR.rpartition(':')[2] if METRICS_ADDR else DEFAULT_PORT
+        host, _, port = (bind or METRICS_BIND or f"0.0.0.0:{port}").rpartition(':')
+        self.key = key or metrics_key()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((host or '0.0.0.0', int(port)))
+        self.address = self.sock.getsockname()
+        self._lock = threading.Lock()
+        self.streams = {}
+        self.received = {}
+        # Счетчики кадров: принято, байт, отклонено (подпись/формат), без ключевого кадра
+        self.frames = self.bytes = self.rejected = self.orphaned = 0
+        threading.Thread(target=self._run, daemon=True, name='metrics-collector').start()
+
+    def _run(self):
+        while True:
+            try:
+                frame, _ = self.sock.recvfrom(2048)
+            except OSError:
+                return
+            try:
+                kind, name, seq, timestamp, base_seq, numbers = metrics_agent.decode(self.key, frame)
+            except (metrics_agent.FrameError, ValueError):
+                self.rejected += 1
+                continue
+            with self._lock:
+                self.frames += 1
+                self.bytes += len(frame)
+                stream = self.streams.setdefault(name, NodeStream())
+                if stream.add(kind, seq, timestamp, base_seq, numbers):
+                    self.received[name] = time.monotonic()
+                else:
+                    self.orphaned += 1
+
+    def samples(self, records=None):
+        """Свежие отсчеты узлов; с records - только узлы инвентаря, с droplet_id"""
+        cutoff = time.monotonic() - STALE_AFTER
+        with self._lock:
+            fresh = {name: stream.sample(name) for name, stream in self.streams.items()
+                     if stream.last is not None and self.received.get(name, 0) >= cutoff}
+        if records is None:
+            return list(fresh.values())
+        samples = []
+        for record in records:
+            sample = fresh.get(record['name'])
+            if sample is not None:
+                samples.append(dict(sample, droplet_id=record['droplet_id'],
+                                    region=record['region'], size=record['size']))
+        return samples
+
+    def close(self):
+        self.sock.close()
+
+
+def report(collector, samples):
+    print(f"\n[{time.strftime('%H:%M:%S')}] узлов {len(samples)}, кадров {collector.frames} "
+          f"({collector.bytes / max(1, collector.frames):.0f} байт/кадр), отклонено {collector.rejected}, "
+          f"без ключевого кадра {collector.orphaned}")
+    print(f"{'Имя':<28} {'пиры':>6} {'активные':>9} {'Мбит/с':>8} {'CPU':>5} {'потери/с':>9}")
+    for sample in sorted(samples, key=lambda s: s['name']):
+        print(f"{sample['name']:<28} {sample['peers']:>6} {sample['active_peers']:>9} "
+              f"{sample.get('bps', 0) * 8 / 1e6:>8.1f} {sample.get('cpu', 0):>5.0%} "
+              f"{sample.get('udp_drops', 0):>9.1f}")
+    if samples:
+        print(f"{'Всего':<28} {sum(s['peers'] for s in samples):>6} "
+              f"{sum(s['active_peers'] for s in samples):>9} "
+              f"{sum(s.get('bps', 0) for s in samples) * 8 / 1e6:>8.1f}")
+
+
+def main():
+    # node_metrics импортирует скрипты развертывания, а они - этот модуль
+    import node_metrics
+
+    parser = argparse.ArgumentParser(description="Сборщик метрик агентов VPN узлов")
+    parser.add_argument('--bind', help="адрес для прослушивания host:port")
+    parser.add_argument('--report', type=float, default=metrics_agent.INTERVAL,
+                        help="секунды между сводками")
+    parser.add_argument('--record', action='store_true',
+                        help=f"дописывать отсчеты в {node_metrics.METRICS_FILE}")
+    args = parser.parse_args()
+
+    collector = Collector(args.bind)
+    print(f"📡 Сборщик метрик слушает {collector.address[0]}:{collector.address[1]}/udp")
+    if not METRICS_ADDR:
+        print("⚠️  VPN_METRICS_ADDR не задан: новые узлы будут развернуты без агента")
+    while True:
+        time.sleep(args.report)
+        samples = collector.samples()
+        if args.record:
+            # В записи нужны droplet_id: только узлы из инвентаря
+            node_metrics.write(collector.samples(inventory.find()), time.time())
+        report(collector, samples)
+
+if __name__ == '__main__':
+    main()
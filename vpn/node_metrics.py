@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Метрики нагрузки VPN узлов: пиры, свежесть handshake и трафик
+
+Снимок узла снимается одной SSH командой: время сервера и `wg show all
+dump` (WireGuard) или файлы openvpn-status*.log всех экземпляров OpenVPN.
+Возраст handshake считается по часам сервера, поэтому расхождение часов
+с машиной оператора не влияет на число активных пиров. Разбор
+инкрементальный (peer_status.py): состояние пиров узла хранится между
+тактами, и заново разбираются только изменившиеся строки. Снимки можно
+записывать в JSONL (autoscale_metrics.jsonl) и проигрывать в
+autoscale.py --simulate.
+
+    python3 node_metrics.py --tag fleet-vpn-server
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from ssh_session import get_session
+import peer_status
+import deploy_vpn
+import deploy_openvpn
+import inventory
+
+METRICS_FILE = Path('autoscale_metrics.jsonl')
+ACTIVE_WINDOW = peer_status.ACTIVE_WINDOW
+MAX_WORKERS = 20
+
+COMMANDS = {
+    'wireguard': "date +%s; wg show all dump",
+    'openvpn': "date +%s; cat /etc/openvpn/openvpn-status*.log",
+}
+SSH_KEYS = {
+    'wireguard': deploy_vpn.SSH_KEY_PATH,
+    'openvpn': deploy_openvpn.SSH_KEY_PATH,
+}
+
+# Состояние разбора по droplet_id между тактами
+TRACKERS = {}
+
+
+def parse_wg_dump(text, now, window=ACTIVE_WINDOW, peers=None):
+    """Сводка `wg show all dump`: пиры, активные пиры, байты rx/tx
+
+    peers - peer_status.WgDump с прошлого вызова для того же узла.
+    """
+    peers = peers if peers is not None else peer_status.WgDump()
+    peers.update(text)
+    return peers.summary(now, window)
+
+
+def parse_openvpn_status(text, now, window=ACTIVE_WINDOW, files=None):
+    """Сводка файлов openvpn-status.log (формат status-version 1), подряд
+
+    Активный клиент - с Last Ref в таблице маршрутов не старше window.
+    files - список peer_status.OpenVPNStatus с прошлого вызова, по файлу
+    на экземпляр; дополняется на месте.
+    """
+    files = files if files is not None else []
+    parts = text.split(peer_status.CLIENT_LIST + '\n')[1:]
+    del files[len(parts):]
+    files.extend(peer_status.OpenVPNStatus() for _ in range(len(parts) - len(files)))
+
+    summary = {'peers': 0, 'active_peers': 0, 'rx_bytes': 0, 'tx_bytes': 0}
+    for status, part in zip(files, parts):
+        status.feed(peer_status.CLIENT_LIST + '\n' + part + ('' if part.endswith('\n') else '\n'))
+        for field, value in status.summary(now, window).items():
+            summary[field] += value
+    return summary
+
+
+PARSERS = {
+    'wireguard': parse_wg_dump,
+    'openvpn': parse_openvpn_status,
+}
+TRACKER_TYPES = {
+    'wireguard': peer_status.WgDump,
+    'openvpn': list,
+}
+
+
+def collect(record):
+    """Снимок метрик узла из инвентаря; None, если узел недоступен"""
+    protocol = record['protocol']
+    session = get_session(record['ip'], SSH_KEYS[protocol])
+    try:
+        result = session.run(COMMANDS[protocol], timeout=15)
+    except Exception:
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+
+    server_time, _, output = result.stdout.partition('\n')
+    now = int(server_time)
+    sample = {'droplet_id': record['droplet_id'], 'name': record['name'], 'region': record['region'],
+              'size': record['size'], 'time': now}
+    tracker = TRACKERS.get(record['droplet_id'])
+    if tracker is None:
+        tracker = TRACKERS[record['droplet_id']] = TRACKER_TYPES[protocol]()
+    sample.update(PARSERS[protocol](output, now, ACTIVE_WINDOW, tracker))
+    return sample
+
+
+def collect_all(records, workers=MAX_WORKERS):
+    """Снимки метрик узлов параллельно; недоступные узлы пропускаются"""
+    records = [record for record in records if record.get('ip')]
+    if not records:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(records))) as pool:
+        return [sample for sample in pool.map(collect, records) if sample is not None]
+
+
+def write(samples, tick, path=METRICS_FILE):
+    """Дописать снимки одного такта в JSONL"""
+    with open(path, 'a') as f:
+        for sample in samples:
+            f.write(json.dumps(dict(sample, tick=tick)) + "\n")
+
+
+def load(path=METRICS_FILE):
+    """Записанные снимки по тактам: [(время такта, [снимки])]"""
+    ticks = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                sample = json.loads(line)
+            except ValueError:
+                continue
+            ticks.setdefault(sample['tick'], []).append(sample)
+    return sorted(ticks.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Метрики нагрузки VPN узлов")
+    parser.add_argument('--protocol', choices=sorted(PARSERS))
+    parser.add_argument('--tag')
+    parser.add_argument('--record', action='store_true', help=f"дописать снимки в {METRICS_FILE}")
+    args = parser.parse_args()
+
+    records = inventory.find(protocol=args.protocol, tag=args.tag)
+    tick = time.time()
+    samples = collect_all(records)
+    if args.record:
+        write(samples, tick)
+
+    print(f"{'Имя':<28} {'пиры':>6} {'активные':>9} {'rx, МБ':>10} {'tx, МБ':>10}")
+    for sample in sorted(samples, key=lambda s: s['name']):
+        print(f"{sample['name']:<28} {sample['peers']:>6} {sample['active_peers']:>9} "
+              f"{sample['rx_bytes'] / 1e6:>10.1f} {sample['tx_bytes'] / 1e6:>10.1f}")
+    missing = len([r for r in records if r.get('ip')]) - len(samples)
+    if missing:
+        print(f"⚠️  Недоступно узлов: {missing}")
+
+if __name__ == '__main__':
+    main()
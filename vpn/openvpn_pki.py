@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+PKI для OpenVPN на машине оператора
+
+CA, сертификаты серверов и клиентов, ta.key и параметры DH создаются
+локально (openssl CLI) и передаются на droplet через user_data, поэтому
+droplet не тратит время на easy-rsa и gen-dh. По умолчанию используется
+ECDH (`dh none`), и параметры DH не нужны вовсе; для режима 'dh' берется
+стандартная группа ffdhe2048 (RFC 7919) из локального кэша.
+"""
+
+import os
+import secrets
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+PKI_DIR = Path('openvpn_pki')
+DH_CACHE = Path.home() / ".cache" / "vpn-do" / "dh2048.pem"
+
+CA_DAYS = 3650
+CERT_DAYS = 825
+CURVE = 'prime256v1'
+
+# Режим обмена ключами: 'ecdh' (без параметров DH) или 'dh'
+KEY_EXCHANGE = os.environ.get('VPN_OPENVPN_KEX', 'ecdh')
+
+EXTENSIONS = {
+    'server': "basicConstraints=CA:FALSE\n"
+              "keyUsage=digitalSignature,keyEncipherment\n"
+              "extendedKeyUsage=serverAuth\n",
+    'client': "basicConstraints=CA:FALSE\n"
+              "keyUsage=digitalSignature\n"
+              "extendedKeyUsage=clientAuth\n",
+}
+
+_lock = threading.Lock()
+
+
+def _openssl(*args):
+    subprocess.run(['openssl', *args], check=True, capture_output=True)
+
+
+def _read(path):
+    return Path(path).read_text().strip()
+
+
+def ensure_ca():
+    """Создать CA, если его еще нет; вернуть (путь к ключу, путь к сертификату)"""
+    ca_key, ca_cert = PKI_DIR / 'ca.key', PKI_DIR / 'ca.crt'
+    with _lock:
+        if not ca_cert.exists():
+            PKI_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            print("🔐 Создание CA для OpenVPN...")
+            _openssl('req', '-x509', '-newkey', 'ec', '-pkeyopt', f'ec_paramgen_curve:{CURVE}',
+                     '-nodes', '-days', str(CA_DAYS), '-subj', '/CN=OpenVPN-CA',
+                     '-keyout', str(ca_key), '-out', str(ca_cert))
+            os.chmod(ca_key, 0o600)
+    return ca_key, ca_cert
+
+
+def issue_cert(name, kind):
+    """Выпустить (или взять готовый) сертификат; вернуть (ключ PEM, сертификат PEM)
+
+    kind - 'server' или 'client'.
+    """
+    ca_key, ca_cert = ensure_ca()
+    key, cert = PKI_DIR / f'{name}.key', PKI_DIR / f'{name}.crt'
+    with _lock:
+        if not cert.exists():
+            with tempfile.TemporaryDirectory() as tmp:
+                csr = Path(tmp) / 'req.csr'
+                ext = Path(tmp) / 'ext.cnf'
+                ext.write_text(EXTENSIONS[kind])
+                _openssl('req', '-new', '-newkey', 'ec', '-pkeyopt', f'ec_paramgen_curve:{CURVE}',
+                         '-nodes', '-subj', f'/CN={name}', '-keyout', str(key), '-out', str(csr))
+                _openssl('x509', '-req', '-in', str(csr), '-CA', str(ca_cert), '-CAkey', str(ca_key),
+                         '-set_serial', str(secrets.randbits(63)), '-days', str(CERT_DAYS),
+                         '-extfile', str(ext), '-out', str(cert))
+            os.chmod(key, 0o600)
+    return _read(key), _read(cert)
+
+
+def tls_auth_key():
+    """Общий ключ tls-auth (формат `openvpn --genkey`), создается один раз"""
+    path = PKI_DIR / 'ta.key'
+    with _lock:
+        if not path.exists():
+            PKI_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            data = secrets.token_hex(256)
+            lines = [data[i:i + 32] for i in range(0, len(data), 32)]
+            path.write_text("#\n# 2048 bit OpenVPN static key\n#\n"
+                            "-----BEGIN OpenVPN Static key V1-----\n"
+                            + "\n".join(lines) +
+                            "\n-----END OpenVPN Static key V1-----\n")
+            os.chmod(path, 0o600)
+    return _read(path)
+
+
+def dh_params():
+    """Параметры DH из кэша (группа ffdhe2048) или None в режиме ECDH"""
+    if KEY_EXCHANGE == 'ecdh':
+        return None
+    with _lock:
+        if not DH_CACHE.exists():
+            DH_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                _openssl('genpkey', '-genparam', '-algorithm', 'DH',
+                         '-pkeyopt', 'group:ffdhe2048', '-out', str(DH_CACHE))
+            except subprocess.CalledProcessError:
+                # OpenSSL 1.1 не знает именованных групп: генерируем один раз
+                print("⏳ Генерация параметров DH (один раз, результат кэшируется)...")
+                _openssl('dhparam', '-out', str(DH_CACHE), '2048')
+    return _read(DH_CACHE)
+
+
+def server_bundle(name):
+    """Все материалы для сервера: ca, cert, key, ta и dh (None для ECDH)"""
+    key, cert = issue_cert(name, 'server')
+    return {
+        'ca_cert': _read(ensure_ca()[1]),
+        'server_cert': cert,
+        'server_key': key,
+        'ta_key': tls_auth_key(),
+        'dh': dh_params()
+    }
+
+
+def client_bundle(name):
+    """Материалы для клиента: ca, cert, key и ta"""
+    key, cert = issue_cert(name, 'client')
+    return {
+        'ca_cert': _read(ensure_ca()[1]),
+        'client_cert': cert,
+        'client_key': key,
+        'ta_key': tls_auth_key()
+    }
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Инкрементальный разбор `wg show all dump` и openvpn-status.log
+
+Состояние пиров хранится компактно: ключ пира -> номер слота, а время
+последней активности, байты и отпечаток строки лежат в массивах
+array('q'); слоты отключившихся пиров используются повторно. Строка,
+отпечаток которой не изменился с прошлого чтения, не разбирается, а
+наружу отдаются только изменения: подключенные, обновленные и
+отключенные пиры (PeerChange).
+
+Файл статуса OpenVPN (status-version 1, `status openvpn-status.log` из
+deploy_openvpn.py) читается с сохраненного смещения: неизменный файл не
+читается вовсе, недописанный снимок дочитывается с места остановки, а
+переписанный заново (OpenVPN переписывает его раз в интервал status) -
+целиком.
+
+Только стандартная библиотека: модуль копируется на droplet вместе с
+metrics_agent.py.
+
+    peers = WgDump()
+    changes = peers.update(dump)
+    status = OpenVPNStatus('/etc/openvpn/openvpn-status.log')
+    changes = status.poll()
+    status.summary(time.time())
+"""
+
+import os
+import time
+import calendar
+from array import array
+
+ACTIVE_WINDOW = 180   # пир активен, если handshake (Last Ref) был не позже, секунды
+OPENVPN_TIME_FORMAT = '%a %b %d %H:%M:%S %Y'
+HEAD_SIZE = 64        # начало файла статуса со строкой Updated: по нему видна перезапись
+
+CLIENT_LIST = 'OpenVPN CLIENT LIST'
+ROUTING_TABLE = 'ROUTING TABLE'
+GLOBAL_STATS = 'GLOBAL STATS'
+
+CONNECTED = 'connected'
+UPDATED = 'updated'
+DISCONNECTED = 'disconnected'
+
+
+class PeerChange:
+    """Изменение пира с прошлого чтения"""
+
+    __slots__ = ('kind', 'key', 'endpoint', 'last_seen', 'rx_bytes', 'tx_bytes', 'rx_delta', 'tx_delta')
+
+    def __init__(self, kind, key, endpoint, last_seen, rx_bytes, tx_bytes, rx_delta, tx_delta):
+        self.kind = kind
+        self.key = key
+        self.endpoint = endpoint
+        self.last_seen = last_seen
+        self.rx_bytes = rx_bytes
+        self.tx_bytes = tx_bytes
+        self.rx_delta = rx_delta
+        self.tx_delta = tx_delta
+
+    def __repr__(self):
+        return f"PeerChange({self.kind} {self.key} {self.endpoint} rx+{self.rx_delta} tx+{self.tx_delta})"
+
+
+class PeerTable:
+    """Пиры в слотах массивов с суммами байт"""
+
+    __slots__ = ('index', 'keys', 'endpoints', 'digests', 'last_seen', 'rx', 'tx', 'marks', 'free',
+                 'generation', 'rx_total', 'tx_total')
+
+    def __init__(self):
+        self.index = {}
+        self.keys = []
+        self.endpoints = []
+        self.digests = array('q')
+        self.last_seen = array('q')
+        self.rx = array('q')
+        self.tx = array('q')
+        self.marks = array('q')
+        self.free = []
+        self.generation = 0
+        self.rx_total = self.tx_total = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def begin(self):
+        """Начать проход по полному списку пиров"""
+        self.generation += 1
+
+    def unchanged(self, key, digest):
+        """Отметить пира в проходе, если его строка не изменилась"""
+        slot = self.index.get(key)
+        if slot is None or self.digests[slot] != digest:
+            return False
+        self.marks[slot] = self.generation
+        return True
+
+    def update(self, key, digest, endpoint, last_seen, rx, tx):
+        """Записать пира; изменение или None, если изменился только отпечаток"""
+        slot = self.index.get(key)
+        if slot is None:
+            slot = self._allocate(key)
+            kind = CONNECTED
+        else:
+            kind = UPDATED
+        # Счетчик меньше прежнего - пир пересоздан и считает заново
+        rx_delta = rx - self.rx[slot] if rx >= self.rx[slot] else rx
+        tx_delta = tx - self.tx[slot] if tx >= self.tx[slot] else tx
+        changed = (kind == CONNECTED or rx_delta or tx_delta or last_seen != self.last_seen[slot]
+                   or endpoint != self.endpoints[slot])
+
+        self.rx_total += rx - self.rx[slot]
+        self.tx_total += tx - self.tx[slot]
+        self.endpoints[slot] = endpoint
+        self.digests[slot] = digest
+        self.last_seen[slot] = last_seen
+        self.rx[slot] = rx
+        self.tx[slot] = tx
+        self.marks[slot] = self.generation
+        if changed:
+            return PeerChange(kind, key, endpoint, last_seen, rx, tx, rx_delta, tx_delta)
+        return None
+
+    def sweep(self):
+        """Закончить проход: пиры, не встреченные в нем, отключились"""
+        changes = []
+        for slot, mark in enumerate(self.marks):
+            key = self.keys[slot]
+            if key is None or mark == self.generation:
+                continue
+            changes.append(PeerChange(DISCONNECTED, key, self.endpoints[slot], self.last_seen[slot],
+                                      self.rx[slot], self.tx[slot], 0, 0))
+            del self.index[key]
+            self.rx_total -= self.rx[slot]
+            self.tx_total -= self.tx[slot]
+            self.keys[slot] = self.endpoints[slot] = None
+            self.digests[slot] = self.last_seen[slot] = self.rx[slot] = self.tx[slot] = 0
+            self.free.append(slot)
+        return changes
+
+    def active(self, now, window=ACTIVE_WINDOW):
+        return sum(1 for seen in self.last_seen if seen and now - seen <= window)
+
+    def summary(self, now, window=ACTIVE_WINDOW):
+        """Сводка в формате node_metrics: пиры, активные пиры, байты rx/tx"""
+        return {'peers': len(self.index), 'active_peers': self.active(now, window),
+                'rx_bytes': self.rx_total, 'tx_bytes': self.tx_total}
+
+    def _allocate(self, key):
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+        else:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.endpoints.append(None)
+            for column in (self.digests, self.last_seen, self.rx, self.tx, self.marks):
+                column.append(0)
+        self.index[key] = slot
+        return slot
+
+
+class WgDump:
+    """Пиры `wg show all dump` всех интерфейсов
+
+    Строка интерфейса - 5 полей, строка пира - 9: интерфейс, ключ, psk,
+    endpoint, allowed-ips, latest-handshake, rx, tx, keepalive. Ключ пира -
+    интерфейс и публичный ключ.
+    """
+
+    __slots__ = ('table',)
+
+    def __init__(self):
+        self.table = PeerTable()
+
+    def update(self, dump):
+        """Применить новый вывод dump (строка или строки); изменения с прошлого вызова"""
+        table = self.table
+        table.begin()
+        changes = []
+        for line in dump.splitlines() if isinstance(dump, str) else dump:
+            line = line.rstrip('\n')
+            if line.count('\t') != 8:
+                continue
+            key = line[:line.index('\t', line.index('\t') + 1)]
+            digest = hash(line)
+            if table.unchanged(key, digest):
+                continue
+            fields = line.split('\t')
+            change = table.update(key, digest, fields[3], int(fields[5]), int(fields[6]), int(fields[7]))
+            if change is not None:
+                changes.append(change)
+        return changes + table.sweep()
+
+    def summary(self, now, window=ACTIVE_WINDOW):
+        return self.table.summary(now, window)
+
+
+class OpenVPNStatus:
+    """Клиенты одного файла статуса OpenVPN (status-version 1)
+
+    Ключ клиента - Common Name и Real Address. Байты из CLIENT LIST (Bytes
+    Received - rx, Bytes Sent - tx), время активности - Last Ref из
+    ROUTING TABLE. Изменения отдаются по завершенному снимку (строка END).
+    """
+
+    __slots__ = ('table', 'path', 'inode', 'mtime', 'offset', 'head', 'pending', 'section', 'rows',
+                 'refs', 'times')
+
+    def __init__(self, path=None):
+        self.table = PeerTable()
+        self.path = path
+        self.inode = self.mtime = None
+        self.offset = 0
+        self.head = b''
+        self.pending = ''
+        self.section = None
+        self.rows = []
+        self.refs = {}
+        self.times = {}
+
+    def feed(self, text):
+        """Разобрать очередной кусок файла; изменения по завершенным в нем снимкам"""
+        changes = []
+        lines = (self.pending + text).split('\n')
+        self.pending = lines.pop()
+        for line in lines:
+            line = line.rstrip('\r')
+            if line in (CLIENT_LIST, ROUTING_TABLE, GLOBAL_STATS):
+                if line == CLIENT_LIST:
+                    self.rows, self.refs = [], {}
+                self.section = line
+            elif line == 'END':
+                if self.section is not None:
+                    changes += self._commit()
+                self.section = None
+            elif self.section == CLIENT_LIST:
+                if line.startswith(('Updated,', 'Common Name,')):
+                    continue
+                fields = line.rsplit(',', 3)
+                if len(fields) == 4:
+                    self.rows.append((fields[0], line))
+            elif self.section == ROUTING_TABLE:
+                if line.startswith('Virtual Address,'):
+                    continue
+                key, _, last_ref = line.partition(',')[2].rpartition(',')
+                if key:
+                    self.refs[key] = last_ref
+        return changes
+
+    def poll(self):
+        """Дочитать файл path с сохраненного смещения; изменения с прошлого вызова"""
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                head = f.read(HEAD_SIZE)
+                # После END OpenVPN файл не дописывает: любое изменение - новый снимок
+                rewritten = (stat.st_ino != self.inode or head != self.head or stat.st_size < self.offset
+                             or (self.section is None
+                                 and (stat.st_size, stat.st_mtime_ns) != (self.offset, self.mtime)))
+                if rewritten:
+                    self.inode, self.head, self.offset = stat.st_ino, head, 0
+                    self.pending, self.section = '', None
+                elif stat.st_size == self.offset:
+                    return []
+                self.mtime = stat.st_mtime_ns
+                f.seek(self.offset)
+                data = f.read()
+        except OSError:
+            return []
+        # Только целые строки: недописанная дочитается со следующим вызовом
+        data = data[:data.rfind(b'\n') + 1]
+        self.offset += len(data)
+        return self.feed(data.decode(errors='replace'))
+
+    def summary(self, now, window=ACTIVE_WINDOW):
+        return self.table.summary(now, window)
+
+    def _time(self, value):
+        # Файл статуса пишется в локальном времени сервера, на droplet это UTC;
+        # у большинства клиентов Last Ref совпадает до секунды, разбор кэшируется
+        seconds = self.times.get(value)
+        if seconds is None:
+            try:
+                seconds = calendar.timegm(time.strptime(value.strip(), OPENVPN_TIME_FORMAT))
+            except ValueError:
+                seconds = 0
+            self.times[value] = seconds
+        return seconds
+
+    def _commit(self):
+        table = self.table
+        table.begin()
+        changes = []
+        for key, line in self.rows:
+            last_ref = self.refs.get(key, '')
+            digest = hash((line, last_ref))
+            if table.unchanged(key, digest):
+                continue
+            fields = line.rsplit(',', 3)
+            try:
+                rx, tx = int(fields[1]), int(fields[2])
+            except ValueError:
+                continue
+            change = table.update(key, digest, key.rpartition(',')[2],
+                                  self._time(last_ref) if last_ref else 0, rx, tx)
+            if change is not None:
+                changes.append(change)
+        self.rows, self.refs = [], {}
+        if len(self.times) > 1024:
+            self.times.clear()
+        return changes + table.sweep()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+QR коды конфигураций клиентов: PNG и вывод в терминал
+
+Матрица кода строится пакетом qrcode, если он установлен, иначе утилитой
+qrencode; PNG (1 бит на пиксель) и текст для терминала собираются без
+сторонних библиотек. Конфигурация WireGuard (около 300 байт) укладывается
+в код версии 10-11, который читает камера телефона; OpenVPN клиенты
+конфигурации из QR не импортируют.
+
+    python3 qr_codes.py wg0.conf            # QR в терминал
+    python3 qr_codes.py wg0.conf wg0.png
+"""
+
+import sys
+import zlib
+import shutil
+import struct
+import argparse
+import subprocess
+
+try:
+    import qrcode
+except ImportError:  # pragma: no cover - зависит от окружения
+    qrcode = None
+
+BORDER = 4        # светлое поле вокруг кода, модулей
+PNG_SCALE = 8     # пикселей на модуль
+
+
+def available():
+    """Есть ли чем строить QR коды"""
+    return qrcode is not None or shutil.which('qrencode') is not None
+
+
+def matrix(text):
+    """Модули кода с полем BORDER: строки из True (темный) / False (светлый)"""
+    if qrcode is not None:
+        code = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=BORDER)
+        code.add_data(text)
+        code.make(fit=True)
+        return code.get_matrix()
+    # qrencode -t ASCII рисует модуль двумя символами: '##' или два пробела
+    result = subprocess.run(['qrencode', '-t', 'ASCII', '-l', 'M', '-m', str(BORDER), '-o', '-'],
+                            input=text.encode(), capture_output=True, check=True)
+    return [[char == '#' for char in line[::2]] for line in result.stdout.decode().splitlines() if line]
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png(modules, scale=PNG_SCALE):
+    """Черно-белый PNG по матрице модулей"""
+    size = len(modules) * scale
+    raw = bytearray()
+    for row in modules:
+        bits = "".join(('0' if dark else '1') * scale for dark in row)
+        bits += '0' * (-len(bits) % 8)
+        # Байт 0 перед строкой - фильтр PNG "без фильтра"
+        raw += (b'\x00' + int(bits, 2).to_bytes(len(bits) // 8, 'big')) * scale
+    return (b'\x89PNG\r\n\x1a\n'
+            + _chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 1, 0, 0, 0, 0))
+            + _chunk(b'IDAT', zlib.compress(bytes(raw), 9))
+            + _chunk(b'IEND', b''))
+
+
+def terminal(modules):
+    """Код для терминала: два ряда модулей в строке полублоками
+
+    Светлые модули рисуются символами, темные - пробелами, так код читается
+    с темного фона терминала.
+    """
+    rows = list(modules)
+    if len(rows) % 2:
+        rows.append([False] * len(rows[0]))
+    blocks = {(False, False): '█', (False, True): '▀', (True, False): '▄', (True, True): ' '}
+    return "\n".join(
+        "".join(blocks[top, bottom] for top, bottom in zip(rows[i], rows[i + 1]))
+        for i in range(0, len(rows), 2)
+    ) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QR код конфигурации клиента")
+    parser.add_argument('config', help="файл конфигурации (wg0.conf)")
+    parser.add_argument('png', nargs='?', help="сохранить PNG вместо вывода в терминал")
+    args = parser.parse_args()
+
+    if not available():
+        print("❌ Нет генератора QR: pip install qrcode или apt install qrencode")
+        sys.exit(1)
+    with open(args.config, 'r') as f:
+        modules = matrix(f.read())
+    if args.png:
+        with open(args.png, 'wb') as f:
+            f.write(png(modules))
+        print(f"✅ QR код сохранен в {args.png}")
+    else:
+        sys.stdout.write(terminal(modules))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Сигнал готовности сервера вместо фиксированных пауз
+
+user_data в конце установки отправляет HTTP запрос (в стиле cloud-init
+phone-home) на небольшой приемник, который запускает скрипт развертывания.
+Если приемник недоступен (не задан VPN_CALLBACK_URL или droplet не может до
+него достучаться), работает опрос с адаптивной паузой.
+
+Приемник включается переменными окружения:
+    VPN_CALLBACK_URL   публичный адрес приемника, например http://203.0.113.7:8787
+    VPN_CALLBACK_BIND  адрес для прослушивания (по умолчанию 0.0.0.0:<порт из URL>)
+"""
+
+import os
+import time
+import secrets
+import threading
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CALLBACK_URL = os.environ.get('VPN_CALLBACK_URL')
+CALLBACK_BIND = os.environ.get('VPN_CALLBACK_BIND')
+
+# Адаптивный опрос: первая пауза, множитель и верхняя граница (секунды)
+POLL_INITIAL = 1.0
+POLL_FACTOR = 1.5
+POLL_MAX = 8.0
+
+_receiver = None
+_receiver_lock = threading.Lock()
+
+
+class CallbackReceiver:
+    """HTTP приемник сигналов готовности от droplet"""
+
+    def __init__(self, public_url, bind=None):
+        self.public_url = public_url.rstrip('/')
+        parsed = urlparse(self.public_url)
+        host, _, port = (bind or f"0.0.0.0:{parsed.port or 80}").rpartition(':')
+        self._events = {}
+        self._lock = threading.Lock()
+
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                token = self.path.rstrip('/').rsplit('/', 1)[-1]
+                with receiver._lock:
+                    event = receiver._events.get(token)
+                self.send_response(204 if event else 404)
+                self.end_headers()
+                if event:
+                    event.set()
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, int(port)), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def register(self, name):
+        """Зарегистрировать ожидание; вернуть (url для droplet, threading.Event)"""
+        token = f"{name}-{secrets.token_urlsafe(16)}"
+        event = threading.Event()
+        with self._lock:
+            self._events[token] = event
+        return f"{self.public_url}/ready/{token}", event
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def get_receiver():
+    """Вернуть общий приемник или None, если он не настроен"""
+    global _receiver
+    if not CALLBACK_URL:
+        return None
+    with _receiver_lock:
+        if _receiver is None:
+            _receiver = CallbackReceiver(CALLBACK_URL, CALLBACK_BIND)
+            print(f"📡 Приемник сигналов готовности: {_receiver.public_url}")
+        return _receiver
+
+
+def register(name):
+    """Вернуть (callback_url, event) для droplet или (None, None) без приемника"""
+    receiver = get_receiver()
+    if receiver is None:
+        return None, None
+    return receiver.register(name)
+
+
+def phone_home_snippet(callback_url):
+    """Строки bash для конца user_data, сообщающие о завершении установки"""
+    if not callback_url:
+        return ""
+    return f"""
+# Сообщаем скрипту развертывания о готовности
+curl -fsS -m 10 --retry 5 --retry-connrefused -X POST '{callback_url}' > /dev/null || true
+"""
+
+
+def wait_until(check, event=None, timeout=300, initial=POLL_INITIAL,
+               factor=POLL_FACTOR, max_interval=POLL_MAX):
+    """Ждать сигнала event или успешной проверки check() с растущей паузой
+
+    Возвращает True, как только сработал сигнал или check() вернул True,
+    и False по истечении timeout секунд.
+    """
+    deadline = time.monotonic() + timeout
+    interval = initial
+    while True:
+        if event is not None and event.is_set():
+            return True
+        if check():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        pause = min(interval, remaining)
+        if event is not None:
+            if event.wait(pause):
+                return True
+        else:
+            time.sleep(pause)
+        interval = min(max_interval, interval * factor)
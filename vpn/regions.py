@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Выбор региона по задержке до оператора
+
+Все регионы-кандидаты опрашиваются параллельно: измеряется время TCP
+соединения с точкой в каждом регионе (по умолчанию speedtest серверы
+DigitalOcean). Общий бюджет опроса - PROBE_TIMEOUT, поэтому выбор добавляет
+к развертыванию не больше одного таймаута. Результаты кэшируются на
+REGION_TTL секунд.
+
+Переменные окружения:
+    VPN_REGION            фиксированный регион (опрос не выполняется)
+    VPN_REGIONS           кандидаты через запятую (по умолчанию REGIONS)
+    VPN_REGION_ENDPOINT   шаблон точки опроса host:port с {region}
+    VPN_REGION_TARGETS    явные точки: fra1=host:port,ams3=host:port
+    VPN_REGION_TTL        время жизни кэша, секунды (3600)
+
+Текущий рейтинг:
+    python3 regions.py
+    python3 regions.py --refresh --top 3
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+
+REGIONS = ['nyc1', 'nyc3', 'sfo2', 'sfo3', 'tor1', 'atl1', 'lon1', 'ams3', 'fra1', 'blr1',
+           'sgp1', 'syd1']
+ENDPOINT = os.environ.get('VPN_REGION_ENDPOINT', 'speedtest-{region}.digitalocean.com:80')
+PINNED = os.environ.get('VPN_REGION')
+
+CACHE_FILE = Path.home() / ".cache" / "vpn-do" / "regions.json"
+REGION_TTL = int(os.environ.get('VPN_REGION_TTL', '3600'))
+
+PROBE_TIMEOUT = 1.5   # общий бюджет опроса, секунды
+PROBE_ATTEMPTS = 3    # соединений на регион, берется минимум
+
+_lock = threading.Lock()
+
+
+def targets():
+    """{регион: (host, port)} по настройкам окружения"""
+    explicit = os.environ.get('VPN_REGION_TARGETS')
+    if explicit:
+        result = {}
+        for item in explicit.split(','):
+            region, _, endpoint = item.strip().partition('=')
+            host, _, port = endpoint.rpartition(':')
+            result[region] = (host, int(port))
+        return result
+    candidates = os.environ.get('VPN_REGIONS')
+    regions = [r.strip() for r in candidates.split(',')] if candidates else REGIONS
+    result = {}
+    for region in regions:
+        host, _, port = ENDPOINT.format(region=region).rpartition(':')
+        result[region] = (host, int(port))
+    return result
+
+
+def probe(host, port, deadline):
+    """Минимальное время TCP соединения в мс или None
+
+    Первое соединение также прогревает DNS, поэтому берется минимум из
+    нескольких попыток в пределах deadline.
+    """
+    try:
+        address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4]
+    except OSError:
+        return None
+    best = None
+    for _ in range(PROBE_ATTEMPTS):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        started = time.monotonic()
+        try:
+            with socket.create_connection(address[:2], timeout=remaining):
+                rtt = (time.monotonic() - started) * 1000
+        except OSError:
+            continue
+        best = rtt if best is None else min(best, rtt)
+    return None if best is None else round(best, 1)
+
+
+def measure(region_targets):
+    """Опросить все регионы параллельно; вернуть {регион: мс или None}"""
+    deadline = time.monotonic() + PROBE_TIMEOUT
+    pool = ThreadPoolExecutor(max_workers=len(region_targets))
+    futures = {pool.submit(probe, host, port, deadline): region
+               for region, (host, port) in region_targets.items()}
+    # DNS может зависнуть дольше бюджета: не ждем отстающих
+    done, _ = wait(futures, timeout=PROBE_TIMEOUT + 0.1)
+    pool.shutdown(wait=False, cancel_futures=True)
+    return {region: future.result() if future in done else None
+            for future, region in futures.items()}
+
+
+def _cache_key(region_targets):
+    return ','.join(f'{r}={h}:{p}' for r, (h, p) in sorted(region_targets.items()))
+
+
+def load_cache(region_targets):
+    """Результаты из кэша, если они свежие и для тех же точек"""
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get('key') != _cache_key(region_targets):
+        return None
+    if time.time() - cache.get('measured', 0) > REGION_TTL:
+        return None
+    return cache['rtt']
+
+
+def save_cache(region_targets, rtt):
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_FILE.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'key': _cache_key(region_targets), 'measured': time.time(), 'rtt': rtt}, f)
+    os.replace(tmp, CACHE_FILE)
+
+
+def ranking(refresh=False):
+    """[(регион, мс)] по возрастанию задержки; недоступные регионы не попадают"""
+    region_targets = targets()
+    with _lock:
+        rtt = None if refresh else load_cache(region_targets)
+        if rtt is None:
+            rtt = measure(region_targets)
+            if any(value is not None for value in rtt.values()):
+                save_cache(region_targets, rtt)
+    return sorted(((r, ms) for r, ms in rtt.items() if ms is not None), key=lambda item: item[1])
+
+
+def select_regions(k, fallback):
+    """k регионов с наименьшей задержкой (VPN_REGION фиксирует выбор)"""
+    if PINNED:
+        return [PINNED]
+    ranked = [region for region, _ in ranking()[:k]]
+    if not ranked:
+        print(f"⚠️  Не удалось измерить задержку до регионов, используется {fallback}")
+        return [fallback]
+    return ranked
+
+
+def select_region(fallback):
+    """Регион с наименьшей задержкой или fallback, если опрос не удался"""
+    return select_regions(1, fallback)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка до регионов DigitalOcean")
+    parser.add_argument('--refresh', action='store_true', help="игнорировать кэш")
+    parser.add_argument('--top', type=int, default=None, help="показать только N лучших")
+    args = parser.parse_args()
+
+    cached = not args.refresh and load_cache(targets()) is not None
+    started = time.monotonic()
+    ranked = ranking(refresh=args.refresh)
+    elapsed = time.monotonic() - started
+    for region, ms in ranked[:args.top]:
+        print(f"   {region:<6} {ms:7.1f} ms")
+    missing = sorted(set(targets()) - {region for region, _ in ranked})
+    if missing:
+        print(f"   недоступны: {', '.join(missing)}")
+    print(f"⏱  {elapsed:.2f}s" + (f" (кэш, TTL {REGION_TTL}s)" if cached else ""))
+
+if __name__ == '__main__':
+    main()
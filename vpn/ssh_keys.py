@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Поиск SSH ключа оператора в DigitalOcean по отпечатку с локальным кэшем
+
+Отпечаток (MD5 тела ключа, как в DigitalOcean) вычисляется локально, ключ
+ищется запросом GET /account/keys/{отпечаток} вместо выгрузки и перебора
+всего списка ключей. Найденный ID кэшируется на диске по отпечатку и хэшу
+токена (сам токен не сохраняется): обычный запуск не делает запросов к API,
+кэш перепроверяется раз в SSH_KEY_TTL секунд. Разные токены одного аккаунта
+дают разные записи - это лишь один лишний поиск по отпечатку.
+
+Переменные окружения:
+    VPN_SSH_KEY_TTL   время жизни записи кэша, секунды (86400)
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from pathlib import Path
+
+from do_api import get_client
+
+CACHE_FILE = Path.home() / ".cache" / "vpn-do" / "ssh_keys.json"
+SSH_KEY_TTL = int(os.environ.get('VPN_SSH_KEY_TTL', '86400'))
+
+_lock = threading.Lock()
+
+
+def fingerprint(public_key):
+    """MD5 отпечаток публичного ключа OpenSSH в формате DigitalOcean (aa:bb:...)"""
+    blob = base64.b64decode(public_key.split()[1])
+    digest = hashlib.md5(blob).hexdigest()
+    return ':'.join(digest[i:i + 2] for i in range(0, 32, 2))
+
+
+def token_hash(token):
+    """Префикс SHA-256 токена для ключа кэша (не идентификатор аккаунта)"""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def _load():
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(cache):
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_FILE.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, CACHE_FILE)
+
+
+def cached(token, fp):
+    """Запись кэша {'id', 'checked'} или None"""
+    return _load().get(f'{token_hash(token)}:{fp}')
+
+
+def remember(token, fp, key_id):
+    with _lock:
+        cache = _load()
+        cache[f'{token_hash(token)}:{fp}'] = {'id': key_id, 'checked': time.time()}
+        _save(cache)
+
+
+def forget(token, key_id):
+    """Удалить записи аккаунта с этим ID (например, если ключ удален из аккаунта)"""
+    prefix = f'{token_hash(token)}:'
+    with _lock:
+        cache = _load()
+        stale = [k for k, v in cache.items() if k.startswith(prefix) and v['id'] == key_id]
+        for k in stale:
+            del cache[k]
+        if stale:
+            _save(cache)
+
+
+def lookup(token, fp):
+    """ID ключа с отпечатком fp в аккаунте или None (один запрос)"""
+    response = get_client(token).get(f'/account/keys/{fp}')
+    if response.status_code == 200:
+        return response.json()['ssh_key']['id']
+    if response.status_code == 404:
+        return None
+    raise RuntimeError(f"Ошибка поиска SSH ключа: {response.text}")
+
+
+def ensure_key(token, public_key, name):
+    """ID ключа в DigitalOcean: из кэша, по отпечатку или созданием нового
+
+    Возвращает (ID, источник), источник - 'cache', 'found' или 'created'.
+    """
+    fp = fingerprint(public_key)
+    entry = cached(token, fp)
+    if entry is not None and time.time() - entry['checked'] < SSH_KEY_TTL:
+        return entry['id'], 'cache'
+
+    key_id = lookup(token, fp)
+    if key_id is not None:
+        remember(token, fp, key_id)
+        return key_id, 'found'
+
+    response = get_client(token).post('/account/keys', json={'name': name, 'public_key': public_key})
+    if response.status_code == 201:
+        key_id = response.json()['ssh_key']['id']
+        remember(token, fp, key_id)
+        return key_id, 'created'
+    # Ключ мог добавить параллельный запуск между поиском и созданием
+    if response.status_code == 422:
+        key_id = lookup(token, fp)
+        if key_id is not None:
+            remember(token, fp, key_id)
+            return key_id, 'found'
+    raise RuntimeError(f"Ошибка создания SSH ключа: {response.text}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Постоянные SSH сессии к droplet через мультиплексирование OpenSSH
+
+На каждый droplet открывается одно master соединение (ControlMaster/
+ControlPersist), все последующие команды идут по нему без нового обмена
+ключами. Несколько файлов забираются за один запрос одним tar потоком.
+"""
+
+import io
+import os
+import atexit
+import shutil
+import tarfile
+import tempfile
+import threading
+import subprocess
+
+SSH_BIN = os.environ.get('VPN_SSH_BIN', 'ssh')
+CONTROL_PERSIST = 600  # секунды простоя до закрытия master соединения
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class SSHSession:
+    """Мультиплексированная SSH сессия к одному хосту"""
+
+    def __init__(self, ip, key_path, user='root'):
+        self.ip = ip
+        self.key_path = str(key_path)
+        self.user = user
+        # Путь к unix сокету ограничен ~100 символами, поэтому короткий каталог в /tmp
+        self.control_dir = tempfile.mkdtemp(prefix='vpn-ssh-')
+        self.control_path = os.path.join(self.control_dir, 'cm')
+
+    def _args(self, *extra):
+        return [
+            SSH_BIN, '-i', self.key_path,
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', 'BatchMode=yes',
+            '-o', 'ConnectTimeout=5',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={self.control_path}',
+            '-o', f'ControlPersist={CONTROL_PERSIST}',
+            *extra,
+            f'{self.user}@{self.ip}'
+        ]
+
+    def run(self, command, timeout=10, input=None, text=True):
+        """Выполнить команду на сервере; вернуть subprocess.CompletedProcess"""
+        return subprocess.run(
+            self._args() + [command],
+            input=input,
+            capture_output=True,
+            text=text,
+            timeout=timeout
+        )
+
+    def is_connected(self):
+        """Есть ли живое master соединение"""
+        result = subprocess.run(self._args('-O', 'check'), capture_output=True, timeout=5)
+        return result.returncode == 0
+
+    def fetch_files(self, paths, timeout=30):
+        """Забрать несколько файлов одним запросом; вернуть {путь: bytes}
+
+        Отсутствующие файлы в результат не попадают. Пустой или обрезанный
+        tar поток (обрыв соединения) - {}, как и таймаут.
+        """
+        quoted = ' '.join(f"'{path}'" for path in paths)
+        try:
+            result = self.run(f"tar -cPf - {quoted} 2>/dev/null", timeout=timeout, text=False)
+        except subprocess.TimeoutExpired:
+            return {}
+        if not result.stdout:
+            return {}
+
+        files = {}
+        try:
+            with tarfile.open(fileobj=io.BytesIO(result.stdout), mode='r:') as archive:
+                for member in archive.getmembers():
+                    if member.isfile():
+                        files[member.name] = archive.extractfile(member).read()
+        except (tarfile.TarError, EOFError):
+            return {}
+        return files
+
+    def close(self):
+        """Закрыть master соединение и удалить сокет"""
+        if os.path.exists(self.control_path):
+            subprocess.run(self._args('-O', 'exit'), capture_output=True, timeout=5)
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_session(ip, key_path):
+    """Вернуть общую сессию для хоста (одно master соединение на droplet)"""
+    with _sessions_lock:
+        session = _sessions.get(ip)
+        if session is None:
+            session = _sessions[ip] = SSHSession(ip, key_path)
+        return session
+
+
+def close_session(ip):
+    with _sessions_lock:
+        session = _sessions.pop(ip, None)
+    if session:
+        session.close()
+
+
+@atexit.register
+def close_all():
+    """Закрыть все master соединения при выходе"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
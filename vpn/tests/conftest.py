@@ -0,0 +1,48 @@
+"""Модули vpn/ - плоские скрипты: тесты импортируют их из каталога vpn"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import do_api
+import fake_do
+import inventory
+
+TOKEN = 'test-token'
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Временный текущий каталог и инвентарь: скрипты пишут файлы по относительным путям"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(inventory, 'DB_FILE', tmp_path / 'vpn_inventory.db')
+    return tmp_path
+
+
+@pytest.fixture
+def fake():
+    """Имитация DigitalOcean API (fake_do.py) с короткими задержками"""
+    fake = fake_do.FakeDigitalOcean(boot_time=0.3, ip_delay=0.05, cloud_init=0.1, seed=1)
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def api(fake, monkeypatch):
+    """Клиент do_api к имитации; get_client(TOKEN) возвращает его же"""
+    client = do_api.DOClient(TOKEN, base_url=fake.base_url)
+    monkeypatch.setitem(do_api._clients, TOKEN, client)
+    yield client
+    client.session.close()
+
+
+def create_droplet(api, name='vpn-server', tags=()):
+    """Создать droplet в имитации; вернуть (droplet_id, ID action создания)"""
+    response = api.post('/droplets', json={'name': name, 'region': 'fra1', 'size': 's-1vcpu-1gb',
+                                           'image': 'ubuntu-22-04-x64', 'tags': list(tags)})
+    assert response.status_code == 202
+    return response.json()['droplet']['id'], response.json()['links']['actions'][0]['id']
@@ -0,0 +1,106 @@
+from autoscale import Autoscaler, SimulatedActions, POLICY
+
+TICK = 60
+
+
+class Fleet:
+    """Парк в SimulatedActions и снимки метрик по тактам"""
+
+    def __init__(self, nodes, policy=None):
+        self.actions = SimulatedActions()
+        for droplet_id in range(1, nodes + 1):
+            self.actions.fleet[droplet_id] = {'droplet_id': droplet_id, 'name': f'node-{droplet_id}',
+                                              'status': 'active', 'size': 's-1vcpu-1gb',
+                                              'region': 'fra1'}
+        self.scaler = Autoscaler(self.actions, policy)
+        self.now = 0
+        self.traffic = {}
+
+    def tick(self, peers, bps=0):
+        """Такт с нагрузкой peers {droplet_id: активных пиров}; вернуть действия"""
+        self.now += TICK
+        samples = []
+        for droplet_id in self.actions.fleet:
+            self.traffic[droplet_id] = self.traffic.get(droplet_id, 0) + bps * TICK
+            samples.append({'droplet_id': droplet_id, 'time': self.now,
+                            'active_peers': peers.get(droplet_id, 0),
+                            'rx_bytes': self.traffic[droplet_id], 'tx_bytes': 0})
+        decisions = self.scaler.step(self.actions.records(), samples, self.now)
+        return [(action, node.record['droplet_id'] if node else None) for action, node, _ in decisions]
+
+
+def test_add_needs_sustained_load():
+    fleet = Fleet(2)
+    busy = {1: 200, 2: 200}
+    assert fleet.tick(busy) == []
+    assert fleet.tick(busy) == []
+    # Провал нагрузки сбрасывает счетчик тактов
+    assert fleet.tick({1: 100, 2: 100}) == []
+    assert fleet.tick(busy) == []
+    assert fleet.tick(busy) == []
+    assert fleet.tick(busy) == [('add', 1)]
+    assert len(fleet.actions.fleet) == 3
+
+
+def test_add_respects_cooldown_up():
+    fleet = Fleet(1)
+    actions = [fleet.tick({1: 1000}) for _ in range(12)]
+    added = [i for i, decisions in enumerate(actions) if decisions and decisions[0][0] == 'add']
+    # Первое добавление после sustain тактов, следующие - не чаще cooldown_up
+    assert added[0] == POLICY['sustain'] - 1
+    assert all((b - a) * TICK >= POLICY['cooldown_up'] for a, b in zip(added, added[1:]))
+    assert len(added) >= 2
+
+
+def test_band_between_thresholds_is_stable():
+    # Нагрузка выше peers_low без узла и ниже peers_high: ни добавления, ни сокращения
+    fleet = Fleet(2)
+    for _ in range(20):
+        assert fleet.tick({1: 50, 2: 50}) == []
+
+
+def test_drain_idle_node_then_delete():
+    fleet = Fleet(3)
+    load = {1: 40, 2: 40}
+    decisions = [fleet.tick(load) for _ in range(POLICY['sustain'] + 1)]
+    assert decisions[-1] == [('drain', 3)]
+    assert fleet.actions.fleet[3]['status'] == 'draining'
+    # На draining узле нет активных пиров: он удаляется следующим тактом
+    assert fleet.tick(load) == [('delete', 3)]
+    assert 3 not in fleet.actions.fleet
+
+
+def test_drain_waits_for_cooldown_down_after_add():
+    fleet = Fleet(1)
+    for _ in range(POLICY['sustain']):
+        fleet.tick({1: 1000})
+    added_at = fleet.now
+
+    drained_at = None
+    while drained_at is None:
+        if ('drain', -1) in fleet.tick({1: 10}):
+            drained_at = fleet.now
+    assert drained_at - added_at >= POLICY['cooldown_down']
+
+
+def test_load_returns_draining_node_before_adding():
+    fleet = Fleet(3)
+    for _ in range(POLICY['sustain'] + 1):
+        fleet.tick({1: 40, 2: 40, 3: 5})
+    fleet.actions.fleet[3] = dict(fleet.actions.fleet[3], status='draining', draining_since=fleet.now)
+
+    busy = {1: 400, 2: 400, 3: 5}
+    decisions = [fleet.tick(busy) for _ in range(POLICY['sustain'])]
+    assert decisions[-1] == [('undrain', 3)]
+    assert len(fleet.actions.fleet) == 3
+
+
+def test_resize_sustained_traffic_with_cooldown():
+    fleet = Fleet(1, {'peers_high': 10 ** 6})
+    busy = POLICY['resize_bps'] * 2
+    resized = []
+    for _ in range(40):
+        if ('resize', 1) in fleet.tick({1: 50}, busy):
+            resized.append(fleet.now)
+    assert fleet.actions.fleet[1]['size'] == 's-4vcpu-8gb'
+    assert len(resized) == 2 and resized[1] - resized[0] >= POLICY['cooldown_resize']
@@ -0,0 +1,37 @@
+import build_image
+
+
+def add_snapshots(fake, names):
+    return {name: fake.add_snapshot(name, '2026-01-01T00:00:00Z') for name in names}
+
+
+def test_prune_keeps_newest_of_protocol(fake, api):
+    ids = add_snapshots(fake, ['wireguard-20260101-000000', 'wireguard-20260301-000000',
+                               'wireguard-20260201-000000', 'openvpn-20250101-000000',
+                               'wireguard-manual'])
+    current = ids['wireguard-20260301-000000']
+
+    assert build_image.prune_snapshots(api, 'wireguard', current, keep=2) == 1
+    assert sorted(s['name'] for s in fake.snapshots.values()) == [
+        'openvpn-20250101-000000', 'wireguard-20260201-000000',
+        'wireguard-20260301-000000', 'wireguard-manual']
+
+
+def test_prune_never_deletes_current(fake, api):
+    # Собранный снимок остается, даже если имя другого снимка "новее"
+    ids = add_snapshots(fake, ['openvpn-20260101-000000', 'openvpn-20990101-000000'])
+    current = ids['openvpn-20260101-000000']
+
+    assert build_image.prune_snapshots(api, 'openvpn', current, keep=1) == 1
+    assert list(fake.snapshots) == [current]
+
+
+def test_prune_lists_all_pages(fake, api):
+    # Больше снимков, чем помещается на страницу списка (per_page=200)
+    add_snapshots(fake, [f'wireguard-2025{i:04d}-000000' for i in range(205)])
+    current = fake.add_snapshot('wireguard-20260201-000000', '2026-02-01T00:00:00Z')
+
+    assert build_image.prune_snapshots(api, 'wireguard', current, keep=3) == 203
+    assert sorted(s['name'] for s in fake.snapshots.values()) == [
+        'wireguard-20250203-000000', 'wireguard-20250204-000000', 'wireguard-20260201-000000']
+    assert fake.calls[('GET', '/v2/snapshots')] == 2
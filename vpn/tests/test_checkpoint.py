@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+
+import checkpoint
+import inventory
+from conftest import TOKEN, create_droplet
+
+PARAMS = {'size': 's-1vcpu-1gb', 'region': None, 'tuning': 'balanced-v1'}
+
+pytestmark = pytest.mark.usefixtures('workdir')
+
+
+def saved(steps):
+    progress = checkpoint.Checkpoint('wireguard-vpn-server', PARAMS)
+    for name, value in steps.items():
+        progress.save(name, value)
+    return progress
+
+
+def test_new_deployment_has_no_steps(api):
+    progress = checkpoint.resume(TOKEN, 'wireguard', 'vpn-server', PARAMS)
+    assert progress.steps == {} and not progress.path.exists()
+
+
+def test_saved_steps_survive_restart():
+    progress = saved({'region': 'fra1', 'keygen': ['private', {'peers': {}}]})
+    assert os.stat(progress.path).st_mode & 0o777 == 0o600
+
+    restored = checkpoint.Checkpoint('wireguard-vpn-server')
+    assert restored.get('region') == 'fra1' and 'keygen' in restored
+    restored.discard()
+    assert not progress.path.exists()
+
+
+def test_changed_params_stop_resume(api):
+    saved({'region': 'fra1'})
+    with pytest.raises(SystemExit):
+        checkpoint.resume(TOKEN, 'wireguard', 'vpn-server', dict(PARAMS, size='s-2vcpu-4gb'))
+
+
+def test_active_droplet_is_kept(api, fake):
+    droplet_id, action_id = create_droplet(api)
+    time.sleep(fake.boot_time)
+    saved({'region': 'fra1', 'create_droplet': [droplet_id, action_id]})
+    fake.calls.clear()
+
+    progress = checkpoint.resume(TOKEN, 'wireguard', 'vpn-server', PARAMS)
+    assert progress.get('create_droplet') == [droplet_id, action_id]
+    # Активный droplet: action создания не запрашивается
+    assert fake.calls[('GET', '/v2/actions/{id}')] == 0
+
+
+def test_deleted_droplet_is_recreated(api):
+    inventory.add({'droplet_id': 424242, 'name': 'vpn-server'}, 'wireguard')
+    saved({'region': 'fra1', 'create_droplet': [424242, 1], 'wait_for_droplet': '203.0.113.1'})
+
+    progress = checkpoint.resume(TOKEN, 'wireguard', 'vpn-server', PARAMS)
+    assert list(progress.steps) == ['region']
+    assert inventory.get(424242) is None
+
+
+def test_errored_droplet_is_deleted_and_recreated(api, fake):
+    fake.create_error_rate = 1.0
+    droplet_id, action_id = create_droplet(api)
+    inventory.add({'droplet_id': droplet_id, 'name': 'vpn-server'}, 'wireguard')
+    time.sleep(fake.boot_time)
+    saved({'region': 'fra1', 'create_droplet': [droplet_id, action_id]})
+
+    progress = checkpoint.resume(TOKEN, 'wireguard', 'vpn-server', PARAMS)
+    assert list(progress.steps) == ['region']
+    assert droplet_id not in fake.droplets
+    assert inventory.get(droplet_id) is None
+
+
+def test_droplet_still_creating_is_kept(api, fake):
+    droplet_id, action_id = create_droplet(api)
+    saved({'region': 'fra1', 'create_droplet': [droplet_id, action_id]})
+
+    progress = checkpoint.resume(TOKEN, 'wireguard', 'vpn-server', PARAMS)
+    assert 'create_droplet' in progress
+    assert droplet_id in fake.droplets
@@ -0,0 +1,135 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import dag
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(dag, 'RETRY_BACKOFF', 0.0)
+
+
+def test_results_passed_in_deps_order():
+    graph = dag.Graph()
+    graph.value('size', 's-1vcpu-1gb')
+    graph.step('region', lambda: 'fra1')
+    graph.step('droplet', lambda region, size: (region, size), deps=['region', 'size'])
+    assert graph.run()['droplet'] == ('fra1', 's-1vcpu-1gb')
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError):
+        dag.Graph().step('droplet', lambda region: region, deps=['region'])
+
+
+def test_independent_steps_run_in_parallel():
+    barrier = threading.Barrier(3, timeout=2)
+    graph = dag.Graph()
+    for name in ('ssh_key', 'region', 'keygen'):
+        graph.step(name, barrier.wait, timeout=5)
+    graph.step('all', lambda *args: 'done', deps=['ssh_key', 'region', 'keygen'])
+    assert graph.run()['all'] == 'done'
+    # Критический путь заканчивается последним шагом
+    assert graph.critical_path()[-1][0] == 'all'
+
+
+def test_failure_stops_dependent_steps():
+    started = []
+    graph = dag.Graph()
+    graph.step('create', lambda: 1 / 0)
+    graph.step('wait', lambda droplet: started.append('wait'), deps=['create'])
+    with pytest.raises(ZeroDivisionError):
+        graph.run()
+    assert started == []
+    assert graph.spans['create'][2] is False
+
+
+def test_retries_exceptions_but_not_system_exit():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return 'ok'
+
+    graph = dag.Graph()
+    graph.step('flaky', flaky, retries=2)
+    assert graph.run()['flaky'] == 'ok'
+
+    exits = []
+    graph = dag.Graph()
+    graph.step('exit', lambda: exits.append(1) or sys.exit(1), retries=3)
+    with pytest.raises(SystemExit):
+        graph.run()
+    assert len(exits) == 1
+
+
+def test_timeout_fails_graph_without_waiting_for_step():
+    release = threading.Event()
+    graph = dag.Graph()
+    graph.step('hang', lambda: release.wait(30), timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(dag.StepTimeout):
+        graph.run()
+    assert time.monotonic() - started < 2
+    # Зависший шаг не задержит выход процесса
+    assert [t.daemon for t in threading.enumerate() if t.name == 'step-hang'] == [True]
+    release.set()
+
+
+def test_hung_step_does_not_block_process_exit():
+    script = ("import time, dag\n"
+              "graph = dag.Graph()\n"
+              "graph.step('hang', lambda: time.sleep(60), timeout=0.2)\n"
+              "try:\n"
+              "    graph.run()\n"
+              "except dag.StepTimeout:\n"
+              "    print('timeout')\n")
+    result = subprocess.run([sys.executable, '-c', script], cwd=Path(dag.__file__).parent,
+                            capture_output=True, text=True, timeout=10)
+    assert result.stdout.strip() == 'timeout'
+
+
+class Saved(dict):
+    """Контрольная точка в памяти с интерфейсом checkpoint.Checkpoint"""
+
+    def get(self, name, default=None):
+        return dict.get(self, name, default)
+
+    def save(self, name, value):
+        self[name] = value
+
+
+def test_checkpoint_skips_saved_and_unneeded_steps():
+    calls = []
+
+    def step(name, result):
+        def run(*args):
+            calls.append(name)
+            return result
+        return run
+
+    def build(progress):
+        graph = dag.Graph(checkpoint=progress)
+        graph.step('keygen', step('keygen', ('private', 'public')), checkpoint=(list, tuple))
+        graph.step('user_data', step('user_data', 'script'), deps=['keygen'])
+        graph.step('create', step('create', [100, 200]), deps=['user_data'], checkpoint=True)
+        graph.step('wait', step('wait', '203.0.113.1'), deps=['create'])
+        return graph
+
+    progress = Saved()
+    build(progress).run()
+    assert progress == {'keygen': ['private', 'public'], 'create': [100, 200]}
+
+    calls.clear()
+    graph = build(progress)
+    results = graph.run()
+    # user_data нужен только для уже созданного droplet
+    assert calls == ['wait']
+    assert results['keygen'] == ('private', 'public') and graph.resumed == ['keygen', 'create']
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+import requests
+
+import do_api
+from conftest import TOKEN
+
+
+class Clock:
+    """Замена модуля time в do_api: паузы записываются, а не выполняются"""
+
+    monotonic = staticmethod(time.monotonic)
+    time = staticmethod(time.time)
+
+    def __init__(self, on_sleep=None):
+        self.sleeps = []
+        self.on_sleep = on_sleep
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        if self.on_sleep:
+            self.on_sleep()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(do_api, 'time', clock)
+    return clock
+
+
+def test_get_retried_on_500_until_success(fake, api, clock):
+    fake.error_rate = 1.0
+    clock.on_sleep = lambda: setattr(fake, 'error_rate', 0.0)
+
+    assert api.get('/droplets').status_code == 200
+    assert fake.calls[('GET', '/v2/droplets')] == 2
+    assert api.latencies[-1][3:4] + api.latencies[-1][5:] == (200, 2)
+    assert 0 <= clock.sleeps[0] <= do_api.BACKOFF_BASE
+
+
+def test_get_gives_up_after_max_retries(fake, api, clock):
+    fake.error_rate = 1.0
+
+    assert api.get('/droplets').status_code == 500
+    assert fake.calls[('GET', '/v2/droplets')] == do_api.MAX_RETRIES + 1
+    # Full jitter: пауза не превышает экспоненциальной границы попытки
+    for attempt, delay in enumerate(clock.sleeps, 1):
+        assert 0 <= delay <= min(do_api.BACKOFF_MAX, do_api.BACKOFF_BASE * 2 ** (attempt - 1))
+
+
+def test_post_retried_on_429_creates_one_droplet(fake, api, clock):
+    fake.rate_limit = 0
+    clock.on_sleep = lambda: setattr(fake, 'rate_limit', 5000)
+
+    response = api.post('/droplets', json={'name': 'vpn-server', 'region': 'fra1', 'tags': []})
+    assert response.status_code == 202
+    assert len(fake.droplets) == 1
+    assert fake.calls[('POST', '/v2/droplets')] == 2
+    # Пауза до сброса окна из RateLimit-Reset, но не дольше BACKOFF_MAX (+ jitter до 1s);
+    # затем бюджет 0 из последнего ответа добавляет паузу торможения
+    assert 0 < clock.sleeps[0] <= do_api.BACKOFF_MAX + 1
+    assert all(delay <= do_api.BACKOFF_MAX + 1 for delay in clock.sleeps)
+
+
+def test_post_not_retried_on_connection_error(clock):
+    # Закрытый порт: соединение отклоняется, запрос мог бы дойти - POST не повторяем
+    api = do_api.DOClient(TOKEN, base_url='http://127.0.0.1:9/v2')
+    with pytest.raises(requests.ConnectionError):
+        api.post('/droplets', json={})
+    assert api.latencies[-1][5] == 1 and clock.sleeps == []
+
+    with pytest.raises(requests.ConnectionError):
+        api.get('/droplets')
+    assert api.latencies[-1][5] == do_api.MAX_RETRIES + 1
+
+
+def test_throttle_spreads_requests_when_budget_is_low(fake, api, clock):
+    fake.rate_limit = 10
+
+    api.get('/account/keys')
+    assert clock.sleeps == []
+    assert api.rate_remaining == 9
+
+    api.get('/account/keys')
+    window = api.rate_reset - time.time()
+    # Остаток окна делится на оставшиеся запросы (9 + 1)
+    assert len(clock.sleeps) == 1
+    assert window / 10 - 1 <= clock.sleeps[0] <= min(do_api.BACKOFF_MAX, window / 10 + 1)
+    assert fake.calls[('GET', '/v2/account/keys')] == 2
+
+
+def test_no_throttle_with_plenty_of_budget(fake, api, clock):
+    for _ in range(5):
+        api.get('/account/keys')
+    assert clock.sleeps == []
+    assert api.rate_remaining == fake.rate_limit - 5
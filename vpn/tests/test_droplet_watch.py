@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import create_droplet
+from droplet_watch import DropletWatcher, STALE_TICKS
+
+TAG = 'fleet-test'
+
+
+@pytest.fixture
+def watcher(api):
+    return DropletWatcher(api, TAG, initial=0.05, factor=1.5, max_interval=0.2)
+
+
+def test_fleet_waits_share_one_list_per_tick(fake, api, watcher):
+    droplets = [create_droplet(api, f'node-{i}', [TAG]) for i in range(8)]
+    create_droplet(api, 'other')
+
+    with ThreadPoolExecutor(len(droplets)) as pool:
+        results = list(pool.map(lambda d: watcher.wait(d[0], timeout=10, action_id=d[1]), droplets))
+
+    assert all(ip and error is None for ip, error in results)
+    assert len({ip for ip, _ in results}) == len(droplets)
+    # Один запрос списка на такт, а не по запросу на droplet
+    assert fake.calls[('GET', '/v2/droplets')] == watcher.ticks
+    assert fake.calls[('GET', '/v2/droplets/{id}')] == 0
+    # Action создания проверяется, только пока droplet не active, раз в STALE_TICKS тактов
+    assert fake.calls[('GET', '/v2/actions/{id}')] <= len(droplets) * (watcher.ticks // STALE_TICKS)
+
+
+def test_errored_create_action_reported_before_timeout(fake, api, watcher):
+    fake.create_error_rate = 1.0
+    droplet_id, action_id = create_droplet(api, 'node', [TAG])
+
+    started = time.monotonic()
+    assert watcher.wait(droplet_id, timeout=30, action_id=action_id) == (None, 'errored')
+    assert time.monotonic() - started < 5
+    assert fake.calls[('GET', '/v2/actions/{id}')] >= 1
+
+
+def test_timeout_without_action(fake, api, watcher):
+    fake.create_error_rate = 1.0
+    droplet_id, _ = create_droplet(api, 'node', [TAG])
+
+    assert watcher.wait(droplet_id, timeout=0.5) == (None, None)
+    assert fake.calls[('GET', '/v2/actions/{id}')] == 0
+
+    # Ожидающих не осталось: поток опроса завершается
+    deadline = time.monotonic() + 2
+    while watcher._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert watcher._thread is None
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import inventory
+
+
+pytestmark = pytest.mark.usefixtures('workdir')
+
+
+def test_upsert_keeps_known_fields():
+    inventory.add({'droplet_id': 1, 'name': 'vpn-server', 'region': 'fra1', 'tags': ['vpn'],
+                   'tuning': 'throughput-v2'}, 'wireguard')
+    record = inventory.get(1)
+    assert (record['status'], record['ip'], record['tags']) == ('creating', None, ['vpn'])
+
+    inventory.add({'droplet_id': 1, 'ip': '203.0.113.1', 'config_file': 'wg0.conf'}, 'wireguard')
+    record = inventory.get(1)
+    assert (record['name'], record['region'], record['ip'], record['status']) == \
+        ('vpn-server', 'fra1', '203.0.113.1', 'active')
+    # Теги и поля вне колонок (extra) сохраняются, если их нет в обновлении
+    assert record['tags'] == ['vpn'] and record['tuning'] == 'throughput-v2'
+
+
+def test_find_and_resolve():
+    inventory.add({'droplet_id': 1, 'name': 'a', 'region': 'fra1', 'tags': ['vpn', 'fleet']}, 'wireguard')
+    inventory.add({'droplet_id': 2, 'name': 'b', 'region': 'ams3', 'tags': ['vpn']}, 'openvpn')
+    assert [r['droplet_id'] for r in inventory.find(tag='vpn', region='fra1')] == [1]
+    assert [r['droplet_id'] for r in inventory.find(protocol='openvpn')] == [2]
+    assert inventory.resolve('2', 'wireguard') == []
+    assert [r['droplet_id'] for r in inventory.resolve('b')] == [2]
+
+    inventory.remove(1)
+    assert inventory.get(1) is None
+    assert inventory.find(tag='fleet') == []
+
+
+def test_legacy_files_imported_once(workdir):
+    (workdir / 'vpn_info.json').write_text(json.dumps({'droplet_id': 7, 'name': 'vpn-server',
+                                                       'ip': '203.0.113.7'}))
+    (workdir / 'fleet_inventory.json').write_text(json.dumps({
+        'protocol': 'openvpn',
+        'nodes': [{'droplet_id': 8, 'name': 'n1'}, {'name': 'n2', 'error': 'SystemExit: 1'}],
+    }))
+    records = {r['droplet_id']: r for r in inventory.find()}
+    assert sorted(records) == [7, 8]
+    assert records[7]['protocol'] == 'wireguard' and records[8]['protocol'] == 'openvpn'
+    assert records[7]['imported_from'] == 'vpn_info.json'
+    assert not (workdir / 'vpn_info.json').exists()
+    assert (workdir / 'vpn_info.json.imported').exists()
+
+    # Удаленная запись не возвращается из старого файла при новом соединении
+    inventory.remove(7)
+    inventory._local.conn = None
+    assert [r['droplet_id'] for r in inventory.find()] == [8]
@@ -0,0 +1,39 @@
+import pytest
+
+from metrics_agent import encode, decode, FrameError, KEYFRAME, DELTA, TAG_SIZE
+
+KEY = b'fleet-key'
+
+
+def test_keyframe_round_trip():
+    values = [0, 1, 127, 128, 300, 2 ** 40]
+    frame = encode(KEY, 'vpn-fra1-1', 7, 1700000000.9, values)
+    assert decode(KEY, frame) == (KEYFRAME, 'vpn-fra1-1', 7, 1700000000, 7, values)
+
+
+def test_delta_round_trip_with_negative_differences():
+    base = [100, 5000, 20, 2 ** 33]
+    values = [90, 5000, 2 ** 20, 0]
+    frame = encode(KEY, 'узел', 9, 1700000010, values, base, 7)
+    kind, name, seq, _, base_seq, deltas = decode(KEY, frame)
+    assert (kind, name, seq, base_seq) == (DELTA, 'узел', 9, 7)
+    assert [b + d for b, d in zip(base, deltas)] == values
+
+
+@pytest.mark.parametrize('position', [-1, -TAG_SIZE, 3, 10])
+def test_tampered_frame_rejected(position):
+    frame = bytearray(encode(KEY, 'vpn-fra1-1', 1, 1700000000, [1, 2, 3]))
+    frame[position] ^= 0x01
+    with pytest.raises(FrameError):
+        decode(KEY, bytes(frame))
+
+
+def test_wrong_key_rejected():
+    frame = encode(KEY, 'vpn-fra1-1', 1, 1700000000, [1, 2, 3])
+    with pytest.raises(FrameError):
+        decode(b'other-key', frame)
+
+
+def test_foreign_packet_rejected():
+    with pytest.raises(FrameError):
+        decode(KEY, b'GET / HTTP/1.1\r\n\r\n')
@@ -0,0 +1,99 @@
+import calendar
+import time
+
+from peer_status import WgDump, OpenVPNStatus, CONNECTED, UPDATED, DISCONNECTED
+
+INTERFACE = "wg0\tPRIVATE\tPUBLIC\t51820\toff"
+
+
+def peer(key, endpoint, handshake, rx, tx):
+    return f"wg0\t{key}\t(none)\t{endpoint}\t10.0.0.2/32\t{handshake}\t{rx}\t{tx}\toff"
+
+
+def kinds(changes):
+    return sorted((change.kind, change.key) for change in changes)
+
+
+def test_wg_dump_connect_update_disconnect():
+    peers = WgDump()
+    dump = [INTERFACE, peer('A', '198.51.100.1:1000', 100, 10, 20),
+            peer('B', '198.51.100.2:1000', 100, 30, 40)]
+    assert kinds(peers.update("\n".join(dump))) == [(CONNECTED, 'wg0\tA'), (CONNECTED, 'wg0\tB')]
+
+    # Неизменный вывод - без изменений
+    assert peers.update("\n".join(dump)) == []
+
+    dump[1] = peer('A', '198.51.100.1:1000', 160, 110, 25)
+    changes = peers.update("\n".join(dump))
+    assert kinds(changes) == [(UPDATED, 'wg0\tA')]
+    assert (changes[0].rx_delta, changes[0].tx_delta, changes[0].last_seen) == (100, 5, 160)
+
+    changes = peers.update("\n".join(dump[:2]))
+    assert kinds(changes) == [(DISCONNECTED, 'wg0\tB')]
+    assert peers.summary(200) == {'peers': 1, 'active_peers': 1, 'rx_bytes': 110, 'tx_bytes': 25}
+
+
+def test_wg_dump_counter_reset_and_slot_reuse():
+    peers = WgDump()
+    peers.update([peer('A', '(none)', 0, 500, 500)])
+    changes = peers.update([peer('A', '(none)', 0, 50, 60)])
+    # Пир пересоздан: счетчики считаются заново
+    assert (changes[0].rx_delta, changes[0].tx_delta) == (50, 60)
+
+    # Слот отключившегося пира освобождается в конце прохода и занимается следующим
+    peers.update([])
+    peers.update([peer('B', '(none)', 0, 1, 1)])
+    assert peers.table.keys == ['wg0\tB']
+    assert peers.summary(0)['rx_bytes'] == 1
+
+
+CLIENT = "client1,203.0.113.5:51234"
+
+
+def snapshot(updated, clients):
+    lines = ["OpenVPN CLIENT LIST", f"Updated,{updated}",
+             "Common Name,Real Address,Bytes Received,Bytes Sent,Connected Since"]
+    lines += [f"{key},{rx},{tx},Thu Jun 18 04:23:03 2015" for key, rx, tx, _ in clients]
+    lines += ["ROUTING TABLE", "Virtual Address,Common Name,Real Address,Last Ref"]
+    lines += [f"10.8.0.{i + 6},{key},{last_ref}" for i, (key, _, _, last_ref) in enumerate(clients)]
+    lines += ["GLOBAL STATS", "Max bcast/mcast queue length,0", "END"]
+    return "\n".join(lines) + "\n"
+
+
+def test_openvpn_feed_connect_update_disconnect():
+    status = OpenVPNStatus()
+    first = snapshot("Thu Jun 18 08:12:15 2015", [(CLIENT, 1000, 2000, "Thu Jun 18 08:12:09 2015")])
+    changes = status.feed(first)
+    assert kinds(changes) == [(CONNECTED, CLIENT)]
+    assert changes[0].endpoint == '203.0.113.5:51234'
+    assert changes[0].last_seen == calendar.timegm(time.strptime("Thu Jun 18 08:12:09 2015",
+                                                                 "%a %b %d %H:%M:%S %Y"))
+    assert status.feed(first) == []
+
+    changes = status.feed(snapshot("Thu Jun 18 08:13:15 2015",
+                                   [(CLIENT, 1500, 2100, "Thu Jun 18 08:13:01 2015")]))
+    assert kinds(changes) == [(UPDATED, CLIENT)]
+    assert (changes[0].rx_delta, changes[0].tx_delta) == (500, 100)
+
+    assert kinds(status.feed(snapshot("Thu Jun 18 08:14:15 2015", []))) == [(DISCONNECTED, CLIENT)]
+    assert status.summary(0)['peers'] == 0
+
+
+def test_openvpn_poll_partial_and_rewritten_file(tmp_path):
+    path = tmp_path / 'openvpn-status.log'
+    status = OpenVPNStatus(str(path))
+    assert status.poll() == []
+
+    text = snapshot("Thu Jun 18 08:12:15 2015", [(CLIENT, 1000, 2000, "Thu Jun 18 08:12:09 2015")])
+    # Снимок без END и с недописанной строкой: изменений еще нет
+    cut = text.index("GLOBAL STATS") + 5
+    path.write_text(text[:cut])
+    assert status.poll() == []
+    with open(path, 'a') as f:
+        f.write(text[cut:])
+    assert kinds(status.poll()) == [(CONNECTED, CLIENT)]
+    assert status.poll() == []
+
+    # OpenVPN переписывает файл целиком
+    path.write_text(snapshot("Thu Jun 18 08:13:15 2015", []))
+    assert kinds(status.poll()) == [(DISCONNECTED, CLIENT)]
@@ -0,0 +1,45 @@
+import io
+import subprocess
+import tarfile
+
+import pytest
+
+from ssh_session import SSHSession
+
+
+def tar_stream(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:') as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = SSHSession('203.0.113.1', tmp_path / 'key')
+    yield session
+    session.close()
+
+
+def answer(session, monkeypatch, stdout):
+    monkeypatch.setattr(session, 'run', lambda *args, **kwargs: subprocess.CompletedProcess([], 0, stdout, b''))
+
+
+def test_fetch_files(session, monkeypatch):
+    files = {'/etc/wireguard/wg0.conf': b'[Interface]\n', '/root/client.ovpn': b'x' * 5000}
+    answer(session, monkeypatch, tar_stream(files))
+    assert session.fetch_files(list(files)) == files
+
+
+@pytest.mark.parametrize('stdout', [
+    b'',
+    b'not a tar stream at all',
+    tar_stream({'/root/client.ovpn': b'x' * 5000})[:1024],
+    tar_stream({'/root/client.ovpn': b'x' * 5000})[:700],
+])
+def test_fetch_files_empty_or_truncated(session, monkeypatch, stdout):
+    answer(session, monkeypatch, stdout)
+    assert session.fetch_files(['/root/client.ovpn']) == {}
@@ -0,0 +1,48 @@
+import base64
+
+import pytest
+
+import wg_keys
+
+# RFC 7748, раздел 5.2: (скаляр, u-координата, результат)
+VECTORS = [
+    ('a546e36bf0527c9d3b16154b82465edd62144c0ac1fc5a18506a2244ba449ac4',
+     'e6db6867583030db3594c1a424b15f7c726624ec26b3353b10a903a6d0ab1c4c',
+     'c3da55379de9c6908e94ea4df28d084f32eccf03491c71f754b4075577a28552'),
+    ('4b66e9d4d1b4673c5ad22691957d6af5c11b6421e0ea01d42ca4169e7918ba0d',
+     'e5210f12786811d3f4b7959d0538ae2c31dbe7106fc03c3efc4cd549c715a493',
+     '95cbde9476e8907d7aade45cb4b873f88b595a68799fa152e6f8f7647aac7957'),
+]
+
+
+@pytest.mark.parametrize('scalar, u_point, expected', VECTORS)
+def test_x25519_vectors(scalar, u_point, expected):
+    assert wg_keys._x25519(bytes.fromhex(scalar), bytes.fromhex(u_point)).hex() == expected
+
+
+@pytest.mark.parametrize('iterations, expected', [
+    (1, '422c8e7a6227d7bca1350b3e2bb7279f7897b87bb6854b783c60e80311ae3079'),
+    (1000, '684cf59ba83309552800ef566f2f4d3c1c3887c49360e3875f2eb94d99532c51'),
+])
+def test_x25519_iterated(iterations, expected):
+    k = u = wg_keys._BASE_POINT
+    for _ in range(iterations):
+        k, u = wg_keys._x25519(k, u), k
+    assert k.hex() == expected
+
+
+def test_public_key_matches_rfc_diffie_hellman():
+    # RFC 7748, раздел 6.1: ключи Алисы
+    private = base64.b64encode(bytes.fromhex(
+        '77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a')).decode()
+    assert base64.b64decode(wg_keys.public_key(private)).hex() == \
+        '8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a'
+
+
+def test_generate_keypair_format():
+    private, public = wg_keys.generate_keypair()
+    raw = base64.b64decode(private)
+    assert len(raw) == 32 and len(base64.b64decode(public)) == 32
+    # Приватный ключ уже ограничен, как у `wg genkey`
+    assert raw[0] & 7 == 0 and raw[31] & 0xC0 == 0x40
+    assert wg_keys.public_key(private) == public
@@ -0,0 +1,50 @@
+import pytest
+
+from wg_peers import AddressAllocator
+
+
+def test_skips_network_broadcast_and_reserved():
+    allocator = AddressAllocator('10.0.0.0/29', ['10.0.0.1'])
+    assert [allocator.allocate() for _ in range(5)] == [f'10.0.0.{i}' for i in range(2, 7)]
+    assert allocator.used == 8
+
+
+def test_exhaustion():
+    allocator = AddressAllocator('10.0.0.0/30', ['10.0.0.1'])
+    assert allocator.allocate() == '10.0.0.2'
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
+
+
+def test_release_reuses_address():
+    allocator = AddressAllocator('10.0.0.0/29')
+    addresses = [allocator.allocate() for _ in range(6)]
+    allocator.release(addresses[2])
+    assert allocator.used == 7
+    assert allocator.allocate() == addresses[2]
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
+
+
+def test_release_twice_does_not_hand_out_address_twice():
+    allocator = AddressAllocator('10.0.0.0/29')
+    address = allocator.allocate()
+    allocator.release(address)
+    allocator.release(address)
+    assert allocator.allocate() == address
+    assert allocator.allocate() != address
+
+
+def test_mark_skips_taken_addresses():
+    allocator = AddressAllocator('10.0.0.0/24', ['10.0.0.1'])
+    for i in range(2, 20):
+        allocator.mark(f'10.0.0.{i}')
+    assert allocator.allocate() == '10.0.0.20'
+
+
+def test_address_outside_subnet():
+    allocator = AddressAllocator('10.0.0.0/24')
+    with pytest.raises(ValueError):
+        allocator.mark('10.0.1.1')
+    with pytest.raises(ValueError):
+        allocator.release('192.168.0.1')
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Замер фаз развертывания
+
+Каждый запуск deploy_vpn.py / deploy_openvpn.py / deploy_fleet.py дописывает
+по строке JSON на узел в deploy_trace.jsonl (рядом с vpn_info.json):
+длительность каждой фазы и общее время до готовности. Если задан
+VPN_PROM_TEXTFILE, туда же атомарно пишется файл для textfile collector
+node_exporter с последним запуском и p50/p95 по всей истории.
+
+Сводка по накопленной истории:
+    python3 timing.py
+    python3 timing.py --protocol openvpn --last 50
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from pathlib import Path
+from collections import Counter
+from contextlib import contextmanager
+
+TRACE_FILE = Path(os.environ.get('VPN_TRACE_FILE', 'deploy_trace.jsonl'))
+PROM_TEXTFILE = os.environ.get('VPN_PROM_TEXTFILE')
+
+QUANTILES = (0.5, 0.95)
+
+_write_lock = threading.Lock()
+
+
+def percentile(values, q):
+    """Перцентиль по отсортированному списку (как в do_api.DOClient.report)"""
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Trace:
+    """Фазы развертывания одного узла"""
+
+    def __init__(self, protocol, name, run_id=None):
+        self.protocol = protocol
+        self.name = name
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self.phases = []
+        self.failed = None
+        # [[фаза, секунды]] - заполняет dag.Graph после прогона
+        self.critical_path = None
+        # шаги, взятые из контрольной точки (повторный запуск после сбоя)
+        self.resumed = None
+
+    @contextmanager
+    def phase(self, name):
+        """Замерить фазу; исключение (и sys.exit) помечает ее неудачной"""
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self.failed = name
+            self._add(name, start, False, f"{type(e).__name__}: {e}")
+            raise
+        self._add(name, start, True)
+
+    def add(self, name, seconds, ok=True):
+        """Записать фазу, замеренную снаружи (например, общую для парка)"""
+        self.phases.append({'phase': name, 'start': None, 'seconds': round(seconds, 3), 'ok': ok})
+
+    def _add(self, name, start, ok, error=None):
+        self.span(name, start, time.monotonic(), ok, error)
+
+    def span(self, name, start, end, ok=True, error=None):
+        """Записать фазу по моментам time.monotonic() начала и конца"""
+        record = {
+            'phase': name,
+            'start': round(start - self._t0, 3),
+            'seconds': round(end - start, 3),
+            'ok': ok
+        }
+        if error:
+            record['error'] = error
+        if not ok and self.failed is None:
+            self.failed = name
+        self.phases.append(record)
+
+    def record(self, **extra):
+        """Запись трассы для deploy_trace.jsonl"""
+        # Время до готовности - конец последней фазы плюс фазы, замеренные снаружи
+        shared = sum(p['seconds'] for p in self.phases if p['start'] is None)
+        end = max((p['start'] + p['seconds'] for p in self.phases if p['start'] is not None),
+                  default=0)
+        record = {
+            'run_id': self.run_id,
+            'protocol': self.protocol,
+            'name': self.name,
+            'started': round(self.started, 3),
+            'ok': self.failed is None,
+            'failed_phase': self.failed,
+            'time_to_ready': round(shared + end, 3),
+            'phases': self.phases
+        }
+        if self.critical_path is not None:
+            record['critical_path'] = self.critical_path
+        if self.resumed:
+            record['resumed'] = self.resumed
+        return dict(record, **extra)
+
+
+def write(traces, path=TRACE_FILE, prom_path=PROM_TEXTFILE, **extra):
+    """Дописать трассы в JSONL и обновить textfile для Prometheus"""
+    records = [trace.record(**extra) for trace in traces]
+    with _write_lock:
+        with open(path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if prom_path:
+            write_prometheus(load(path), records, prom_path)
+    return records
+
+
+def load(path=TRACE_FILE, protocol=None):
+    """Прочитать историю трасс; битые строки пропускаются"""
+    records = []
+    if not Path(path).exists():
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if protocol is None or record.get('protocol') == protocol:
+                records.append(record)
+    return records
+
+
+def summarize(records):
+    """{protocol: {'time_to_ready': [...], phase: [...]}} по успешным запускам"""
+    summary = {}
+    for record in records:
+        # Продолжение с контрольной точки не сравнимо с полным развертыванием
+        if not record.get('ok') or record.get('resumed'):
+            continue
+        series = summary.setdefault(record['protocol'], {'time_to_ready': []})
+        series['time_to_ready'].append(record['time_to_ready'])
+        for phase in record['phases']:
+            series.setdefault(phase['phase'], []).append(phase['seconds'])
+    for series in summary.values():
+        for values in series.values():
+            values.sort()
+    return summary
+
+
+def write_prometheus(history, latest, path):
+    """Атомарно записать метрики в формате textfile collector"""
+    lines = [
+        "# HELP vpn_deploy_phase_seconds Длительность фазы в последнем развертывании",
+        "# TYPE vpn_deploy_phase_seconds gauge",
+    ]
+    for record in latest:
+        for phase in record['phases']:
+            lines.append(f'vpn_deploy_phase_seconds{{protocol="{record["protocol"]}",'
+                         f'node="{record["name"]}",phase="{phase["phase"]}"}} {phase["seconds"]}')
+
+    lines += [
+        "# HELP vpn_deploy_time_to_ready_seconds Время до готовности узла по истории запусков",
+        "# TYPE vpn_deploy_time_to_ready_seconds summary",
+    ]
+    summary = summarize(history)
+    for protocol, series in sorted(summary.items()):
+        values = series['time_to_ready']
+        for q in QUANTILES:
+            lines.append(f'vpn_deploy_time_to_ready_seconds{{protocol="{protocol}",quantile="{q}"}} '
+                         f'{percentile(values, q)}')
+        lines.append(f'vpn_deploy_time_to_ready_seconds_sum{{protocol="{protocol}"}} {round(sum(values), 3)}')
+        lines.append(f'vpn_deploy_time_to_ready_seconds_count{{protocol="{protocol}"}} {len(values)}')
+
+    lines += [
+        "# HELP vpn_deploy_failures_total Неудачные развертывания в истории",
+        "# TYPE vpn_deploy_failures_total counter",
+    ]
+    for protocol in sorted({r['protocol'] for r in history}):
+        failed = sum(1 for r in history if r['protocol'] == protocol and not r.get('ok'))
+        lines.append(f'vpn_deploy_failures_total{{protocol="{protocol}"}} {failed}')
+
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def report(records):
+    """Вывести p50/p95 по фазам и времени до готовности"""
+    summary = summarize(records)
+    failed = sum(1 for r in records if not r.get('ok'))
+    print(f"📊 Запусков: {len(records)}, неудачных: {failed}")
+    for protocol, series in sorted(summary.items()):
+        print(f"\n{protocol}:")
+        for phase, values in series.items():
+            print(f"   {phase:<18} n={len(values):<4} p50: {percentile(values, 0.5):7.2f}s  "
+                  f"p95: {percentile(values, 0.95):7.2f}s  max: {values[-1]:7.2f}s")
+        # Какая цепочка фаз чаще всего определяет время до готовности
+        paths = Counter(' → '.join(name for name, _ in r['critical_path']) for r in records
+                        if r.get('ok') and r['protocol'] == protocol and r.get('critical_path'))
+        for path, count in paths.most_common(3):
+            print(f"   критический путь ({count}/{len(series['time_to_ready'])}): {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка времени развертывания по deploy_trace.jsonl")
+    parser.add_argument('--protocol', choices=['wireguard', 'openvpn'])
+    parser.add_argument('--last', type=int, help="только последние N запусков")
+    parser.add_argument('--file', default=str(TRACE_FILE))
+    args = parser.parse_args()
+
+    records = load(args.file, args.protocol)
+    if not records:
+        print(f"❌ Нет данных в {args.file}")
+        sys.exit(1)
+    if args.last:
+        records = records[-args.last:]
+    report(records)
+
+if __name__ == '__main__':
+    main()
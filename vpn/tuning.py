@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Профили настройки сети VPN сервера
+
+Профиль задает sysctl (BBR, очереди, буферы UDP сокетов), длину очереди и
+offload интерфейса, MTU туннеля и параметры OpenVPN. Настройка ядра и
+интерфейса выполняется из user_data (systemd unit vpn-tuning повторяет ее
+после перезагрузки), MTU записывается и в конфигурацию сервера, и в
+конфигурацию клиента.
+
+Профиль версионирован: идентификатор вида throughput-v1 попадает в тег
+droplet (tuning-throughput-v1), в инвентарь и в /etc/vpn-tuning на сервере,
+чтобы сравнивать пропускную способность узлов с разными профилями. Любое
+изменение параметров профиля - новая версия.
+
+Выбор профиля: VPN_TUNING=throughput python3 deploy_vpn.py
+Список профилей:
+    python3 tuning.py
+    python3 tuning.py --script throughput
+"""
+
+import os
+import argparse
+
+PROFILES = {
+    'baseline': {
+        'version': 1,
+        'description': "только ip_forward, как до профилей",
+        'sysctl': {},
+        'txqueuelen': None,
+        'udp_gro_forwarding': False,
+        'wg_mtu': None,
+        'openvpn': {},
+    },
+    'throughput': {
+        'version': 1,
+        'description': "BBR + fq, буферы UDP 25 МБ, очередь eth0 5000, UDP GRO forwarding",
+        'sysctl': {
+            'net.core.default_qdisc': 'fq',
+            'net.ipv4.tcp_congestion_control': 'bbr',
+            'net.core.rmem_max': 26214400,
+            'net.core.wmem_max': 26214400,
+            'net.core.rmem_default': 1048576,
+            'net.core.wmem_default': 1048576,
+            'net.ipv4.udp_rmem_min': 16384,
+            'net.ipv4.udp_wmem_min': 16384,
+            'net.core.netdev_max_backlog': 5000,
+            'net.ipv4.tcp_mtu_probing': 1,
+        },
+        'txqueuelen': 5000,
+        'udp_gro_forwarding': True,
+        # 1500 - 80 байт заголовков WireGuard поверх IPv6
+        'wg_mtu': 1420,
+        'openvpn': {'tun-mtu': 1500, 'mssfix': 1450, 'sndbuf': 1048576, 'rcvbuf': 1048576,
+                    'txqueuelen': 1000, 'fast-io': True},
+    },
+    'mobile': {
+        'version': 1,
+        'description': "MTU 1280 для мобильных сетей и PPPoE, BBR + fq_codel",
+        'sysctl': {
+            'net.core.default_qdisc': 'fq_codel',
+            'net.ipv4.tcp_congestion_control': 'bbr',
+            'net.ipv4.tcp_mtu_probing': 1,
+        },
+        'txqueuelen': None,
+        'udp_gro_forwarding': False,
+        'wg_mtu': 1280,
+        'openvpn': {'tun-mtu': 1280, 'mssfix': 1200},
+    },
+}
+
+DEFAULT = os.environ.get('VPN_TUNING', 'throughput')
+
+# Параметры OpenVPN, которые должны совпадать у клиента
+OPENVPN_CLIENT_OPTIONS = ('tun-mtu', 'mssfix')
+# Буферы сокетов клиента задает сервер через push
+OPENVPN_PUSHED_OPTIONS = ('sndbuf', 'rcvbuf')
+
+
+def get(name=None):
+    """Профиль по имени (по умолчанию VPN_TUNING) с полями name и id"""
+    name = name or DEFAULT
+    if name not in PROFILES:
+        raise ValueError(f"Неизвестный профиль {name}, доступны: {', '.join(sorted(PROFILES))}")
+    profile = dict(PROFILES[name], name=name)
+    profile['id'] = f"{name}-v{profile['version']}"
+    return profile
+
+
+def tag(profile):
+    """Тег droplet с версией профиля"""
+    return f"tuning-{profile['id']}"
+
+
+def server_script(profile, interface='eth0'):
+    """Фрагмент user_data, применяющий профиль на сервере"""
+    lines = [f"\n# Профиль настройки сети {profile['id']}"]
+    if profile['sysctl']:
+        lines.append("cat > /etc/sysctl.d/90-vpn-tuning.conf <<'TUNING_EOF'")
+        lines += [f"{key} = {value}" for key, value in profile['sysctl'].items()]
+        lines.append("TUNING_EOF")
+        if profile['sysctl'].get('net.ipv4.tcp_congestion_control') == 'bbr':
+            lines.append("echo tcp_bbr > /etc/modules-load.d/vpn-tuning.conf")
+            lines.append("modprobe tcp_bbr || true")
+        lines.append("sysctl --system > /dev/null")
+
+    # Очередь и offload не переживают перезагрузку: их применяет unit при загрузке
+    commands = []
+    qdisc = profile['sysctl'].get('net.core.default_qdisc')
+    if qdisc:
+        # default_qdisc действует только на новые очереди, eth0 уже поднят
+        commands.append(f"tc qdisc replace dev {interface} root {qdisc}")
+    if profile['txqueuelen']:
+        commands.append(f"ip link set dev {interface} txqueuelen {profile['txqueuelen']}")
+    if profile['udp_gro_forwarding']:
+        commands.append(f"ethtool -K {interface} rx-udp-gro-forwarding on rx-gro-list off || true")
+    if commands:
+        lines.append("cat > /usr/local/sbin/vpn-tuning <<'TUNING_EOF'")
+        lines.append("#!/bin/sh")
+        lines += commands
+        lines.append("TUNING_EOF")
+        lines.append("chmod +x /usr/local/sbin/vpn-tuning")
+        lines.append("cat > /etc/systemd/system/vpn-tuning.service <<'TUNING_EOF'")
+        lines += [
+            "[Unit]",
+            f"Description=VPN network tuning ({profile['id']})",
+            "After=network-online.target",
+            "Wants=network-online.target",
+            "",
+            "[Service]",
+            "Type=oneshot",
+            "ExecStart=/usr/local/sbin/vpn-tuning",
+            "RemainAfterExit=yes",
+            "",
+            "[Install]",
+            "WantedBy=multi-user.target",
+        ]
+        lines.append("TUNING_EOF")
+        lines.append("systemctl daemon-reload")
+        lines.append("systemctl enable --now vpn-tuning.service")
+
+    lines.append(f"echo {profile['id']} > /etc/vpn-tuning")
+    return "\n".join(lines) + "\n"
+
+
+def wg_mtu_line(mtu):
+    """Строка MTU для секции [Interface] wg0.conf (пусто - MTU выбирает wg-quick)"""
+    return f"MTU = {mtu}\n" if mtu else ""
+
+
+def _openvpn_option(key, value):
+    return key if value is True else f"{key} {value}"
+
+
+def openvpn_server_options(profile):
+    """Строки server.conf для профиля"""
+    lines = []
+    for key, value in profile['openvpn'].items():
+        lines.append(_openvpn_option(key, value))
+        if key in OPENVPN_PUSHED_OPTIONS:
+            lines.append(f'push "{_openvpn_option(key, value)}"')
+    return "".join(f"{line}\n" for line in lines)
+
+
+def openvpn_client_options(profile):
+    """Строки конфигурации клиента, которые должны совпадать с сервером"""
+    return "".join(f"{_openvpn_option(key, value)}\n" for key, value in profile['openvpn'].items()
+                   if key in OPENVPN_CLIENT_OPTIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профили настройки сети VPN сервера")
+    parser.add_argument('--script', metavar='PROFILE', help="показать фрагмент user_data профиля")
+    args = parser.parse_args()
+
+    if args.script:
+        print(server_script(get(args.script)))
+        return
+    for name in sorted(PROFILES):
+        profile = get(name)
+        mark = '*' if name == DEFAULT else ' '
+        print(f" {mark} {profile['id']:<16} MTU {profile['wg_mtu'] or 'auto':<5} {profile['description']}")
+
+if __name__ == '__main__':
+    main()
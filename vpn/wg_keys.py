@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Генерация ключей WireGuard (X25519) на машине оператора
+
+Используется пакет cryptography, если он установлен; иначе - реализация
+X25519 по RFC 7748 на чистом Python (около миллисекунды на ключ).
+Формат ключей совпадает с `wg genkey` / `wg pubkey`: base64 от 32 байт.
+"""
+
+import os
+import base64
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives import serialization
+except ImportError:  # pragma: no cover - зависит от окружения
+    X25519PrivateKey = None
+
+_P = 2 ** 255 - 19
+_A24 = 121665
+_BASE_POINT = (9).to_bytes(32, 'little')
+
+
+def _clamp(scalar):
+    scalar = bytearray(scalar)
+    scalar[0] &= 248
+    scalar[31] &= 127
+    scalar[31] |= 64
+    return bytes(scalar)
+
+
+def _x25519(scalar, u_point):
+    """Умножение точки на скаляр по лестнице Монтгомери (RFC 7748, раздел 5)"""
+    k = int.from_bytes(_clamp(scalar), 'little')
+    x1 = int.from_bytes(u_point, 'little') & ((1 << 255) - 1)
+    x2, z2, x3, z3 = 1, 0, x1, 1
+    swap = 0
+    for t in range(254, -1, -1):
+        bit = (k >> t) & 1
+        swap ^= bit
+        if swap:
+            x2, x3, z2, z3 = x3, x2, z3, z2
+        swap = bit
+
+        a = (x2 + z2) % _P
+        aa = a * a % _P
+        b = (x2 - z2) % _P
+        bb = b * b % _P
+        e = (aa - bb) % _P
+        c = (x3 + z3) % _P
+        d = (x3 - z3) % _P
+        da = d * a % _P
+        cb = c * b % _P
+        x3 = (da + cb) ** 2 % _P
+        z3 = x1 * (da - cb) ** 2 % _P
+        x2 = aa * bb % _P
+        z2 = e * (aa + _A24 * e) % _P
+    if swap:
+        x2, z2 = x3, z3
+    return (x2 * pow(z2, _P - 2, _P) % _P).to_bytes(32, 'little')
+
+
+def public_key(private_key):
+    """Публичный ключ (base64) для приватного ключа (base64), как `wg pubkey`"""
+    raw = base64.b64decode(private_key)
+    if X25519PrivateKey is not None:
+        public = X25519PrivateKey.from_private_bytes(raw).public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    else:
+        public = _x25519(raw, _BASE_POINT)
+    return base64.b64encode(public).decode()
+
+
+def generate_private_key():
+    """Новый приватный ключ (base64), как `wg genkey`"""
+    return base64.b64encode(_clamp(os.urandom(32))).decode()
+
+
+def generate_keypair():
+    """Вернуть (private_key, public_key) в base64"""
+    private = generate_private_key()
+    return private, public_key(private)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Пиры WireGuard: распределение адресов и состояние сервера
+
+AddressAllocator - битовая карта подсети (1 бит на адрес, /16 занимает 8 КБ)
+с курсором и стеком освобожденных адресов: выделение и освобождение за O(1).
+PeerState - локальное состояние сервера (wg_peers/<имя>.json): подсеть,
+публичный ключ сервера и все пиры с их ключами и адресами.
+sync_peers() передает всех пиров одним запросом и применяет их через
+`wg syncconf` без перезапуска wg-quick@wg0. apply_changes() добавляет и
+отзывает отдельных пиров через `wg set`, не трогая остальные туннели.
+"""
+
+import os
+import json
+import ipaddress
+from pathlib import Path
+
+import wg_keys
+
+STATE_DIR = Path('wg_peers')
+
+# Замена секции пиров в wg0.conf и применение без перезапуска интерфейса.
+# Новые секции [Peer] приходят на stdin; файл заменяется атомарно через mv
+SYNC_SCRIPT = r"""set -e
+umask 077
+conf=/etc/wireguard/wg0.conf
+tmp=$(mktemp /etc/wireguard/.wg0.XXXXXX)
+sed '/^\[Peer\]/,$d' "$conf" > "$tmp"
+cat >> "$tmp"
+mv "$tmp" "$conf"
+wg syncconf wg0 <(wg-quick strip wg0)
+"""
+
+# Точечные изменения: `wg set` для работающего интерфейса, затем атомарная
+# перезапись wg0.conf - отозванные секции [Peer] вырезаются по PublicKey,
+# новые приходят на stdin
+APPLY_SCRIPT = r"""set -e
+umask 077
+conf=/etc/wireguard/wg0.conf
+{commands}
+tmp=$(mktemp /etc/wireguard/.wg0.XXXXXX)
+awk -v drop='{drop}' '
+BEGIN {{ n = split(drop, keys, " "); for (i = 1; i <= n; i++) skip[keys[i]] = 1 }}
+function flush() {{ if (!hit) printf "%s", block; block = ""; hit = 0 }}
+/^\[/ {{ flush() }}
+$1 == "PublicKey" && ($3 in skip) {{ hit = 1 }}
+{{ block = block $0 "\n" }}
+END {{ flush() }}' "$conf" > "$tmp"
+cat >> "$tmp"
+mv "$tmp" "$conf"
+"""
+
+# Пиров за один вызов `wg set` (ограничение длины командной строки)
+WG_SET_BATCH = 200
+
+
+class AddressAllocator:
+    """Битовая карта адресов подсети с выделением за O(1)"""
+
+    __slots__ = ('network', 'size', '_base', '_bits', '_cursor', '_free', 'used')
+
+    def __init__(self, subnet, reserved=()):
+        self.network = ipaddress.ip_network(subnet)
+        self.size = self.network.num_addresses
+        self._base = int(self.network.network_address)
+        self._bits = bytearray((self.size + 7) // 8)
+        self._cursor = 0
+        self._free = []
+        self.used = 0
+        # Адрес сети и broadcast не выдаются
+        self._set(0)
+        self._set(self.size - 1)
+        for address in reserved:
+            self.mark(address)
+
+    def _index(self, address):
+        index = int(ipaddress.ip_address(address)) - self._base
+        if not 0 <= index < self.size:
+            raise ValueError(f"{address} вне подсети {self.network}")
+        return index
+
+    def _test(self, index):
+        return self._bits[index >> 3] >> (index & 7) & 1
+
+    def _set(self, index):
+        if not self._test(index):
+            self._bits[index >> 3] |= 1 << (index & 7)
+            self.used += 1
+
+    def mark(self, address):
+        """Пометить адрес занятым"""
+        self._set(self._index(address))
+
+    def allocate(self):
+        """Выделить свободный адрес; RuntimeError, если подсеть исчерпана"""
+        while self._free:
+            index = self._free.pop()
+            if not self._test(index):
+                self._set(index)
+                return str(ipaddress.ip_address(self._base + index))
+
+        while self._cursor < self.size:
+            byte = self._cursor >> 3
+            if self._bits[byte] == 0xFF:
+                # Весь байт занят - пропускаем 8 адресов сразу
+                self._cursor = (byte + 1) << 3
+                continue
+            index = self._cursor
+            self._cursor += 1
+            if not self._test(index):
+                self._set(index)
+                return str(ipaddress.ip_address(self._base + index))
+
+        raise RuntimeError(f"В подсети {self.network} нет свободных адресов")
+
+    def release(self, address):
+        """Освободить адрес для повторного выделения"""
+        index = self._index(address)
+        if self._test(index):
+            self._bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+            self.used -= 1
+            self._free.append(index)
+
+
+class PeerState:
+    """Состояние пиров одного WireGuard сервера"""
+
+    def __init__(self, data):
+        self.data = data
+        self.peers = data['peers']
+        network = ipaddress.ip_network(data['subnet'])
+        self.allocator = AddressAllocator(network, [data['server_address']])
+        for peer in self.peers.values():
+            self.allocator.mark(peer['address'])
+
+    @property
+    def name(self):
+        return self.data['name']
+
+    @classmethod
+    def create(cls, name, ip, subnet, server_public_key, port):
+        """Новое состояние сервера; адрес сервера - первый в подсети"""
+        network = ipaddress.ip_network(subnet)
+        return cls({
+            'name': name,
+            'ip': ip,
+            'port': port,
+            'subnet': str(network),
+            'server_address': str(next(network.hosts())),
+            'server_public_key': server_public_key,
+            'peers': {}
+        })
+
+    @classmethod
+    def load(cls, name):
+        with open(STATE_DIR / f'{name}.json', 'r') as f:
+            return cls(json.load(f))
+
+    def save(self):
+        """Атомарно записать состояние"""
+        STATE_DIR.mkdir(mode=0o700, exist_ok=True)
+        path = STATE_DIR / f'{self.name}.json'
+        tmp = path.with_suffix('.tmp')
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, path)
+
+    def add_peer(self, peer_name, private_key=None, public_key=None):
+        """Добавить пира с новым адресом; ключи генерируются, если не переданы"""
+        if peer_name in self.peers:
+            raise ValueError(f"Пир {peer_name} уже существует")
+        if private_key is None and public_key is None:
+            private_key, public_key = wg_keys.generate_keypair()
+        elif public_key is None:
+            public_key = wg_keys.public_key(private_key)
+        peer = {
+            'public_key': public_key,
+            'private_key': private_key,
+            'address': self.allocator.allocate()
+        }
+        self.peers[peer_name] = peer
+        return peer
+
+    def remove_peer(self, peer_name):
+        peer = self.peers.pop(peer_name)
+        self.allocator.release(peer['address'])
+        return peer
+
+    def peers_section(self, names=None):
+        """Секции [Peer] для wg0.conf сервера (все пиры или только names)"""
+        names = self.peers if names is None else names
+        return "".join(
+            f"\n[Peer]\n# {peer_name}\nPublicKey = {self.peers[peer_name]['public_key']}\n"
+            f"AllowedIPs = {self.peers[peer_name]['address']}/32\n"
+            for peer_name in names
+        )
+
+
+def list_states():
+    """Имена серверов, для которых есть локальное состояние"""
+    if not STATE_DIR.exists():
+        return []
+    return sorted(path.stem for path in STATE_DIR.glob('*.json'))
+
+
+def sync_peers(session, state):
+    """Записать всех пиров на сервер и применить одним `wg syncconf`"""
+    return session.run(SYNC_SCRIPT, input=state.peers_section(), timeout=60)
+
+
+def apply_changes(session, state, added=(), removed=()):
+    """Добавить и отозвать пиров на работающем сервере без перезапуска
+
+    added - имена пиров из state, removed - записи пиров, уже удаленные из
+    state (см. PeerState.remove_peer). Изменения сразу применяются через
+    `wg set` и сохраняются в wg0.conf.
+    """
+    ops = [f"peer {state.peers[name]['public_key']} allowed-ips {state.peers[name]['address']}/32"
+           for name in added]
+    ops += [f"peer {peer['public_key']} remove" for peer in removed]
+    commands = "\n".join(
+        "wg set wg0 " + " ".join(ops[i:i + WG_SET_BATCH])
+        for i in range(0, len(ops), WG_SET_BATCH)
+    )
+    script = APPLY_SCRIPT.format(
+        commands=commands,
+        drop=" ".join(peer['public_key'] for peer in removed)
+    )
+    return session.run(script, input=state.peers_section(added), timeout=30)
+
+
+def live_peers(session):
+    """Пиры работающего интерфейса из `wg show wg0 dump`: {публичный ключ: данные}"""
+    result = session.run("wg show wg0 dump")
+    if result.returncode != 0:
+        return None
+    peers = {}
+    # Первая строка - сам интерфейс
+    for line in result.stdout.splitlines()[1:]:
+        fields = line.split('\t')
+        if len(fields) < 8:
+            continue
+        peers[fields[0]] = {
+            'endpoint': None if fields[2] == '(none)' else fields[2],
+            'allowed_ips': fields[3],
+            'latest_handshake': int(fields[4]),
+            'rx_bytes': int(fields[5]),
+            'tx_bytes': int(fields[6])
+        }
+    return peers